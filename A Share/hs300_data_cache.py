@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+沪深300数据获取工具
+并发限速拉取个股信息，结果按股票代码缓存到本地磁盘（带过期时间），同一天重复运行几乎不发请求
+"""
+
+import os
+import json
+import time
+import threading
+import pandas as pd
+import akshare as ak
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+CACHE_DIR = os.getenv("HS300_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache"))
+CACHE_TTL = int(os.getenv("HS300_CACHE_TTL", 24 * 3600))   # 缓存有效期（秒）
+MAX_WORKERS = 6          # 并发线程数
+RATE_PER_SEC = 8         # 全局请求速率上限（东方财富接口过快会被限流）
+MAX_RETRIES = 3
+
+
+class Throttle:
+    """线程安全的请求节流器，保证相邻两次请求间隔不小于 1/rate 秒"""
+
+    def __init__(self, rate_per_sec):
+        self.interval = 1.0 / rate_per_sec
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def _cache_path(name):
+    return os.path.join(CACHE_DIR, f"{name}.json")
+
+
+def _read_cache(name, ttl):
+    path = _cache_path(name)
+    try:
+        with open(path, encoding="utf-8") as f:
+            payload = json.load(f)
+        if time.time() - payload["fetched_at"] > ttl:
+            return None
+        return pd.DataFrame(payload["records"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_cache(name, df):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _cache_path(name)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"fetched_at": time.time(), "records": df.to_dict("records")}, f,
+                  ensure_ascii=False, default=str)
+    os.replace(tmp, path)
+
+
+def cached_table(name, fetch, ttl=CACHE_TTL):
+    """整表接口（成分股列表、行业板块列表等）每次运行只取一次，并缓存到磁盘"""
+    df = _read_cache(name, ttl)
+    if df is None:
+        df = fetch()
+        _write_cache(name, df)
+    return df
+
+
+def fetch_stock_infos(codes, max_workers=MAX_WORKERS, rate=RATE_PER_SEC, ttl=CACHE_TTL):
+    """并发获取个股信息（ak.stock_individual_info_em），优先读取磁盘缓存
+
+    Returns:
+        dict: {股票代码: DataFrame(item, value)}，多次重试仍失败的代码不在结果中
+    """
+    results = {}
+    missing = []
+    for code in codes:
+        cached = _read_cache(f"info_{code}", ttl)
+        if cached is not None:
+            results[code] = cached
+        else:
+            missing.append(code)
+
+    print(f"个股信息: 缓存命中 {len(results)} 只，需请求 {len(missing)} 只")
+    if not missing:
+        return results
+
+    throttle = Throttle(rate)
+
+    def fetch(code):
+        for attempt in range(MAX_RETRIES):
+            throttle.wait()
+            try:
+                df = ak.stock_individual_info_em(symbol=code)
+                _write_cache(f"info_{code}", df)
+                return df
+            except Exception:
+                if attempt == MAX_RETRIES - 1:
+                    raise
+                time.sleep(2 ** attempt)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(fetch, code): code for code in missing}
+        for done, future in enumerate(as_completed(futures), 1):
+            code = futures[future]
+            try:
+                results[code] = future.result()
+                print(f"处理进度: {done}/{len(missing)} - {code}")
+            except Exception as e:
+                print(f"获取 {code} 信息失败: {e}")
+
+    return results
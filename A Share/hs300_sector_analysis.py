@@ -9,10 +9,11 @@ import akshare as ak
 import pandas as pd
 import numpy as np
 from datetime import datetime
-import time
 import warnings
 warnings.filterwarnings('ignore')
 
+from hs300_data_cache import cached_table, fetch_stock_infos
+
 class HS300SectorAnalyzer:
     def __init__(self):
         self.hs300_stocks = None
@@ -184,18 +185,26 @@ class HS300SectorAnalyzer:
         try:
             print("正在获取沪深300成分股列表...")
             # 获取沪深300成分股
-            hs300_df = ak.index_stock_cons_weight_csindex(symbol="000300")
+            hs300_df = cached_table("hs300_cons", lambda: ak.index_stock_cons_weight_csindex(symbol="000300"))
+            hs300_df['成分券代码'] = hs300_df['成分券代码'].astype(str).str.zfill(6)
+            
+            # 行业板块表每次运行只取一次
+            try:
+                cached_table("industry_board", ak.stock_board_industry_name_em)
+                has_industry = True
+            except Exception as e:
+                print(f"获取行业板块失败: {e}")
+                has_industry = False
+            
+            # 并发获取股票详细信息（带本地缓存）
+            stock_infos = fetch_stock_infos(hs300_df['成分券代码'].tolist())
             
-            # 获取股票基本信息
             stock_list = []
-            for _, row in hs300_df.iterrows():
+            for stock_code, stock_name, weight in zip(hs300_df['成分券代码'], hs300_df['成分券名称'], hs300_df['权重']):
                 try:
-                    stock_code = row['成分券代码']
-                    stock_name = row['成分券名称']
-                    weight = row['权重']
-                    
-                    # 获取股票详细信息
-                    stock_info = ak.stock_individual_info_em(symbol=stock_code)
+                    if stock_code not in stock_infos:
+                        continue
+                    stock_info = stock_infos[stock_code]
                     
                     # 提取市值信息
                     market_cap = 0
@@ -218,11 +227,10 @@ class HS300SectorAnalyzer:
                                     continue
                     
                     # 获取行业信息
-                    try:
-                        industry_info = ak.stock_board_industry_name_em()
+                    if has_industry:
                         # 这里需要根据股票代码匹配行业，简化处理
                         sector = "金融" if "银行" in stock_name or "保险" in stock_name or "证券" in stock_name else "其他"
-                    except:
+                    else:
                         sector = "其他"
                     
                     stock_list.append({
@@ -233,9 +241,6 @@ class HS300SectorAnalyzer:
                         'sector': sector
                     })
                     
-                    print(f"已处理: {stock_code} {stock_name}")
-                    time.sleep(0.1)  # 避免请求过快
-                    
                 except Exception as e:
                     print(f"处理股票 {stock_code} 时出错: {e}")
                     continue
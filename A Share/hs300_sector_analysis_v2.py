@@ -10,11 +10,12 @@ import akshare as ak
 import pandas as pd
 import numpy as np
 from datetime import datetime
-import time
 import warnings
 import re
 warnings.filterwarnings('ignore')
 
+from hs300_data_cache import cached_table, fetch_stock_infos
+
 class HS300SectorAnalyzerV2:
     def __init__(self):
         self.hs300_stocks = None
@@ -321,25 +322,16 @@ class HS300SectorAnalyzerV2:
         try:
             print("正在获取沪深300成分股列表...")
             # 获取沪深300成分股
-            hs300_df = ak.index_stock_cons_weight_csindex(symbol="000300")
+            hs300_df = cached_table("hs300_cons", lambda: ak.index_stock_cons_weight_csindex(symbol="000300"))
+            hs300_df['成分券代码'] = hs300_df['成分券代码'].astype(str).str.zfill(6)
             
-            # 获取股票基本信息
-            stock_list = []
-            total_stocks = len(hs300_df)
+            # 并发获取股票详细信息（带本地缓存）
+            stock_infos = fetch_stock_infos(hs300_df['成分券代码'].tolist())
             
-            for idx, (_, row) in enumerate(hs300_df.iterrows(), 1):
+            stock_list = []
+            for stock_code, stock_name, weight in zip(hs300_df['成分券代码'], hs300_df['成分券名称'], hs300_df['权重']):
                 try:
-                    stock_code = row['成分券代码']
-                    stock_name = row['成分券名称']
-                    weight = row['权重']
-                    
-                    print(f"处理进度: {idx}/{total_stocks} - {stock_code} {stock_name}")
-                    
-                    # 获取股票详细信息
-                    try:
-                        stock_info = ak.stock_individual_info_em(symbol=stock_code)
-                    except:
-                        stock_info = pd.DataFrame()
+                    stock_info = stock_infos.get(stock_code, pd.DataFrame())
                     
                     # 提取市值信息
                     market_cap = 0
@@ -374,8 +366,6 @@ class HS300SectorAnalyzerV2:
                         'sector': sector
                     })
                     
-                    time.sleep(0.1)  # 避免请求过快
-                    
                 except Exception as e:
                     print(f"处理股票 {stock_code} 时出错: {e}")
                     continue
@@ -1,4 +1,5 @@
 import os
+import asyncio
 import requests
 import hmac
 import hashlib
@@ -10,17 +11,35 @@ import numpy as np
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 import talib
+from alert_store import ALERTS
+from bar_clock import last_closed
+from candle_store import CANDLES, timeframe_ms
+from discord_queue import DISCORD
+from indicators import IndicatorBank, RSI
+from metrics import METRICS
+from okx_async_client import BASE_URL, OKXAsyncClient, candles_request, to_inst_id
+from okx_stream import ResampledStream
+from scanner_host import Detector
+from universe import UNIVERSE
 
 # 加载环境变量
 load_dotenv()
 
+# 信号阈值（可用 param_sweep.py 在历史数据上寻优）
+RSI_OVERBOUGHT = 70
+RSI_OVERSOLD   = 30
+PINBAR_RATIO   = 0.3
+
 class OKXScanner:
     def __init__(self):
         self.api_key = os.getenv('OKX_API_KEY')
         self.api_secret = os.getenv('OKX_API_SECRET')
         self.passphrase = os.getenv('OKX_PASSPHRASE')
         self.discord_webhook = os.getenv('DISCORD_WEBHOOK')
-        self.base_url = 'https://www.okx.com'
+        self.base_url = BASE_URL
+        self.candles = CANDLES
+        # RSI14 增量状态，按 (交易对, 周期) 持久化
+        self.rsi_state = IndicatorBank("rsi14", lambda: RSI(14))
         
         # 时间级别映射
         self.timeframes = {
@@ -56,62 +75,67 @@ class OKXScanner:
     
     def get_top_volume_pairs(self, limit=200):
         """获取24小时交易量前200的交易对"""
-        url = f"{self.base_url}/api/v5/market/tickers?instType=SPOT"
-        
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
-            
-            if data['code'] == '0':
-                tickers = data['data']
-                # 按24小时交易量排序
-                sorted_tickers = sorted(tickers, key=lambda x: float(x['vol24h']), reverse=True)
-                return [ticker['instId'] for ticker in sorted_tickers[:limit]]
-            else:
-                print(f"获取交易对失败: {data['msg']}")
-                return []
-                
+            # 共享交易对池，保持原有口径：全部现货按 vol24h 排序
+            ranking = UNIVERSE.select(limit, quote=None, by="vol24h")
+            return [to_inst_id(symbol) for symbol in ranking.symbols]
         except Exception as e:
             print(f"获取交易对时出错: {e}")
             return []
     
-    def get_kline_data(self, symbol, timeframe, limit=100):
-        """获取K线数据"""
-        url = f"{self.base_url}/api/v5/market/candles"
-        params = {
-            'instId': symbol,
-            'bar': timeframe,
-            'limit': limit
-        }
+    def fetch_candles(self, symbol, timeframe, since=None, limit=100):
+        """请求OKX K线接口，返回正序的 [ts, o, h, l, c, v] 列表
+
+        since 不为空时只返回该时间戳（含）起的 limit 根以内的K线（见 candles_request）
+        """
+        path, params = candles_request(symbol, timeframe, since, limit)
+        response = requests.get(f"{self.base_url}{path}", params=params)
+        response.raise_for_status()
+        data = response.json()
         
+        if data['code'] != '0':
+            raise RuntimeError(data['msg'])
+        # OKX返回的数据是倒序的，需要正序
+        return [[int(c[0]), float(c[1]), float(c[2]), float(c[3]), float(c[4]), float(c[5])]
+                for c in reversed(data['data'])]
+    
+    def get_kline_data(self, symbol, timeframe, limit=100):
+        """获取K线数据（本地仓库增量补齐，只请求新收盘的K线）"""
         try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            
-            if data['code'] == '0':
-                candles = data['data']
-                # 转换为DataFrame
-                df = pd.DataFrame(candles, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 'volCcy', 'volCcyQuote', 'confirm'])
-                df = df.astype({
-                    'open': float,
-                    'high': float,
-                    'low': float,
-                    'close': float,
-                    'volume': float
-                })
-                # OKX返回的数据是倒序的，需要正序
-                df = df[::-1].reset_index(drop=True)
-                return df
-            else:
-                print(f"获取K线数据失败 {symbol}: {data['msg']}")
+            candles = self.candles.top_up(
+                symbol, timeframe, limit,
+                lambda since, n: self.fetch_candles(symbol, timeframe, since, n)
+            )
+            if not candles:
                 return None
+            # 转换为DataFrame
+            df = pd.DataFrame(candles, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+            return df
                 
         except Exception as e:
             print(f"获取K线数据时出错 {symbol}: {e}")
             return None
     
+    async def fetch_all_klines(self, symbols, limit=100):
+        """并发获取所有交易对、所有时间级别的K线，由异步客户端按OKX限速排队
+
+        Returns:
+            {(symbol, tf_name): DataFrame 或 None}
+        """
+        async with OKXAsyncClient() as client:
+            async def fetch(symbol, tf_value):
+                try:
+                    candles = await self.candles.fetch_ohlcv_async(client, symbol, tf_value, limit)
+                    return pd.DataFrame(candles, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+                except Exception as e:
+                    print(f"获取K线数据时出错 {symbol} {tf_value}: {e}")
+                    return None
+
+            keys = [(symbol, tf_name, tf_value) for symbol in symbols
+                    for tf_name, tf_value in self.timeframes.items()]
+            frames = await asyncio.gather(*(fetch(symbol, tf_value) for symbol, _, tf_value in keys))
+        return {(symbol, tf_name): df for (symbol, tf_name, _), df in zip(keys, frames)}
+    
     def calculate_rsi(self, df, period=14):
         """计算RSI"""
         try:
@@ -121,7 +145,17 @@ class OKXScanner:
             print(f"计算RSI时出错: {e}")
             return None
     
-    def is_pinbar_bearish(self, df, index, ratio=0.3):
+    def current_rsi(self, symbol, timeframe, df):
+        """最新一根K线的RSI（增量计算，只喂入新收盘的K线，结果同 talib.RSI）"""
+        rows = df[['timestamp', 'open', 'high', 'low', 'close', 'volume']].values.tolist()
+        now_ms = int(time.time() * 1000)
+        live = rows[-1] if rows[-1][0] + timeframe_ms(timeframe) > now_ms else None
+        closed = rows[:-1] if live else rows
+        
+        state = self.rsi_state.sync(symbol, timeframe, closed)
+        return state.peek(live) if live else state.value
+    
+    def is_pinbar_bearish(self, df, index, ratio=PINBAR_RATIO):
         """检测看跌Pin Bar"""
         try:
             row = df.iloc[index]
@@ -139,7 +173,7 @@ class OKXScanner:
         except:
             return False
     
-    def is_pinbar_bullish(self, df, index, ratio=0.3):
+    def is_pinbar_bullish(self, df, index, ratio=PINBAR_RATIO):
         """检测看涨Pin Bar"""
         try:
             row = df.iloc[index]
@@ -197,73 +231,71 @@ class OKXScanner:
         except:
             return False
     
-    def analyze_symbol(self, symbol, timeframe):
-        """分析单个交易对"""
-        df = self.get_kline_data(symbol, timeframe)
+    def analyze_symbol(self, symbol, timeframe, df=None):
+        """分析单个交易对（df 为空时自行请求K线）"""
+        if df is None:
+            df = self.get_kline_data(symbol, timeframe)
         if df is None or len(df) < 20:
             return None
             
         # 计算RSI
-        rsi = self.calculate_rsi(df)
-        if rsi is None:
+        current_rsi = self.current_rsi(symbol, timeframe, df)
+        if np.isnan(current_rsi):
             return None
-            
-        current_rsi = rsi[-1]
         last_index = len(df) - 1
         
         # 检测信号
         signals = []
         
         # 看跌信号: RSI > 70 + (Pin Bar 或 吞没)
-        if current_rsi > 70:
+        if current_rsi > RSI_OVERBOUGHT:
             if self.is_pinbar_bearish(df, last_index):
                 signals.append({
                     'type': '做空',
                     'reason': 'RSI超买 + 看跌Pin Bar',
                     'rsi': current_rsi,
-                    'price': df.iloc[last_index]['close']
+                    'price': df.iloc[last_index]['close'],
+                    'timestamp': int(df.iloc[last_index]['timestamp'])
                 })
             elif self.is_bearish_engulfing(df, last_index):
                 signals.append({
                     'type': '做空',
                     'reason': 'RSI超买 + 看跌吞没',
                     'rsi': current_rsi,
-                    'price': df.iloc[last_index]['close']
+                    'price': df.iloc[last_index]['close'],
+                    'timestamp': int(df.iloc[last_index]['timestamp'])
                 })
         
         # 看涨信号: RSI < 30 + (Pin Bar 或 吞没)
-        if current_rsi < 30:
+        if current_rsi < RSI_OVERSOLD:
             if self.is_pinbar_bullish(df, last_index):
                 signals.append({
                     'type': '做多',
                     'reason': 'RSI超卖 + 看涨Pin Bar',
                     'rsi': current_rsi,
-                    'price': df.iloc[last_index]['close']
+                    'price': df.iloc[last_index]['close'],
+                    'timestamp': int(df.iloc[last_index]['timestamp'])
                 })
             elif self.is_bullish_engulfing(df, last_index):
                 signals.append({
                     'type': '做多',
                     'reason': 'RSI超卖 + 看涨吞没',
                     'rsi': current_rsi,
-                    'price': df.iloc[last_index]['close']
+                    'price': df.iloc[last_index]['close'],
+                    'timestamp': int(df.iloc[last_index]['timestamp'])
                 })
         
         return signals
     
+    def new_signals(self, symbol, timeframe, signals):
+        """过滤掉同一根K线上已推送过的信号，以及抑制窗口内重复出现的信号"""
+        return [s for s in signals
+                if ALERTS.check("rsi_pinbar", symbol, timeframe, s['reason'], s['timestamp'])]
+    
     def send_discord_message(self, message):
-        """发送Discord消息"""
-        try:
-            data = {
-                'content': message,
-                'username': 'OKX交易信号'
-            }
-            
-            response = requests.post(self.discord_webhook, json=data)
-            response.raise_for_status()
-            print("Discord消息发送成功")
-            
-        except Exception as e:
-            print(f"发送Discord消息失败: {e}")
+        """发送Discord消息（入队后立即返回，超过2000字符按行拆分为多条）"""
+        DISCORD.send(self.discord_webhook, content=message, username='OKX交易信号')
+        print("Discord消息已加入发送队列")
     
     def format_signal_message(self, signals_by_timeframe):
         """格式化信号消息"""
@@ -289,51 +321,71 @@ class OKXScanner:
         return message
     
     def scan_all_pairs(self):
-        """扫描所有交易对"""
-        print("开始获取交易量前200的交易对...")
-        top_pairs = self.get_top_volume_pairs(200)
-        print(f"获取到 {len(top_pairs)} 个交易对")
-        
-        if not top_pairs:
-            return
-        
-        signals_found = {}
-        
-        for i, symbol in enumerate(top_pairs):
-            print(f"扫描进度: {i+1}/{len(top_pairs)} - {symbol}")
+        """扫描所有交易对（各阶段耗时记入 METRICS，结束时写一行扫描日志）"""
+        with METRICS.scan("rsi_pinbar") as scan:
+            print("开始获取交易量前200的交易对...")
+            with scan.stage("tickers"):
+                top_pairs = self.get_top_volume_pairs(200)
+            print(f"获取到 {len(top_pairs)} 个交易对")
             
-            symbol_signals = {}
+            if not top_pairs:
+                return
+            scan.symbols = len(top_pairs)
             
-            # 扫描所有时间级别
-            for tf_name, tf_value in self.timeframes.items():
-                try:
-                    signals = self.analyze_symbol(symbol, tf_value)
-                    if signals:
-                        symbol_signals[tf_name] = signals
+            # 一次性并发拉取全部K线
+            with scan.stage("candles"):
+                klines = asyncio.run(self.fetch_all_klines(top_pairs))
+            
+            signals_found = {}
+            
+            with scan.stage("detect"):
+                for i, symbol in enumerate(top_pairs):
+                    print(f"扫描进度: {i+1}/{len(top_pairs)} - {symbol}")
                     
-                    # 避免API限制
-                    time.sleep(0.1)
+                    symbol_signals = {}
                     
-                except Exception as e:
-                    print(f"分析 {symbol} {tf_name} 时出错: {e}")
-                    continue
+                    # 扫描所有时间级别
+                    for tf_name, tf_value in self.timeframes.items():
+                        try:
+                            df = klines.get((symbol, tf_name))
+                            if df is None:
+                                continue
+                            signals = self.analyze_symbol(symbol, tf_value, df)
+                            if signals:
+                                signals = self.new_signals(symbol, tf_name, signals)
+                            if signals:
+                                symbol_signals[tf_name] = signals
+                            
+                        except Exception as e:
+                            print(f"分析 {symbol} {tf_name} 时出错: {e}")
+                            continue
+                    
+                    if symbol_signals:
+                        signals_found[symbol] = symbol_signals
+                
+                # 保存指标状态，重启后无需重新预热
+                self.rsi_state.save()
             
-            if symbol_signals:
-                signals_found[symbol] = symbol_signals
-        
-        # 发送结果
-        if signals_found:
-            message = self.format_signal_message(signals_found)
-            if message:
-                print("\n发现交易信号:")
-                print(message)
-                self.send_discord_message(message)
-        else:
-            print("未发现符合条件的交易信号")
+            # 发送结果
+            with scan.stage("push"):
+                if signals_found:
+                    message = self.format_signal_message(signals_found)
+                    if message:
+                        print("\n发现交易信号:")
+                        print(message)
+                        self.send_discord_message(message)
+                        for timeframes in signals_found.values():
+                            for tf_name, signals in timeframes.items():
+                                for signal in signals:
+                                    # 信号在未收盘的最新K线上，延迟从最近一根已收盘K线的收盘（即当前K线开盘）起算
+                                    scan.alert_delay(tf_name, last_closed(tf_name))
+                else:
+                    print("未发现符合条件的交易信号")
     
     def run_continuous_scan(self, interval_minutes=30):
         """持续扫描"""
         print(f"开始持续扫描，每 {interval_minutes} 分钟扫描一次...")
+        METRICS.serve()
         
         while True:
             try:
@@ -353,6 +405,66 @@ class OKXScanner:
                 print(f"扫描过程中出错: {e}")
                 time.sleep(60)  # 出错后等待1分钟再继续
 
+    def run_stream_mode(self, limit=100):
+        """WebSocket 实时模式：K线收盘即检测，无需轮询"""
+        print("开始获取交易量前200的交易对...")
+        top_pairs = self.get_top_volume_pairs(200)
+        if not top_pairs:
+            return
+        
+        stream = ResampledStream(top_pairs, list(self.timeframes.values()), window=limit)
+        tf_names = {v: k for k, v in self.timeframes.items()}
+        
+        async def on_close(symbol, tf_value, candles):
+            df = pd.DataFrame(candles, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+            signals = self.analyze_symbol(symbol, tf_value, df)
+            if signals:
+                signals = self.new_signals(symbol, tf_names[tf_value], signals)
+            if signals:
+                message = self.format_signal_message({symbol: {tf_names[tf_value]: signals}})
+                print(message)
+                self.send_discord_message(message)
+        
+        stream.on_close(on_close)
+        try:
+            asyncio.run(stream.run())
+        except KeyboardInterrupt:
+            print("\n用户中断扫描")
+        finally:
+            self.rsi_state.save()
+
+class RSIPinbarDetector(Detector):
+    """扫描宿主插件：RSI 超买超卖 + Pin Bar / 吞没"""
+
+    name = "rsi_pinbar"
+    timeframes = ['5m', '15m', '1h', '4h', '1d']
+    window = 100
+    top_n = 200
+
+    def __init__(self, scanner=None):
+        self.scanner = scanner or OKXScanner()
+
+    def scan(self, tf, windows, volumes):
+        results = []
+        for symbol, rows in windows.items():
+            df = pd.DataFrame(rows, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+            signals = self.scanner.analyze_symbol(symbol, tf, df)
+            if signals:
+                results.append((symbol, tf, signals))
+        return results
+
+    async def report(self, results):
+        self.scanner.rsi_state.save()
+        signals_found = {}
+        for symbol, tf, signals in results:
+            signals = self.scanner.new_signals(symbol, tf, signals)
+            if signals:
+                signals_found.setdefault(symbol, {})[tf] = signals
+        message = self.scanner.format_signal_message(signals_found)
+        if message:
+            print(message)
+            self.scanner.send_discord_message(message)
+
 def main():
     scanner = OKXScanner()
     
@@ -361,7 +473,7 @@ def main():
     print("扫描条件: RSI超买超卖 + K线反转形态")
     
     # 可以选择单次扫描或持续扫描
-    choice = input("\n选择模式 (1: 单次扫描, 2: 持续扫描): ")
+    choice = input("\n选择模式 (1: 单次扫描, 2: 持续扫描, 3: 实时推送): ")
     
     if choice == '1':
         scanner.scan_all_pairs()
@@ -372,6 +484,8 @@ def main():
         except:
             interval = 30
         scanner.run_continuous_scan(interval)
+    elif choice == '3':
+        scanner.run_stream_mode()
     else:
         print("无效选择")
 
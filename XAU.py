@@ -13,11 +13,93 @@ import warnings
 import time
 warnings.filterwarnings('ignore')
 
-def get_simple_data(ticker='GLD', period='6mo'):
+SIGNALS = ['Hold', 'Buy', 'Sell', 'Take Profit', 'Buy Dip']
+
+# ── 指标与信号（向量化，支持多标的宽表） ─────────────────
+def compute_rsi(close, period=14, method='sma'):
+    """向量化RSI，close 可为 Series（单标的）或 DataFrame（每列一个标的）
+
+    method='sma': 最近 period 个涨跌幅的简单平均（原逐行循环的算法，前 period 根为 50）
+    method='wilder': Wilder 平滑（alpha=1/period 的 RMA）
+    """
+    change = close.diff()
+    gains = change.clip(lower=0)
+    losses = (-change).clip(lower=0)
+    
+    if method == 'wilder':
+        avg_gain = gains.ewm(alpha=1 / period, min_periods=period, adjust=False).mean()
+        avg_loss = losses.ewm(alpha=1 / period, min_periods=period, adjust=False).mean()
+    else:
+        avg_gain = gains.rolling(window=period).mean()
+        avg_loss = losses.rolling(window=period).mean()
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+    rsi = rsi.where(avg_loss != 0, 100.0)   # 无下跌时 RSI=100
+    return rsi.where(avg_gain.notna(), 50.0)  # 数据不足时默认 50
+
+
+def compute_signals(close, rsi_method='sma'):
+    """对收盘价计算全部指标与信号，全程无逐行循环
+
+    Args:
+        close: Series 或 DataFrame（行为时间，列为标的）
+        rsi_method: 'sma' 或 'wilder'
+
+    Returns:
+        dict: EMA_20 / SMA_50 / RSI / Trend / Signal，形状与 close 相同
+    """
+    ema = close.ewm(span=20, adjust=False).mean()
+    sma = close.rolling(window=50).mean()
+    rsi = compute_rsi(close, 14, rsi_method)
+    
+    c, e, r = close.to_numpy(), ema.to_numpy(), rsi.to_numpy()
+    bull = c > e                         # EMA 缺失时按 Bear 处理，与原逻辑一致
+    warmup = close.notna().cumsum().to_numpy() <= 20   # 每个标的前 20 根数据不足
+    
+    # 按优先级选择信号（整数编码，最后再转成分类类型）
+    signal = np.select(
+        [warmup | np.isnan(c),
+         bull & (c > e * 1.005) & (r < 70),
+         ~bull & (c < e * 0.995) & (r > 30),
+         r > 80,
+         r < 20],
+        [0, 1, 2, 3, 4],
+        default=0
+    )
+    
+    def wrap(codes, categories):
+        if close.ndim == 1:
+            return pd.Series(pd.Categorical.from_codes(codes, categories), index=close.index)
+        return pd.DataFrame({col: pd.Categorical.from_codes(codes[:, j], categories)
+                             for j, col in enumerate(close.columns)}, index=close.index)
+    
+    return {
+        'EMA_20': ema,
+        'SMA_50': sma,
+        'RSI': rsi,
+        'Trend': wrap(bull.astype(np.int8), ['Bear', 'Bull']),
+        'Signal': wrap(signal, SIGNALS),
+    }
+
+
+def analyze(data, rsi_method='sma'):
+    """在单标的 OHLCV 数据上追加指标与信号列"""
+    for name, values in compute_signals(data['Close'], rsi_method).items():
+        data[name] = values
+    return data
+
+
+def download(tickers, period='6mo', interval='1d'):
+    """下载一个或多个标的，返回 yfinance 原始数据"""
+    return yf.download(tickers, period=period, interval=interval, progress=False)
+
+
+def get_simple_data(ticker='GLD', period='6mo', interval='1d', rsi_method='sma'):
     """获取简化的股票数据"""
     try:
         print(f"正在获取 {ticker} 数据...")
-        data = yf.download(ticker, period=period, interval='1d', progress=False)
+        data = download(ticker, period=period, interval=interval)
         
         if data.empty:
             return None
@@ -34,81 +116,7 @@ def get_simple_data(ticker='GLD', period='6mo'):
                 print(f"缺少必要的列: {col}")
                 return None
         
-        # 只计算最基础的指标
-        data['EMA_20'] = data['Close'].ewm(span=20, adjust=False).mean()
-        data['SMA_50'] = data['Close'].rolling(window=50).mean()
-        
-        # 手动计算RSI，避免对齐问题
-        close_prices = data['Close'].values
-        rsi_values = []
-        
-        for i in range(len(close_prices)):
-            if i < 14:
-                rsi_values.append(50.0)  # 默认值
-            else:
-                # 计算14天的价格变化
-                gains = []
-                losses = []
-                for j in range(i-13, i+1):
-                    change = close_prices[j] - close_prices[j-1]
-                    if change > 0:
-                        gains.append(change)
-                        losses.append(0)
-                    else:
-                        gains.append(0)
-                        losses.append(abs(change))
-                
-                avg_gain = sum(gains) / 14
-                avg_loss = sum(losses) / 14
-                
-                if avg_loss == 0:
-                    rsi = 100
-                else:
-                    rs = avg_gain / avg_loss
-                    rsi = 100 - (100 / (1 + rs))
-                
-                rsi_values.append(rsi)
-        
-        data['RSI'] = rsi_values
-        
-        # 趋势判断
-        trend_list = []
-        for i in range(len(data)):
-            close_val = float(data['Close'].iloc[i])
-            ema_val = data['EMA_20'].iloc[i]
-            if pd.isna(ema_val):
-                ema_val = close_val
-            else:
-                ema_val = float(ema_val)
-            trend_list.append('Bull' if close_val > ema_val else 'Bear')
-        
-        data['Trend'] = trend_list
-        
-        # 简单信号
-        signals = []
-        for i in range(len(data)):
-            if i < 20:  # 数据不足
-                signals.append('Hold')
-                continue
-                
-            current_price = data['Close'].iloc[i]
-            ema = data['EMA_20'].iloc[i]
-            rsi = data['RSI'].iloc[i]
-            trend = data['Trend'].iloc[i]
-            
-            # 生成信号
-            if trend == 'Bull' and current_price > ema * 1.005 and rsi < 70:
-                signals.append('Buy')
-            elif trend == 'Bear' and current_price < ema * 0.995 and rsi > 30:
-                signals.append('Sell')
-            elif rsi > 80:
-                signals.append('Take Profit')
-            elif rsi < 20:
-                signals.append('Buy Dip')
-            else:
-                signals.append('Hold')
-        
-        data['Signal'] = signals
+        data = analyze(data, rsi_method)
         
         print(f"✅ 成功获取 {len(data)} 条数据")
         return data
@@ -117,6 +125,48 @@ def get_simple_data(ticker='GLD', period='6mo'):
         print(f"❌ 获取数据失败: {e}")
         return None
 
+
+def get_multi_data(tickers, period='6mo', interval='1d', rsi_method='sma'):
+    """一次下载多个标的并在宽表上统一计算，返回 {ticker: DataFrame}"""
+    try:
+        print(f"正在获取 {', '.join(tickers)} 数据...")
+        raw = download(list(tickers), period=period, interval=interval)
+        if raw.empty:
+            return {}
+        
+        close = raw['Close'].dropna(how='all')
+        results = compute_signals(close, rsi_method)
+        
+        out = {}
+        for ticker in close.columns:
+            if close[ticker].notna().sum() == 0:
+                continue
+            frame = raw.xs(ticker, axis=1, level=1).loc[close.index].copy()
+            for name, values in results.items():
+                frame[name] = values[ticker]
+            out[ticker] = frame.dropna(subset=['Close'])
+        return out
+    except Exception as e:
+        print(f"❌ 获取数据失败: {e}")
+        return {}
+
+
+def benchmark(sizes=(100_000, 1_000_000, 5_000_000), tickers=1):
+    """合成分钟级随机游走，验证计算耗时随K线数线性增长"""
+    print(f"\n⏱  向量化管线基准（{tickers} 个标的）")
+    rng = np.random.default_rng(0)
+    for n in sizes:
+        index = pd.date_range('2015-01-01', periods=n, freq='min')
+        close = pd.DataFrame(2000 + np.cumsum(rng.normal(0, 0.5, (n, tickers)), axis=0), index=index)
+        if tickers == 1:
+            close = close[0]
+        for method in ('sma', 'wilder'):
+            start = time.perf_counter()
+            compute_signals(close, method)
+            elapsed = time.perf_counter() - start
+            print(f"  {n:>10,} 根 × {tickers} | {method:<6} | {elapsed:7.3f}s | "
+                  f"{elapsed / (n * tickers) * 1e9:6.1f} ns/根")
+
 def print_recent_analysis(data, ticker, days=5):
     """打印最近的分析结果"""
     if data is None or len(data) < days:
@@ -207,7 +257,7 @@ def main():
             print_recent_analysis(data, ticker, days=5)
             
             # 统计信号
-            signal_counts = data['Signal'].value_counts()
+            signal_counts = data['Signal'].value_counts()[lambda s: s > 0]   # 分类类型会列出 0 次的类别
             print(f"\n信号统计:")
             for signal, count in signal_counts.items():
                 if signal != 'Hold':
@@ -228,4 +278,8 @@ def main():
         print(f"\n✅ 分析完成!")
 
 if __name__ == "__main__":
-    main()
+    import sys
+    if "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+信号去重 · 持久化警报状态
+按 (检测器, 交易对, 周期, 信号) 记录最近一次出现的K线与推送时间，只放行新出现或升级的信号
+"""
+
+import os, sqlite3, threading, time
+from bisect import bisect_right
+from typing import Optional, Sequence
+
+from candle_store import timeframe_ms
+
+# ── 常量 ──────────────────────────────────────────────────
+ALERT_DB      = os.getenv("ALERT_DB",
+                          os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "alerts.db"))
+SUPPRESS_BARS = 3                      # 信号消失后重新出现，至少间隔 N 根K线才再次推送
+RETENTION_MS  = 30 * 24 * 3600 * 1000  # 超过 30 天未出现的记录清理掉
+
+NEW, ESCALATED = "new", "escalated"
+
+
+def tier(value: float, thresholds: Sequence[float]) -> int:
+    """value 达到的档位数，例如 tier(45, (20, 40, 80)) == 2，用于判定信号是否升级"""
+    return bisect_right(thresholds, value)
+
+
+class AlertStore:
+    """警报状态库（SQLite，线程安全）
+
+    同一信号在连续的K线上持续出现视为同一轮，只在首次出现时推送；
+    同一根K线重复扫描不再推送；强度档位 level 提高时视为升级，立即推送；
+    信号中断后重新出现，距上次推送超过 SUPPRESS_BARS 根K线才作为新信号推送。
+
+    用法:
+        if ALERTS.check("engulfing", "BTC/USDT", "1h", "Bullish", bar_ts):
+            ...推送
+    """
+
+    def __init__(self, path: str = ALERT_DB, suppress_bars: int = SUPPRESS_BARS):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.suppress_bars = suppress_bars
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS alerts (
+                detector   TEXT NOT NULL,
+                symbol     TEXT NOT NULL,
+                timeframe  TEXT NOT NULL,
+                signal     TEXT NOT NULL,
+                bar_ts     INTEGER NOT NULL,   -- 最近一次出现信号的K线开盘时间
+                level      REAL NOT NULL,      -- 最近一次出现时的强度档位
+                sent_ts    INTEGER NOT NULL,   -- 最近一次推送时间
+                sent_level REAL NOT NULL,      -- 最近一次推送时的强度档位
+                PRIMARY KEY (detector, symbol, timeframe, signal)
+            )""")
+        self.db.execute("DELETE FROM alerts WHERE bar_ts < ?", (int(time.time() * 1000) - RETENTION_MS,))
+        self.db.commit()
+
+    def check(self, detector: str, symbol: str, timeframe: str, signal: str, bar_ts: int,
+              level: float = 0, now_ms: Optional[int] = None) -> Optional[str]:
+        """记录一次信号出现，返回 NEW / ESCALATED，不需要推送时返回 None"""
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        step = timeframe_ms(timeframe)
+        key = (detector, symbol, timeframe.lower(), signal)
+        with self.lock:
+            row = self.db.execute(
+                "SELECT bar_ts, sent_ts, sent_level FROM alerts "
+                "WHERE detector=? AND symbol=? AND timeframe=? AND signal=?", key).fetchone()
+            if row is None:
+                verdict = NEW
+            else:
+                last_bar, sent_ts, sent_level = row
+                if level > sent_level:
+                    verdict = ESCALATED
+                elif bar_ts <= last_bar or bar_ts - last_bar <= step:
+                    verdict = None          # 同一根K线或同一轮信号
+                elif now_ms - sent_ts < self.suppress_bars * step:
+                    verdict = None          # 中断后很快重新出现，仍在抑制窗口内
+                else:
+                    verdict = NEW
+                bar_ts = max(bar_ts, last_bar)
+
+            if verdict:
+                self.db.execute("INSERT OR REPLACE INTO alerts VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                (*key, bar_ts, level, now_ms, level))
+            else:
+                self.db.execute("UPDATE alerts SET bar_ts=?, level=? "
+                                "WHERE detector=? AND symbol=? AND timeframe=? AND signal=?",
+                                (bar_ts, level, *key))
+            self.db.commit()
+        return verdict
+
+
+# ── 进程内共享实例 ────────────────────────────────────────
+ALERTS = AlertStore()
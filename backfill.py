@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+历史K线回填 · OKX history-candles 向前翻页 · 断点续传
+多个 (交易对, 周期) 并发下载并按接口限速排队；每页先追加到暂存列文件并记录进度，
+中断后从上次的位置继续，全部完成后一次性并入本地K线仓库
+"""
+
+import asyncio, json, os, shutil, sys, time
+import numpy as np
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from bar_clock import last_closed
+from candle_store import CANDLES, COLUMNS, DTYPES, CandleStore, normalize_timeframe, timeframe_ms
+from okx_async_client import OKXAsyncClient
+from universe import UNIVERSE
+
+# ── 常量 ──────────────────────────────────────────────────
+CONCURRENCY   = 8           # 同时回填的序列数（总速率由 history-candles 令牌桶限制）
+REPORT_SEC    = 5           # 进度输出间隔秒数
+DEFAULT_DAYS  = 365         # 未指定 --since 时回填的天数
+TIMEFRAMES    = ["1m", "5m", "15m", "1h", "4h", "1d"]
+STAGING_DIR   = "_backfill"   # 仓库根目录下的暂存目录
+
+
+class BackfillJob:
+    """单个序列的回填任务，进度保存在暂存目录的 checkpoint.json
+
+    从 end 向前翻页到 since；本地仓库已有的 [first, last] 区间直接跳过，
+    只下载更早与更新的部分。暂存列文件按下载顺序（时间倒序）追加。
+    """
+
+    def __init__(self, store: CandleStore, symbol: str, timeframe: str, since: int):
+        self.store = store
+        self.symbol = symbol
+        self.timeframe = normalize_timeframe(timeframe)
+        self.step = timeframe_ms(self.timeframe)
+        key = symbol.replace("/", "-").replace(":", "_")
+        self.dir = os.path.join(store.root, STAGING_DIR, key, self.timeframe)
+        self.state = self._load() or self._plan(since)
+
+    # ── 进度 ──────────────────────────────────────────────
+    def _plan(self, since: int) -> Dict:
+        end = last_closed(self.timeframe)
+        return {
+            "since": since, "end": end, "cursor": end + self.step, "rows": 0, "done": False,
+            "have_first": self.store.first_ts(self.symbol, self.timeframe),
+            "have_last": self.store.last_ts(self.symbol, self.timeframe),
+        }
+
+    def _load(self) -> Optional[Dict]:
+        """读取断点，并把暂存列截断到断点记录的行数（写入中途中断时多出的部分丢弃）"""
+        path = os.path.join(self.dir, "checkpoint.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            state = json.load(f)
+        for col in COLUMNS:
+            col_path = os.path.join(self.dir, f"{col}.bin")
+            if os.path.exists(col_path):
+                with open(col_path, "ab") as f:
+                    f.truncate(state["rows"] * np.dtype(DTYPES[col]).itemsize)
+        return state
+
+    def _save(self) -> None:
+        path = os.path.join(self.dir, "checkpoint.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.state, f)
+        os.replace(path + ".tmp", path)
+
+    @property
+    def label(self) -> str:
+        return f"{self.symbol} {self.timeframe}"
+
+    # ── 翻页 ──────────────────────────────────────────────
+    def _skip_stored(self, cursor: int) -> int:
+        """游标落入本地已有区间时直接跳到区间起点"""
+        first, last = self.state["have_first"], self.state["have_last"]
+        if first is not None and first < cursor <= last + self.step:
+            return first
+        return cursor
+
+    def _stage(self, rows: List[List]) -> None:
+        """按时间倒序追加一页到暂存列文件（ts 列最后写入）"""
+        arr = np.asarray(rows, dtype=np.float64)[::-1]
+        for j, col in reversed(list(enumerate(COLUMNS))):
+            with open(os.path.join(self.dir, f"{col}.bin"), "ab") as f:
+                f.write(arr[:, j].astype(DTYPES[col]).tobytes())
+
+    async def run(self, client: OKXAsyncClient, progress: "Progress") -> None:
+        os.makedirs(self.dir, exist_ok=True)
+        state = self.state
+        state["cursor"] = self._skip_stored(state["cursor"])
+        first, last = state["have_first"], state["have_last"]
+        while not state["done"]:
+            if state["cursor"] <= state["since"]:
+                state["done"] = True
+                break
+            page = await client.fetch_history(self.symbol, self.timeframe, after=state["cursor"])
+            if not page:
+                state["done"] = True      # 已到上市首根
+                break
+            keep = [r for r in page if state["since"] <= r[0] <= state["end"]
+                    and (first is None or not first <= r[0] <= last)]
+            if keep:
+                self._stage(keep)
+                state["rows"] += len(keep)
+                progress.bars += len(keep)
+            state["cursor"] = self._skip_stored(page[0][0])
+            self._save()
+        self._save()
+        self.merge()
+
+    # ── 合并 ──────────────────────────────────────────────
+    def staged(self) -> np.ndarray:
+        """暂存数据，(n, 6) 正序"""
+        n = self.state["rows"]
+        if n == 0:
+            return np.empty((0, len(COLUMNS)))
+        cols = [np.fromfile(os.path.join(self.dir, f"{c}.bin"), dtype=DTYPES[c], count=n) for c in COLUMNS]
+        return np.column_stack(cols).astype(np.float64)[::-1]
+
+    def merge(self) -> int:
+        """暂存数据与仓库现有数据按时间戳合并（重复以仓库为准），换入后删除暂存目录
+
+        backfill 作为独立进程与扫描进程同时运行，依赖 CandleStore 的 flock 序列锁串行化换入与读写
+        """
+        new = self.staged()
+        self.store.merge(self.symbol, self.timeframe, new)   # 跨进程序列锁内读取、合并、换入，扫描进程的追加不会丢失
+        shutil.rmtree(self.dir, ignore_errors=True)
+        try:
+            os.removedirs(os.path.dirname(self.dir))   # 顺带删除已空的上级暂存目录
+        except OSError:
+            pass
+        return len(new)
+
+
+class Progress:
+    """全部任务共用的计数与速率输出"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.finished = 0
+        self.bars = 0
+        self.started = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        return self.bars / max(time.monotonic() - self.started, 1e-9)
+
+    def line(self) -> str:
+        elapsed = time.monotonic() - self.started
+        return (f"{self.finished}/{self.total} 序列 | {self.bars:,} 根 | "
+                f"{self.rate:,.0f} 根/秒 | {elapsed:,.0f}s")
+
+    async def report(self, every: float = REPORT_SEC) -> None:
+        while True:
+            await asyncio.sleep(every)
+            print(self.line())
+
+
+async def backfill(symbols: List[str], timeframes: List[str], since: int,
+                   store: CandleStore = CANDLES, concurrency: int = CONCURRENCY,
+                   client: Optional[OKXAsyncClient] = None) -> Progress:
+    """并发回填 symbols × timeframes 自 since（毫秒）起的历史，已有断点的序列从断点继续"""
+    own_client = client is None
+    client = client or OKXAsyncClient()
+    jobs = [BackfillJob(store, s, tf, since) for s in symbols for tf in timeframes]
+    progress = Progress(len(jobs))
+    limiter = asyncio.Semaphore(concurrency)
+
+    async def run(job: BackfillJob) -> None:
+        async with limiter:
+            try:
+                await job.run(client, progress)
+            except Exception as e:
+                print(f"{job.label}: {type(e).__name__}: {e}（进度已保存，重新运行即可继续）", file=sys.stderr)
+                return
+            progress.finished += 1
+
+    reporter = asyncio.create_task(progress.report())
+    try:
+        await asyncio.gather(*(run(j) for j in jobs))
+    finally:
+        reporter.cancel()
+        if own_client:
+            await client.close()
+    print(f"完成 {progress.line()}")
+    return progress
+
+
+def parse_date(text: str) -> int:
+    """YYYY-MM-DD（UTC）→ 毫秒时间戳"""
+    dt = datetime.strptime(text, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+async def main(args: List[str]) -> None:
+    opts: Dict[str, str] = {}
+    for flag in ("--since", "--timeframes", "--top", "--concurrency"):
+        if flag in args:
+            i = args.index(flag)
+            opts[flag] = args[i + 1]
+            del args[i:i + 2]
+    since = parse_date(opts["--since"]) if "--since" in opts else \
+        int(time.time() * 1000) - DEFAULT_DAYS * 86_400_000
+    timeframes = opts["--timeframes"].split(",") if "--timeframes" in opts else TIMEFRAMES
+    symbols = args
+    if "--top" in opts:
+        async with OKXAsyncClient() as client:
+            ranking = await UNIVERSE.select_async(client, int(opts["--top"]), "USDT")
+        symbols += [s for s in ranking.symbols if s not in symbols]
+    symbols = symbols or ["BTC/USDT"]
+    print(f"回填 {len(symbols)} 个交易对 × {', '.join(timeframes)}，"
+          f"自 {datetime.fromtimestamp(since / 1000, timezone.utc):%Y-%m-%d}")
+    await backfill(symbols, timeframes, since, concurrency=int(opts.get("--concurrency", CONCURRENCY)))
+
+
+if __name__ == "__main__":
+    # python backfill.py BTC/USDT ETH/USDT --since 2021-01-01 --timeframes 1m,4h
+    # python backfill.py --top 50 --timeframes 4h          （交易对池成交额前 50）
+    try:
+        asyncio.run(main(sys.argv[1:]))
+    except KeyboardInterrupt:
+        print("\n已中断，重新运行同样的命令即可从断点继续")
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+事件驱动回测引擎 · 复刻 TradingView strategy 的成交规则
+信号K线收盘后下一根开盘入场，ATR 止损 / 止盈 / 持仓K线数上限 / 离场信号，计入手续费与滑点
+只在信号与离场事件之间跳转，多年 4H / 5m 历史、多交易对可快速反复迭代规则
+"""
+
+import sys
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from candle_store import CANDLES
+
+# ── 常量（与 AlBrooks_BTC_4H_MajorReversal_v5.pine 的 strategy 默认值一致）──
+COMMISSION        = 0.00075     # 0.075%，按每边成交额收取
+SLIPPAGE_BPS      = 2.0         # 市价 / 止损成交的不利滑点（基点）；Pine 的 slippage=2 为最小跳动单位
+ATR_PERIOD        = 14
+ATR_STOP_MULT     = 2.5
+PROFIT_TARGET_ATR = 3.0
+MAX_BARS_IN_TRADE = 6           # 4H 上即 24 小时
+RISK_PCT          = 0.02        # 每笔风险占权益比例
+INITIAL_CAPITAL   = 50000.0
+SCAN_CHUNK        = 64          # 无持仓上限时，每次向后搜索的K线数
+
+LONG_LABELS  = ("Buy", "Strong_Buy", "Buy_Dip")
+SHORT_LABELS = ("Sell", "Strong_Sell", "Sell_Rally")
+TS, OPEN, HIGH, LOW, CLOSE, VOLUME = range(6)
+
+
+class BacktestConfig(NamedTuple):
+    commission: float = COMMISSION
+    slippage_bps: float = SLIPPAGE_BPS
+    atr_period: int = ATR_PERIOD
+    atr_stop_mult: float = ATR_STOP_MULT
+    profit_target_atr: Optional[float] = PROFIT_TARGET_ATR   # None 为不设止盈
+    max_bars: Optional[int] = MAX_BARS_IN_TRADE             # None 为不限持仓时间
+    risk_pct: float = RISK_PCT
+    max_leverage: float = 1.0                               # 仓位名义价值上限（权益倍数）
+    initial_capital: float = INITIAL_CAPITAL
+
+
+class Trade(NamedTuple):
+    symbol: str
+    side: int               # 1 多 / -1 空
+    signal_idx: int
+    entry_idx: int
+    exit_idx: int
+    entry_ts: int
+    exit_ts: int
+    entry_price: float
+    exit_price: float
+    stop: float
+    target: float
+    reason: str             # stop / target / time / exit / end
+    bars: int               # 持仓K线数（含入场K线）
+    ret: float              # 扣除手续费后的收益率（相对入场价）
+    r_multiple: float       # 以信号K线收盘到止损的距离计的盈亏倍数
+    pnl: float              # 按风险仓位计算的盈亏金额
+
+
+class Result(NamedTuple):
+    symbol: str
+    trades: List[Trade]
+    equity: np.ndarray      # 每笔平仓后的权益，首元素为初始资金
+
+
+# ── 输入转换 ──────────────────────────────────────────────
+def load_ohlcv(symbol: str, timeframe: str, store=CANDLES) -> np.ndarray:
+    """从本地K线仓库读取全部历史，返回 (n, 6) float64 数组 [ts, o, h, l, c, v]"""
+    return store.history(symbol, timeframe)   # 一次加锁读出全部列，不会混入另一进程换入的新版本
+
+
+def to_frame(ohlcv: np.ndarray) -> pd.DataFrame:
+    """(n, 6) 数组 → btc_price_action 使用的 DataFrame（Open/High/Low/Close/Volume，时间索引）"""
+    return pd.DataFrame(ohlcv[:, OPEN:], columns=["Open", "High", "Low", "Close", "Volume"],
+                        index=pd.to_datetime(ohlcv[:, TS].astype(np.int64), unit="ms"))
+
+
+def signals_from_labels(labels: Sequence[str]) -> np.ndarray:
+    """generate_signals 的 Signal 列 → 1 做多 / -1 做空 / 0 无信号"""
+    labels = np.asarray(labels, dtype=object)
+    return (np.isin(labels, LONG_LABELS).astype(np.int8) - np.isin(labels, SHORT_LABELS).astype(np.int8))
+
+
+def price_action_signals(ohlcv: np.ndarray) -> np.ndarray:
+    """btc_price_action 的 Al Brooks 信号"""
+    from btc_price_action import calculate_price_action, detect_patterns, generate_signals
+    data = calculate_price_action(to_frame(ohlcv))
+    data = generate_signals(data, detect_patterns(data))
+    return signals_from_labels(data["Signal"].to_numpy())
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = ATR_PERIOD) -> np.ndarray:
+    """Wilder ATR，等价于 Pine ta.atr(period)（前 period 根以 SMA 起算）"""
+    prev_close = np.r_[np.nan, close[:-1]]
+    tr = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    out = np.full(len(tr), np.nan)
+    if len(tr) < period:
+        return out
+    seeded = tr.copy()
+    seeded[:period - 1] = np.nan
+    seeded[period - 1] = tr[:period].mean()
+    out[period - 1:] = pd.Series(seeded[period - 1:]).ewm(alpha=1 / period, adjust=False).mean().to_numpy()
+    return out
+
+
+# ── 成交模拟 ──────────────────────────────────────────────
+def _intrabar(side: int, o: float, h: float, l: float, stop: float, target: float):
+    """单根K线内的止损 / 止盈判定，返回 (原因, 价格) 或 None
+
+    开盘已越过止损或止盈按开盘价成交；两者同时触及时按 Pine 的假设：
+    开盘离最高价更近则先走最高价，否则先走最低价。
+    """
+    if side > 0:
+        if o <= stop:
+            return "stop", o
+        if o >= target:
+            return "target", o
+        hit_stop, hit_target = l <= stop, h >= target
+        if hit_stop and hit_target:
+            return ("target", target) if h - o < o - l else ("stop", stop)
+    else:
+        if o >= stop:
+            return "stop", o
+        if o <= target:
+            return "target", o
+        hit_stop, hit_target = h >= stop, l <= target
+        if hit_stop and hit_target:
+            return ("target", target) if o - l < h - o else ("stop", stop)
+    if hit_stop:
+        return "stop", stop
+    if hit_target:
+        return "target", target
+    return None
+
+
+def _find_exit(side: int, e: int, stop: float, target: float, o: np.ndarray, h: np.ndarray,
+               l: np.ndarray, exit_flags: Optional[np.ndarray], max_bars: Optional[int]):
+    """从入场K线 e 起寻找第一个离场事件，返回 (离场K线, 原因, 价格)"""
+    n = len(o)
+    end = n if max_bars is None else min(e + max_bars, n)
+    start = e
+    while start < end:
+        chunk_end = min(start + SCAN_CHUNK, end) if max_bars is None else end
+        hs, ls = h[start:chunk_end], l[start:chunk_end]
+        touched = (ls <= stop) | (hs >= target) if side > 0 else (hs >= stop) | (ls <= target)
+        k = int(np.argmax(touched)) if touched.any() else None
+        # 离场信号在收盘确认，下一根开盘成交，只有早于盘中触及才生效
+        m = None
+        if exit_flags is not None:
+            flags = exit_flags[start:chunk_end]
+            if flags.any():
+                m = int(np.argmax(flags))
+        if m is not None and (k is None or m < k) and start + m + 1 < n:
+            return start + m + 1, "exit", o[start + m + 1]
+        if k is not None:
+            j = start + k
+            reason, price = _intrabar(side, o[j], h[j], l[j], stop, target)
+            return j, reason, price
+        start = chunk_end
+    if end < n:
+        return end, "time", o[end]           # 第 max_bars 根收盘后平仓，下一根开盘成交
+    return n - 1, "end", None                # 数据结束仍持仓，按最后收盘价结算
+
+
+def backtest(ohlcv: np.ndarray, signals: np.ndarray, config: BacktestConfig = BacktestConfig(),
+             symbol: str = "", stops: Optional[np.ndarray] = None, targets: Optional[np.ndarray] = None,
+             exit_long: Optional[np.ndarray] = None, exit_short: Optional[np.ndarray] = None) -> Result:
+    """单交易对回测
+
+    Args:
+        ohlcv: (n, 6) 已收盘K线 [ts, o, h, l, c, v]
+        signals: 长度 n，1 做多 / -1 做空 / 0 无信号（在该K线收盘时确认）
+        config: 成本与风控参数
+        stops / targets: 可选，按信号K线给出的止损 / 止盈价（NaN 处回退到 ATR 规则）
+        exit_long / exit_short: 可选，收盘确认的离场信号（如 Pine 的 EMA Break）
+    """
+    ts, o, h, l, c = (np.ascontiguousarray(ohlcv[:, i]) for i in (TS, OPEN, HIGH, LOW, CLOSE))
+    n = len(c)
+    atr_ = atr(h, l, c, config.atr_period)
+    slip = config.slippage_bps / 10000
+    equity = config.initial_capital
+    curve, trades = [equity], []
+
+    free_from = 0
+    for s in np.flatnonzero(signals[:n - 1]):
+        if s < free_from or s < 1 or np.isnan(atr_[s]):
+            continue
+        side, e = int(signals[s]), s + 1
+        a = atr_[s]
+
+        stop = stops[s] if stops is not None else np.nan
+        if np.isnan(stop):
+            stop = min(l[s], l[s - 1]) - a * config.atr_stop_mult if side > 0 else \
+                max(h[s], h[s - 1]) + a * config.atr_stop_mult
+        target = targets[s] if targets is not None else np.nan
+        if np.isnan(target):
+            target = c[s] + side * a * config.profit_target_atr if config.profit_target_atr else \
+                side * np.inf
+
+        entry = o[e] * (1 + side * slip)
+        # 仓位按信号K线收盘到止损的距离计算（Pine: long_risk_per_share = close - long_stop_price）；
+        # 入场开盘已越过止损时照常入场，_find_exit 在入场K线按开盘价止损
+        risk = side * (c[s] - stop)
+        if risk <= 0:
+            continue  # Pine 中仓位为 0，不下单
+
+        flags = exit_long if side > 0 else exit_short
+        x, reason, price = _find_exit(side, e, stop, target, o, h, l, flags, config.max_bars)
+        if price is None:
+            price = c[x]
+        if reason != "target":
+            price *= 1 - side * slip             # 限价止盈无滑点，其余按不利方向滑点
+
+        net = side * (price - entry) - config.commission * (entry + price)
+        qty = min(equity * config.risk_pct / risk, equity * config.max_leverage / entry)
+        pnl = qty * net
+        equity += pnl
+        curve.append(equity)
+        trades.append(Trade(symbol, side, int(s), e, int(x), int(ts[e]), int(ts[x]), float(entry),
+                            float(price), float(stop), float(target), reason,
+                            int(x - e) + (reason in ("stop", "target", "end")),
+                            float(net / entry), float(net / risk), float(pnl)))
+        free_from = x  # 离场所在K线收盘时已空仓，可接受新信号
+
+    return Result(symbol, trades, np.array(curve))
+
+
+# ── 统计 ──────────────────────────────────────────────────
+def summarize(trades: List[Trade], equity: Optional[np.ndarray] = None) -> Dict[str, float]:
+    """胜率、平均收益、盈亏比、最大回撤等"""
+    if not trades:
+        return {"trades": 0}
+    ret = np.array([t.ret for t in trades])
+    r = np.array([t.r_multiple for t in trades])
+    gains, losses = ret[ret > 0].sum(), -ret[ret < 0].sum()
+    out = {
+        "trades": len(trades),
+        "win_rate": float((ret > 0).mean()),
+        "avg_ret": float(ret.mean()),
+        "avg_r": float(r.mean()),
+        "profit_factor": float(gains / losses) if losses else float("inf"),
+        "avg_bars": float(np.mean([t.bars for t in trades])),
+    }
+    if equity is not None and len(equity) > 1:
+        peak = np.maximum.accumulate(equity)
+        out["total_return"] = float(equity[-1] / equity[0] - 1)
+        out["max_drawdown"] = float(((peak - equity) / peak).max())
+    for reason in ("stop", "target", "time", "exit", "end"):
+        out[f"exit_{reason}"] = sum(t.reason == reason for t in trades)
+    return out
+
+
+def backtest_many(symbols: List[str], timeframe: str,
+                  signal_fn: Callable[[np.ndarray], np.ndarray] = price_action_signals,
+                  config: BacktestConfig = BacktestConfig(), store=CANDLES) -> pd.DataFrame:
+    """对本地仓库中的多个交易对逐一回测，返回每个交易对一行的统计表"""
+    rows = []
+    for symbol in symbols:
+        ohlcv = load_ohlcv(symbol, timeframe, store)
+        if len(ohlcv) < config.atr_period + 2:
+            print(f"{symbol} {timeframe}: 本地K线不足，跳过", file=sys.stderr)
+            continue
+        result = backtest(ohlcv, signal_fn(ohlcv), config, symbol)
+        rows.append({"symbol": symbol, "bars": len(ohlcv), **summarize(result.trades, result.equity)})
+    return pd.DataFrame(rows).set_index("symbol") if rows else pd.DataFrame()
+
+
+if __name__ == "__main__":
+    # python backtest.py 4h BTC/USDT ETH/USDT  （需先用 CandleStore 回填历史）
+    tf = sys.argv[1] if len(sys.argv) > 1 else "4h"
+    pairs = sys.argv[2:] or ["BTC/USDT"]
+    table = backtest_many(pairs, tf)
+    print(table.to_string() if not table.empty else "没有可回测的数据")
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+K线收盘时钟 · 只调度刚收盘的周期
+5m 每 5 分钟、1h 每小时、1D 每天（UTC+8 零点，与 OKX 日线一致）各触发一次
+"""
+
+import asyncio, time
+from typing import Dict, List, Optional
+
+from candle_store import timeframe_ms
+
+# ── 常量 ──────────────────────────────────────────────────
+DAY_OFFSET_MS   = 8 * 3600 * 1000   # OKX K线按 UTC+8 对齐（6H / 12H / 日线及以上受影响）
+WEEK_OFFSET_MS  = DAY_OFFSET_MS + 3 * 86_400_000   # 周线从周一开盘（1970-01-01 为周四）
+CLOSE_DELAY_SEC = 2                 # 收盘后稍等，确保交易所已生成最终K线
+
+
+def bar_open(tf: str, ts_ms: int) -> int:
+    """ts_ms 所在K线的开盘时间（按 UTC+8 对齐，周线从周一开始；ts_ms 也可为 int64 数组）
+
+    能整除 8 小时的周期（1m ~ 4H）偏移不影响结果；6H / 12H 开盘于 UTC 04/10/16/22 与 04/16 点
+    """
+    step = timeframe_ms(tf)
+    offset = WEEK_OFFSET_MS if step == timeframe_ms("1w") else DAY_OFFSET_MS
+    return (ts_ms + offset) // step * step - offset
+
+
+def next_close(tf: str, ts_ms: int) -> int:
+    """ts_ms 之后最近一次收盘时间"""
+    return bar_open(tf, ts_ms) + timeframe_ms(tf)
+
+
+def last_closed(tf: str, ts_ms: Optional[int] = None) -> int:
+    """ts_ms 时最近一根已收盘K线的开盘时间"""
+    ts_ms = int(time.time() * 1000) if ts_ms is None else ts_ms
+    return bar_open(tf, ts_ms) - timeframe_ms(tf)
+
+
+def closed_bars(rows: List[List], tf: str, now_ms: Optional[int] = None) -> List[List]:
+    """去掉尚未收盘的最新K线（ccxt 格式，正序）"""
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    step = timeframe_ms(tf)
+    end = len(rows)
+    while end and rows[end - 1][0] + step > now_ms:
+        end -= 1
+    return rows[:end]
+
+
+class BarClock:
+    """按周期记录已处理到的K线，计算哪些周期刚刚收盘
+
+    用法:
+        clock = BarClock(["5m", "1h", "1d"])
+        while True:
+            due = await clock.wait()     # 首次立即返回全部周期
+            await scan(due)
+    """
+
+    def __init__(self, timeframes: List[str], delay: float = CLOSE_DELAY_SEC):
+        self.timeframes = list(timeframes)
+        self.delay = delay
+        self.last_bar: Dict[str, int] = {}   # 周期 → 上次处理时所在K线的开盘时间
+
+    def due(self, now_ms: Optional[int] = None) -> List[str]:
+        """自上次 mark 以来有K线收盘的周期"""
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        return [tf for tf in self.timeframes if self.last_bar.get(tf) != bar_open(tf, now_ms)]
+
+    def mark(self, timeframes: List[str], now_ms: Optional[int] = None) -> None:
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        for tf in timeframes:
+            self.last_bar[tf] = bar_open(tf, now_ms)
+
+    def next_close(self, now_ms: Optional[int] = None) -> int:
+        """所有周期中最近的一次收盘时间"""
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        return min(next_close(tf, now_ms) for tf in self.timeframes)
+
+    async def wait(self) -> List[str]:
+        """等到下一次收盘（有未处理的周期时立即返回），返回刚收盘的周期并标记为已处理"""
+        due = self.due()
+        if not due:
+            wake_ms = self.next_close()
+            await asyncio.sleep(max(0.0, wake_ms / 1000 - time.time()) + self.delay)
+            due = self.due()
+        self.mark(due)
+        return due
+
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能基准 · 形态检测 / 指标 / 整轮扫描 · 与基线比对
+行情全部合成：纯计算的用例直接喂数据，需要联网的用例由子进程中的 okx_replay 回放服务提供，
+结果稳定可复现。每个用例报告单次调用的 p50 / p90 耗时与峰值内存，任一项超出基线阈值即以非零码退出。
+快用例在一个样本内连续调用多次，使每个样本不短于 MIN_SAMPLE_MS；每个样本后紧接着跑一次固定的参考负载，
+本机（或当时）比基线慢时按参考负载的耗时比折算后再比对（只放宽不收紧）；疑似退化的用例重测一次，取较好的一次判定。
+
+    python bench.py                     # 全部用例，与 bench_baseline.json 比对
+    python bench.py full_scan engulf    # 只跑指定用例
+    python bench.py --save              # 把本次结果写入基线（确认性能变化符合预期后再提交）
+"""
+
+import asyncio, contextlib, io, json, math, os, socket, subprocess, sys, tempfile, time, tracemalloc
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from okx_replay import Fixtures
+
+# ── 常量 ──────────────────────────────────────────────────
+BASELINE_FILE  = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+THRESHOLD      = 0.25        # p50 比基线慢 / 峰值内存多占超过 25% 判为退化
+TAIL_THRESHOLD = 0.50        # p90 本身波动更大，超过 50% 才判为退化
+MIN_SAMPLE_MS  = 50.0        # 每个计时样本的最短时长，快用例在样本内连续调用多次
+MIN_DELTA_KB   = 256         # 绝对差值低于该 KB 的内存波动不计
+SCAN_SYMBOLS   = 200         # 整轮扫描的交易对数
+SCAN_TIMEFRAMES = ["5m", "15m", "1h", "4h", "1d"]
+SERIES_BARS    = 210         # 每个合成序列的K线数（覆盖 EMA 监控 5m 的 200 根）
+SERVER_WAIT    = 15          # 等待回放服务启动的秒数
+SEED           = 7
+UNTHROTTLED    = (10 ** 9, 1)   # 基准时的客户端限速（请求数, 窗口秒数）
+WEBHOOK_VARS   = ("DISCORD_WEBHOOK", "DISCORD_WEBHOOK_RSI", "DISCORD_WEBHOOK_TREND", "DISCORD_WEBHOOK_BROOKS")
+
+
+class Case(NamedTuple):
+    """一个基准用例：setup 做导入与数据准备，返回每轮计时调用的无参函数"""
+    name: str
+    setup: Callable[[], Callable[[], object]]
+    repeat: int
+    note: str
+
+
+class Result(NamedTuple):
+    p50_ms: float           # 单次调用耗时
+    p90_ms: float
+    peak_kb: float
+    reference_ms: float     # 与样本交替运行的参考负载耗时（中位数），用来折算机器 / 负载差异
+
+    @property
+    def relative(self) -> float:
+        return self.p50_ms / self.reference_ms
+
+
+# ── 合成行情 ──────────────────────────────────────────────
+def random_walk(n: int, timeframe: str = "1h", seed: int = SEED, end_ms: Optional[int] = None) -> np.ndarray:
+    """(n, 6) 随机游走K线 [ts, o, h, l, c, v]，最后一根为 end_ms 所在（未收盘）的K线"""
+    from bar_clock import bar_open
+    from candle_store import timeframe_ms
+
+    rng = np.random.default_rng(seed)
+    step = timeframe_ms(timeframe)
+    end = int(bar_open(timeframe, int(time.time() * 1000) if end_ms is None else end_ms))
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    spread = np.abs(rng.normal(0, 0.004, n)) * close
+    high = np.maximum(open_, close) + spread * rng.random(n)
+    low = np.minimum(open_, close) - spread * rng.random(n)
+    ts = end - step * np.arange(n - 1, -1, -1)
+    return np.column_stack([ts, open_, high, low, close, rng.uniform(1e3, 1e5, n)])
+
+
+def price_frame(n: int, seed: int = SEED) -> pd.DataFrame:
+    """yfinance 格式的日线 DataFrame"""
+    arr = random_walk(n, "1d", seed)
+    index = pd.to_datetime(arr[:, 0], unit="ms")
+    return pd.DataFrame(arr[:, 1:], index=index, columns=["Open", "High", "Low", "Close", "Volume"])
+
+
+def symbols(n: int = SCAN_SYMBOLS) -> List[str]:
+    return [f"S{i:03d}/USDT" for i in range(n)]
+
+
+def write_fixtures(root: str) -> None:
+    """整轮扫描用的回放夹具：交易对元数据、行情与每个 (交易对, 周期) 的K线"""
+    from okx_async_client import to_bar, to_inst_id
+
+    fixtures = Fixtures(root)
+    ok = lambda data: {"code": "0", "msg": "", "data": data}
+    inst_ids = [to_inst_id(s) for s in symbols()]
+    fixtures.add("GET", "/api/v5/public/instruments", {"instType": "SPOT"}, ok([
+        {"instId": i, "instType": "SPOT", "baseCcy": i.split("-")[0], "quoteCcy": "USDT", "state": "live",
+         "tickSz": "0.0001", "lotSz": "0.0001", "minSz": "0.001"} for i in inst_ids]))
+    for inst_type in ("SWAP", "FUTURES", "MARGIN", "OPTION"):
+        fixtures.add("GET", "/api/v5/public/instruments", {"instType": inst_type}, ok([]))
+    fixtures.add("GET", "/api/v5/public/underlying", {"instType": "OPTION"}, ok([]))
+    fixtures.add("GET", "/api/v5/market/tickers", {"instType": "SPOT"}, ok([
+        {"instId": i, "instType": "SPOT", "last": "100", "volCcy24h": str(1e9 / (k + 1)),
+         "vol24h": str(1e7 / (k + 1)), "ts": str(int(time.time() * 1000))} for k, i in enumerate(inst_ids)]))
+
+    now = int(time.time() * 1000)
+    for k, inst_id in enumerate(inst_ids):
+        for j, tf in enumerate(SCAN_TIMEFRAMES):
+            rows = random_walk(SERIES_BARS, tf, SEED + k * 16 + j, now)[::-1]
+            data = [[str(int(r[0]))] + [f"{v:.6f}" for v in r[1:]] + ["0", "0", "1"] for r in rows]
+            data[0][8] = "0"   # 最新一根未收盘
+            fixtures.add("GET", "/api/v5/market/candles", {"instId": inst_id, "bar": to_bar(tf)}, ok(data))
+
+
+# ── 回放服务 ──────────────────────────────────────────────
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(root: str, port: int) -> subprocess.Popen:
+    """子进程启动 okx_replay 回放服务（CPU 与内存不计入被测进程）"""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "okx_replay.py")
+    proc = subprocess.Popen([sys.executable, script, "replay", "--dir", root, "--port", str(port)],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + SERVER_WAIT
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("回放服务启动超时")
+
+
+def prepare_environment(workdir: str, port: int) -> None:
+    """在导入任何扫描脚本之前调用：行情指向回放服务，状态文件放临时目录，关闭 Discord 推送"""
+    os.environ.update({
+        "OKX_BASE_URL": f"http://127.0.0.1:{port}",
+        "OKX_WS_URL": f"ws://127.0.0.1:{port}",
+        "CANDLE_STORE_DIR": os.path.join(workdir, "candles"),
+        "INDICATOR_STATE_DIR": os.path.join(workdir, "indicators"),
+        "ALERT_DB": os.path.join(workdir, "alerts.db"),
+        "SCAN_LOG": os.path.join(workdir, "scan_metrics.jsonl"),
+        "OKX_API_KEY": "", "OKX_API_SECRET": "", "OKX_SECRET_KEY": "", "OKX_PASSPHRASE": "",
+    })
+    for var in WEBHOOK_VARS:
+        os.environ[var] = ""
+
+    # 回放服务在本机，不受 OKX 配额约束：放开客户端令牌桶，只测扫描管线本身
+    import okx_async_client
+    okx_async_client.ENDPOINT_LIMITS = {}
+    okx_async_client.DEFAULT_LIMIT = UNTHROTTLED
+
+
+# ── 用例 ──────────────────────────────────────────────────
+LOOP = asyncio.new_event_loop()
+
+
+def _continuous():
+    from continuous_pattern import WINDOW_SIZE, detect_continuous_pattern
+    windows = [random_walk(WINDOW_SIZE, seed=s).tolist() for s in range(1000)]
+    return lambda: [detect_continuous_pattern(w) for w in windows]
+
+
+def _engulf():
+    from engulfing_pattern import engulf
+    arr = random_walk(10_000)
+    pairs = list(zip(arr[:-1, 1].tolist(), arr[:-1, 4].tolist(), arr[1:, 1].tolist(), arr[1:, 4].tolist()))
+    return lambda: [engulf(*p) for p in pairs]
+
+
+def _ema_touch():
+    import ema_monitor
+    ema_monitor.exchange.enableRateLimit = False
+    ema_monitor.exchange.load_markets()
+    names = symbols(20)
+    return lambda: [ema_monitor.check_ema_touch(s, "5m") for s in names]
+
+
+def _analyze_symbol():
+    from RSIandPinbar import OKXScanner
+    scanner = OKXScanner()
+    columns = ["timestamp", "open", "high", "low", "close", "volume"]
+    frames = {s: pd.DataFrame(random_walk(100, "1h", seed=k), columns=columns)
+              for k, s in enumerate(symbols())}
+    return lambda: [scanner.analyze_symbol(s, "1H", df) for s, df in frames.items()]
+
+
+def _price_action():
+    import btc_price_action as pa
+    data = pa.calculate_price_action(price_frame(5000))
+
+    def run():
+        frame = data.copy()
+        return pa.generate_signals(frame, pa.detect_patterns(frame))
+    return run
+
+
+def _xau():
+    import XAU
+    raw = price_frame(5000)
+    XAU.download = lambda *args, **kwargs: raw.copy()   # 以合成数据代替 yfinance 下载
+    return lambda: XAU.get_simple_data("GLD")
+
+
+def _full_scan():
+    import continuous_pattern
+    continuous_pattern.TOP_N = SCAN_SYMBOLS
+    return lambda: LOOP.run_until_complete(continuous_pattern.scan_once(SCAN_TIMEFRAMES))
+
+
+def _scan_all_pairs():
+    from RSIandPinbar import OKXScanner
+    scanner = OKXScanner()
+    return scanner.scan_all_pairs
+
+
+CASES = [
+    Case("detect_continuous_pattern", _continuous, 30, "1000 个窗口"),
+    Case("engulf", _engulf, 30, "10000 对K线"),
+    Case("check_ema_touch", _ema_touch, 15, "20 个交易对 5m，经 ccxt + 回放"),
+    Case("analyze_symbol", _analyze_symbol, 30, "200 个交易对 × 100 根"),
+    Case("price_action", _price_action, 20, "detect_patterns + generate_signals，5000 根"),
+    Case("get_simple_data", _xau, 20, "5000 根，合成数据代替下载"),
+    Case("full_scan", _full_scan, 15, f"continuous_pattern.scan_once {SCAN_SYMBOLS} × {len(SCAN_TIMEFRAMES)}"),
+    Case("scan_all_pairs", _scan_all_pairs, 15, f"OKXScanner {SCAN_SYMBOLS} × {len(SCAN_TIMEFRAMES)}"),
+]
+
+
+# ── 计时 ──────────────────────────────────────────────────
+def _reference() -> Callable[[], object]:
+    """固定的参考负载（numpy 排序 + 纯 Python 循环），用来折算不同机器 / 不同时刻的速度"""
+    arr = np.random.default_rng(SEED).random(200_000)
+    return lambda: (np.sort(arr), sum(i * i for i in range(200_000)))
+
+
+REFERENCE = _reference()
+
+
+def _elapsed_ms(fn: Callable[[], object], batch: int) -> float:
+    """连续调用 batch 次的单次平均耗时（毫秒）"""
+    start = time.perf_counter()
+    for _ in range(batch):
+        fn()
+    return (time.perf_counter() - start) * 1000 / batch
+
+
+def measure(fn: Callable[[], object], repeat: int) -> Result:
+    """先跑一轮预热（首轮含冷启动拉取），再按一次热调用的耗时定出每个样本的调用次数，
+    计时 repeat 个样本并折算为单次调用耗时，每个样本后跑一次参考负载；峰值内存单独用 tracemalloc 跑一轮"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn()
+        once = _elapsed_ms(fn, 1)
+    batch = max(1, math.ceil(MIN_SAMPLE_MS / max(once, 1e-3)))
+    times, reference = [], []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            times.append(_elapsed_ms(fn, batch))
+        reference.append(_elapsed_ms(REFERENCE, 1))
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return Result(float(np.percentile(times, 50)), float(np.percentile(times, 90)), peak / 1024,
+                  float(np.median(reference)))
+
+
+def regressions(name: str, result: Result, baseline: Dict, threshold: float) -> List[str]:
+    """与基线比对，返回超出阈值的指标说明
+
+    耗时先按参考负载的耗时比折算；只放宽不收紧，参考负载比基线时更快时仍按原基线判定
+    （I/O 为主的用例不随 CPU 等比变快）
+    """
+    base = baseline.get(name)
+    if not base:
+        return []
+    scale = max(result.reference_ms / base["reference_ms"], 1.0)
+    out = []
+    checks = (("p50_ms", threshold, scale),
+              ("p90_ms", max(threshold, TAIL_THRESHOLD), scale),
+              ("peak_kb", threshold, 1.0))
+    for field, limit, factor in checks:
+        now, before = getattr(result, field), base[field] * factor
+        if now > before * (1 + limit) and (field != "peak_kb" or now - before > MIN_DELTA_KB):
+            out.append(f"{field} {before:,.1f} → {now:,.1f} (+{now / before - 1:.0%})")
+    return out
+
+
+def load_baseline(path: str = BASELINE_FILE) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(results: Dict[str, Result], path: str = BASELINE_FILE) -> None:
+    baseline = load_baseline(path)
+    baseline.update({name: {k: round(v, 3) for k, v in r._asdict().items()} for name, r in results.items()})
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def main(args: List[str]) -> int:
+    opts: Dict[str, str] = {}
+    for flag in ("--threshold", "--repeat", "--baseline"):
+        if flag in args:
+            i = args.index(flag)
+            opts[flag] = args[i + 1]
+            del args[i:i + 2]
+    save = "--save" in args
+    names = [a for a in args if not a.startswith("--")]
+    threshold = float(opts.get("--threshold", THRESHOLD))
+    baseline_path = opts.get("--baseline", BASELINE_FILE)
+    cases = [c for c in CASES if not names or c.name in names]
+
+    workdir = tempfile.mkdtemp(prefix="okx_bench_")
+    port = free_port()
+    prepare_environment(workdir, port)
+    write_fixtures(os.path.join(workdir, "fixtures"))
+    server = start_server(os.path.join(workdir, "fixtures"), port)
+
+    baseline = load_baseline(baseline_path)
+    results: Dict[str, Result] = {}
+    failed: List[str] = []
+    print(f"{'用例':<26} {'p50 ms':>10} {'p90 ms':>10} {'峰值 KB':>11} {'参考 ms':>9}  说明")
+    try:
+        for case in cases:
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    fn = case.setup()
+                repeat = int(opts.get("--repeat", case.repeat))
+                result = measure(fn, repeat)
+                if regressions(case.name, result, baseline, threshold) and not save:
+                    # 疑似退化：重测一次，取折算后较快的一次，排除偶发的调度 / GC 抖动
+                    result = min(result, measure(fn, repeat), key=lambda r: r.relative)
+            except Exception as e:
+                print(f"{case.name:<26} {'跳过':>10}  {type(e).__name__}: {e}")
+                if case.name in baseline:
+                    failed.append(f"{case.name}: 基线中的用例未能运行（{type(e).__name__}）")
+                continue
+            results[case.name] = result
+            print(f"{case.name:<26} {result.p50_ms:>10,.2f} {result.p90_ms:>10,.2f} "
+                  f"{result.peak_kb:>11,.0f} {result.reference_ms:>9,.1f}  {case.note}")
+            for line in regressions(case.name, result, baseline, threshold):
+                failed.append(f"{case.name}: {line}")
+    finally:
+        if "continuous_pattern" in sys.modules:
+            LOOP.run_until_complete(sys.modules["continuous_pattern"].okx.close())
+        LOOP.close()
+        server.terminate()
+        server.wait()
+
+    if save:
+        save_baseline(results, baseline_path)
+        print(f"\n基线已更新: {baseline_path}")
+        return 0
+    if failed:
+        print(f"\n❌ 超出基线 {threshold:.0%} 或基线用例缺失:")
+        for line in failed:
+            print(f"  {line}")
+        return 1
+    print("\n✅ 未发现退化" if baseline else "\n尚无基线，运行 python bench.py --save 生成")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
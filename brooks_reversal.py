@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Al Brooks 4H 主要反转评分 · NumPy 向量化版
+逐根复刻 AlBrooks_BTC_4H_MajorReversal_v5.pine 的形态、评分与 major_long / major_short，
+作为扫描宿主插件在每根 4H 收盘时对交易对池前 N 个一并计算，不再逐个图表查看
+"""
+
+import os, asyncio, sys
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from dotenv import load_dotenv
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from alert_store import ALERTS
+from backtest import CLOSE, HIGH, LOW, OPEN, TS, VOLUME, atr
+from bar_clock import last_closed
+from candle_store import CANDLES, timeframe_ms
+from discord_queue import DISCORD
+from pattern_engine import run_lengths
+from scanner_host import Detector, ScannerHost
+
+# ── 环境变量 ──────────────────────────────────────────────
+load_dotenv()
+WEBHOOK = os.getenv("DISCORD_WEBHOOK_BROOKS") or os.getenv("DISCORD_WEBHOOK")
+
+# ── 常量（与 Pine 输入参数默认值一致）────────────────────
+TOP_N             = 100
+TIMEFRAME         = "4h"
+WINDOW_SIZE       = 299         # 宿主每次提供的已收盘K线（加上未收盘一根正好是 OKX 单页 300 根）
+HISTORY_BARS      = 1000        # 本地仓库有更长历史时改用该长度，周线 EMA 更接近 TradingView
+MIN_SCORE_ALERT   = 6
+ALERT_ONLY_MAJOR  = True        # 只推送 major_long / major_short
+BROOKS_COLOR      = 0x1F1F1F
+
+ATR_PERIOD        = 14
+WEDGE_PIVOT       = 3           # 楔形拐点左右K线数
+DOUBLE_PIVOT      = 4           # 双顶/双底拐点左右K线数
+PULLBACK_PIVOT    = 2           # 回调拐点左右K线数
+WEDGE_MAX_AGE     = 25          # 楔形第一推超过该K线数即作废
+DOUBLE_TOLERANCE  = 0.015
+TREND_STRENGTH    = 8           # ta.rising / ta.falling 回看K线数
+VOL_PERCENT_LEN   = 50          # ATR 百分位回看K线数
+TV_WEEK_OFFSET_MS = 3 * 86_400_000   # TradingView 加密货币周线从周一 00:00 UTC 开盘（1970-01-01 为周四）
+
+
+class BrooksConfig(NamedTuple):
+    """Pine 输入参数"""
+    ema_length: int = 20
+    daily_ema_length: int = 20
+    weekly_ema_length: int = 20
+    min_body_percent: float = 60.0
+    pattern_sensitivity: float = 1.0
+    atr_stop_mult: float = 2.5
+    profit_target_atr: float = 3.0
+    enable_inside_bars: bool = True
+    enable_reversal_bars: bool = True
+    enable_signal_bars: bool = True
+    enable_wedges: bool = True
+    enable_double_patterns: bool = True
+    use_volatility_filter: bool = True
+    use_session_bias: bool = True
+    volume_confirmation: bool = True
+
+
+class Brooks(NamedTuple):
+    """逐根结果，均为长度 n 的数组"""
+    score: np.ndarray           # final_score（Pine 不截断，常见范围 0~10）
+    major_long: np.ndarray
+    major_short: np.ndarray
+    bull_signal: np.ndarray
+    bear_signal: np.ndarray
+    bull_reversal: np.ndarray
+    bear_reversal: np.ndarray
+    inside_count: np.ndarray    # 连续内包线根数：1 / 2 / 3 即 i / ii / iii
+    wedge_bull: np.ndarray
+    wedge_bear: np.ndarray
+    double_top: np.ndarray
+    double_bottom: np.ndarray
+    ema20: np.ndarray
+    atr: np.ndarray
+    long_stop: np.ndarray
+    short_stop: np.ndarray
+
+
+# ── Pine 内置函数 ─────────────────────────────────────────
+def ema(x: np.ndarray, length: int) -> np.ndarray:
+    """ta.ema（首值起算）"""
+    return pd.Series(x).ewm(span=length, adjust=False).mean().to_numpy()
+
+
+def sma(x: np.ndarray, length: int) -> np.ndarray:
+    """ta.sma，不足 length 根为 NaN"""
+    return pd.Series(x).rolling(length).mean().to_numpy()
+
+
+def _shift(x: np.ndarray, n: int = 1, fill=np.nan) -> np.ndarray:
+    """x[n]：向后取第 n 根的值"""
+    out = np.full(len(x), fill, dtype=np.result_type(x, type(fill)))
+    out[n:] = x[:len(x) - n]
+    return out
+
+
+def percentrank(x: np.ndarray, length: int) -> np.ndarray:
+    """ta.percentrank：前 length 根中不大于当前值的占比（%）"""
+    out = np.full(len(x), np.nan)
+    if len(x) <= length:
+        return out
+    w = sliding_window_view(x, length + 1)
+    with np.errstate(invalid="ignore"):
+        rank = (w[:, :-1] <= w[:, -1:]).sum(axis=1) * 100.0 / length
+    out[length:] = np.where(np.isnan(w).any(axis=1), np.nan, rank)
+    return out
+
+
+def pivots(x: np.ndarray, left: int, right: int, high: bool = True) -> np.ndarray:
+    """ta.pivothigh / ta.pivotlow：第 i 根为 True 表示第 i-right 根是拐点
+
+    左侧须严格低于（高于）拐点，右侧可以相等，即相等的顶部以最左一根为拐点。
+    """
+    out = np.zeros(len(x), bool)
+    span = left + right + 1
+    if len(x) < span:
+        return out
+    w = sliding_window_view(x, span)
+    center = w[:, left]
+    if high:
+        ok = (center > w[:, :left].max(axis=1)) & (center >= w[:, left + 1:].max(axis=1))
+    else:
+        ok = (center < w[:, :left].min(axis=1)) & (center <= w[:, left + 1:].min(axis=1))
+    out[span - 1:] = ok
+    return out
+
+
+def rising(x: np.ndarray, length: int) -> np.ndarray:
+    """ta.rising：当前值高于之前 length 根的每一根"""
+    prev = pd.Series(_shift(x)).rolling(length).max().to_numpy()
+    with np.errstate(invalid="ignore"):
+        return x > prev
+
+
+def falling(x: np.ndarray, length: int) -> np.ndarray:
+    """ta.falling：当前值低于之前 length 根的每一根"""
+    prev = pd.Series(_shift(x)).rolling(length).min().to_numpy()
+    with np.errstate(invalid="ignore"):
+        return x < prev
+
+
+def htf_ema(ts: np.ndarray, close: np.ndarray, timeframe: str, htf: str, length: int) -> np.ndarray:
+    """request.security(htf, ta.ema(close, length), lookahead_off) 的历史K线等价
+
+    由本周期K线重采样出高周期收盘价（与 TradingView 一致按 UTC 零点分桶，周线从周一开始，
+    不同于 OKX 的 UTC+8）；每根K线取收盘时已完成的最近一根高周期K线的 EMA，未完成的高周期K线沿用上一根。
+    """
+    ts = ts.astype(np.int64)
+    step = timeframe_ms(htf)
+    offset = TV_WEEK_OFFSET_MS if step == timeframe_ms("1w") else 0
+    opens = (ts + offset) // step * step - offset
+    first = np.r_[True, opens[1:] != opens[:-1]]
+    bucket = np.cumsum(first) - 1
+    last = np.r_[np.flatnonzero(first)[1:] - 1, len(ts) - 1]
+    values = ema(close[last], length)
+    done = ts + timeframe_ms(timeframe) >= opens + timeframe_ms(htf)
+    k = np.where(done, bucket, bucket - 1)
+    return np.where(k >= 0, values[np.maximum(k, 0)], np.nan)
+
+
+# ── 有状态的形态 ──────────────────────────────────────────
+def wedges(ph: np.ndarray, high: np.ndarray, pl: np.ndarray, low: np.ndarray,
+           pivot: int = WEDGE_PIVOT, max_age: int = WEDGE_MAX_AGE) -> Tuple[np.ndarray, np.ndarray]:
+    """三推楔形（wedge_bull, wedge_bear）
+
+    与 Pine 一致：高点与低点共用同一组 wedge_point / wedge_time 状态，标志一旦置位保持到被重置；
+    只在拐点与过期重置处推进状态，其余K线整段填充。
+    """
+    n = len(high)
+    bull, bear = np.zeros(n, bool), np.zeros(n, bool)
+    p1 = p2 = p3 = np.nan
+    t1: Optional[int] = None
+    w_bull = w_bear = False
+    cur = 0
+
+    def fill(end: int) -> None:
+        """[cur, end) 内没有拐点，只可能在 t1 + max_age + 1 处过期重置"""
+        nonlocal p1, p2, p3, w_bull, w_bear
+        stop = end if t1 is None else min(end, max(cur, t1 + max_age + 1))
+        bull[cur:stop], bear[cur:stop] = w_bull, w_bear
+        if stop < end:
+            p1 = p2 = p3 = np.nan
+            w_bull = w_bear = False
+
+    for e in np.flatnonzero(ph | pl):
+        fill(e)
+        if ph[e]:
+            v = high[e - pivot]
+            if np.isnan(p1) or v > p1:
+                p1, t1, p2, p3, w_bear = v, e - pivot, np.nan, np.nan, False
+            elif np.isnan(p2) and v > p1 * 0.99:
+                p2, p3, w_bear = v, np.nan, False
+            elif not np.isnan(p2) and np.isnan(p3) and v > p1 * 0.98:
+                p3, w_bear = v, True
+        if pl[e]:
+            v = low[e - pivot]
+            if np.isnan(p1) or v < p1:
+                p1, t1, p2, p3, w_bull = v, e - pivot, np.nan, np.nan, False
+            elif np.isnan(p2) and v < p1 * 1.01:
+                p2, p3, w_bull = v, np.nan, False
+            elif not np.isnan(p2) and np.isnan(p3) and v < p1 * 1.02:
+                p3, w_bull = v, True
+        if t1 is not None and e - t1 > max_age:
+            p1 = p2 = p3 = np.nan
+            w_bull = w_bear = False
+        bull[e], bear[e] = w_bull, w_bear
+        cur = e + 1
+    fill(n)
+    return bull, bear
+
+
+def doubles(pivot_flags: np.ndarray, x: np.ndarray, pivot: int = DOUBLE_PIVOT,
+            tolerance: float = DOUBLE_TOLERANCE) -> np.ndarray:
+    """双顶 / 双底：本根确认的拐点与上一个同向拐点相差不超过 tolerance"""
+    out = np.zeros(len(x), bool)
+    idx = np.flatnonzero(pivot_flags)
+    if len(idx) >= 2:
+        v = x[idx - pivot]
+        out[idx[1:][np.abs(v[1:] - v[:-1]) / v[1:] <= tolerance]] = True
+    return out
+
+
+# ── 评分 ──────────────────────────────────────────────────
+def score_bars(ohlcv: np.ndarray, config: BrooksConfig = BrooksConfig(),
+               timeframe: str = TIMEFRAME) -> Brooks:
+    """逐根计算 Pine 的 final_score 与主要反转信号
+
+    Args:
+        ohlcv: (n, 6) 已收盘K线 [ts, o, h, l, c, v]
+        config: Pine 输入参数
+        timeframe: K线周期，用于把日线 / 周线收盘对齐到本周期
+    """
+    ts, o, h, l, c, v = (ohlcv[:, i] for i in (TS, OPEN, HIGH, LOW, CLOSE, VOLUME))
+    cfg = config
+    with np.errstate(invalid="ignore", divide="ignore"):
+        body = np.abs(c - o)
+        rng = h - l
+        upper = h - np.maximum(o, c)
+        lower = np.minimum(o, c) - l
+        valid = rng > 0
+        body_pct = np.where(valid, body / rng * 100, 0.0)
+        upper_pct = np.where(valid, upper / rng * 100, 0.0)
+        lower_pct = np.where(valid, lower / rng * 100, 0.0)
+
+        atr_value = atr(h, l, c, ATR_PERIOD)
+        large = rng > sma(rng, 5) * 1.3
+        vol_pct = percentrank(atr_value, VOL_PERCENT_LEN)
+
+        ema20 = ema(c, cfg.ema_length)
+        daily = htf_ema(ts, c, timeframe, "1d", cfg.daily_ema_length)
+        weekly = htf_ema(ts, c, timeframe, "1w", cfg.weekly_ema_length)
+        above, below = c > ema20, c < ema20
+        prev_ema = _shift(ema20)
+        gap_above = (l > ema20) & (_shift(l) <= prev_ema)
+        gap_below = (h < ema20) & (_shift(h) >= prev_ema)
+
+        near = atr_value * 0.5
+        ema2 = _shift(ema20, PULLBACK_PIVOT)
+        pb_bull = pivots(l, PULLBACK_PIVOT, PULLBACK_PIVOT, high=False) & \
+            (np.abs(_shift(l, PULLBACK_PIVOT) - ema2) <= near) & above
+        pb_bear = pivots(h, PULLBACK_PIVOT, PULLBACK_PIVOT) & \
+            (np.abs(_shift(h, PULLBACK_PIVOT) - ema2) <= near) & below
+
+        # 交易时段按K线开盘的 GMT 小时
+        hour = (ts.astype(np.int64) // 3_600_000) % 24
+        asian = (hour >= 23) | (hour < 7)
+        european = (hour >= 7) & (hour < 15)
+        us = (hour >= 13) & (hour < 21)
+        overlap = (hour >= 13) & (hour < 16)
+        session_mult = np.where(us, 1.15, np.where(european, 1.05, np.where(asian, 0.9, 1.0))) \
+            if cfg.use_session_bias else np.ones(len(c))
+
+        high_vol, low_vol = vol_pct > 85, vol_pct < 15
+        normal_vol = ~high_vol & ~low_vol
+
+        inside = (h <= _shift(h)) & (l >= _shift(l)) & cfg.enable_inside_bars
+        prev_c = _shift(c)
+        bull_signal = (c > o) & (body_pct >= cfg.min_body_percent) & (upper_pct <= 25) & \
+            (lower_pct <= 15) & large & cfg.enable_signal_bars
+        bear_signal = (c < o) & (body_pct >= cfg.min_body_percent) & (lower_pct <= 25) & \
+            (upper_pct <= 15) & large & cfg.enable_signal_bars
+        bull_rev = cfg.enable_reversal_bars & (o <= prev_c * 1.002) & (c > o) & (c > prev_c) & \
+            (lower_pct >= 30) & (lower_pct <= 60) & (upper_pct <= 20) & (body_pct >= 35) & large
+        bear_rev = cfg.enable_reversal_bars & (o >= prev_c * 0.998) & (c < o) & (c < prev_c) & \
+            (upper_pct >= 30) & (upper_pct <= 60) & (lower_pct <= 20) & (body_pct >= 35) & large
+        shaved = ((np.abs(c - h) <= rng * 0.05) & (c > o)) | ((np.abs(c - l) <= rng * 0.05) & (c < o))
+
+        if cfg.enable_wedges:
+            wedge_bull, wedge_bear = wedges(pivots(h, WEDGE_PIVOT, WEDGE_PIVOT), h,
+                                            pivots(l, WEDGE_PIVOT, WEDGE_PIVOT, high=False), l)
+        else:
+            wedge_bull = wedge_bear = np.zeros(len(c), bool)
+        double_top = doubles(pivots(h, DOUBLE_PIVOT, DOUBLE_PIVOT), h) & cfg.enable_double_patterns
+        double_bottom = doubles(pivots(l, DOUBLE_PIVOT, DOUBLE_PIVOT, high=False), l) & \
+            cfg.enable_double_patterns
+
+        bull_trend = rising(ema20, TREND_STRENGTH) & (c > ema20) & (c > daily)
+        bear_trend = falling(ema20, TREND_STRENGTH) & (c < ema20) & (c < daily)
+        sideways = ~bull_trend & ~bear_trend
+
+        high_volume = v > sma(v, 20) * 1.3
+        vol_ok = high_volume if cfg.volume_confirmation else np.ones(len(c), bool)
+
+        bull_setup, bear_setup = bull_signal | bull_rev, bear_signal | bear_rev
+        htf_bull = (c > daily) & (c > weekly)
+        htf_bear = (c < daily) & (c < weekly)
+
+    score = (2 * bull_signal + 2 * bear_signal + 3 * bull_rev + 3 * bear_rev
+             + (body_pct >= 70) + large + shaved
+             + 2 * (bull_trend & bull_setup) + 2 * (bear_trend & bear_setup)
+             + (sideways & (bull_rev | bear_rev))
+             + 2 * (gap_above & bull_signal) + 2 * (gap_below & bear_signal)
+             + 2 * (pb_bull & bull_signal) + 2 * (pb_bear & bear_signal)
+             + 4 * (wedge_bull & bull_rev) + 4 * (wedge_bear & bear_rev)
+             + 3 * (double_bottom & bull_rev) + 3 * (double_top & bear_rev)
+             + 2 * (htf_bull & bull_setup) + 2 * (htf_bear & bear_setup)
+             + overlap + normal_vol + vol_ok).astype(np.int64)
+    final = (score * cfg.pattern_sensitivity * session_mult).astype(np.int64)
+
+    filt = normal_vol if cfg.use_volatility_filter else np.ones(len(c), bool)
+    gate = (final >= 6) & filt & vol_ok
+    major_long = (bull_rev | (bull_signal & (wedge_bull | double_bottom))) & gate & (bull_trend | sideways) & above
+    major_short = (bear_rev | (bear_signal & (wedge_bear | double_top))) & gate & (bear_trend | sideways) & below
+
+    low2, high2 = np.fmin(l, _shift(l)), np.fmax(h, _shift(h))
+    long_stop = low2 - atr_value * np.where(bull_rev, 0.5, cfg.atr_stop_mult)
+    short_stop = high2 + atr_value * np.where(bear_rev, 0.5, cfg.atr_stop_mult)
+
+    return Brooks(final, major_long, major_short, bull_signal, bear_signal, bull_rev, bear_rev,
+                  run_lengths(inside), wedge_bull, wedge_bear, double_top, double_bottom,
+                  ema20, atr_value, long_stop, short_stop)
+
+
+def brooks_signals(ohlcv: np.ndarray) -> np.ndarray:
+    """major_long / major_short → 1 / -1 / 0，可直接作为 backtest_many 的 signal_fn"""
+    b = score_bars(ohlcv)
+    return b.major_long.astype(np.int8) - b.major_short.astype(np.int8)
+
+
+def backtest_args(ohlcv: np.ndarray, config: BrooksConfig = BrooksConfig()) -> Dict[str, np.ndarray]:
+    """backtest() 的信号、止损与 EMA Break 离场参数，与 Pine 的 strategy 部分一致"""
+    b = score_bars(ohlcv, config)
+    c, prev_c, prev_ema = ohlcv[:, CLOSE], _shift(ohlcv[:, CLOSE]), _shift(b.ema20)
+    with np.errstate(invalid="ignore"):
+        return {
+            "signals": b.major_long.astype(np.int8) - b.major_short.astype(np.int8),
+            "stops": np.where(b.major_long, b.long_stop, np.where(b.major_short, b.short_stop, np.nan)),
+            "exit_long": (c < b.ema20) & (prev_c >= prev_ema),
+            "exit_short": (c > b.ema20) & (prev_c <= prev_ema),
+        }
+
+
+def screen(series: Dict[str, np.ndarray], config: BrooksConfig = BrooksConfig(),
+           timeframe: str = TIMEFRAME) -> pd.DataFrame:
+    """对多个交易对的最后一根已收盘K线评分，按分数降序返回"""
+    rows = []
+    for symbol, ohlcv in series.items():
+        if len(ohlcv) < ATR_PERIOD + 2:
+            continue
+        b = score_bars(ohlcv, config, timeframe)
+        side = "Long" if b.major_long[-1] else "Short" if b.major_short[-1] else ""
+        rows.append({
+            "symbol": symbol, "ts": int(ohlcv[-1, TS]), "score": int(b.score[-1]), "major": side,
+            "patterns": ", ".join(patterns_at(b, -1)), "close": float(ohlcv[-1, CLOSE]),
+            "stop": float(b.long_stop[-1] if side == "Long" else b.short_stop[-1]) if side else np.nan,
+        })
+    table = pd.DataFrame(rows)
+    if table.empty:
+        return table
+    return table.sort_values("score", ascending=False).reset_index(drop=True)
+
+
+def patterns_at(b: Brooks, i: int) -> List[str]:
+    """第 i 根K线上出现的形态名称"""
+    names = [
+        ("看涨反转K", b.bull_reversal), ("看跌反转K", b.bear_reversal),
+        ("看涨信号K", b.bull_signal), ("看跌信号K", b.bear_signal),
+        ("下降楔形", b.wedge_bull), ("上升楔形", b.wedge_bear),
+        ("双底", b.double_bottom), ("双顶", b.double_top),
+    ]
+    out = [name for name, flags in names if flags[i]]
+    if b.inside_count[i]:
+        out.append("i" * min(int(b.inside_count[i]), 3))
+    return out
+
+
+# ── 扫描宿主插件 ──────────────────────────────────────────
+def _history(symbol: str, timeframe: str, window: List[List]) -> np.ndarray:
+    """优先使用本地仓库中更长的已收盘历史（末根与窗口一致时），周线 EMA 需要约 20 周数据"""
+    ohlcv = np.asarray(window, dtype=np.float64)[:, :6]
+    stored = CANDLES.tail(symbol, timeframe, HISTORY_BARS)
+    if len(stored) > len(ohlcv) and len(ohlcv) and stored[-1, TS] == ohlcv[-1, TS]:
+        return stored
+    return ohlcv
+
+
+class BrooksDetector(Detector):
+    """扫描宿主插件：Al Brooks 4H 主要反转"""
+
+    name = "brooks"
+    timeframes = [TIMEFRAME]
+    window = WINDOW_SIZE
+    top_n = TOP_N
+
+    def scan(self, tf: str, windows: Dict[str, List[List]], volumes: Dict[str, float]) -> List[Tuple]:
+        table = screen({s: _history(s, tf, w) for s, w in windows.items()}, timeframe=tf)
+        if table.empty:
+            return []
+        hits = table[table["major"] != ""] if ALERT_ONLY_MAJOR else table[table["score"] >= MIN_SCORE_ALERT]
+        return [(tf, r.symbol, r.major or "Score", r.score, r.patterns, r.close, r.stop,
+                 volumes.get(r.symbol, 0.0)) for r in hits.itertuples()]
+
+    async def report(self, results: List[Tuple]) -> None:
+        await report(results)
+
+
+# ── 结果推送 ──────────────────────────────────────────────
+def fresh_signals(results: List[Tuple]) -> List[Tuple]:
+    """同一根K线、同一轮信号不重复推送；分数升高视为升级"""
+    fresh = [r for r in results if ALERTS.check("brooks", r[1], r[0], r[2], last_closed(r[0]), level=r[3])]
+    if len(fresh) < len(results):
+        print(f"已抑制 {len(results) - len(fresh)} 条重复信号")
+    return fresh
+
+
+async def report(results: List[Tuple]) -> None:
+    """results 元素为 (tf, symbol, side, score, patterns, close, stop, volume)"""
+    results = sorted(fresh_signals(results), key=lambda r: (-r[3], -r[7]))
+    if results:
+        lines = []
+        for tf, sym, side, score, pats, close, stop, _ in results:
+            icon = "🟢" if side == "Long" else "🔴" if side == "Short" else "⚪"
+            stop_text = f" | 止损 {stop:.6g}" if not np.isnan(stop) else ""
+            lines.append(f"{icon} `{sym}` **{score}** 分 | {pats or '—'} | 收盘 {close:.6g}{stop_text}")
+        DISCORD.send(WEBHOOK, embeds=[{
+            "title": f"📐 Al Brooks {results[0][0]} 主要反转",
+            "description": "\n".join(lines),
+            "color": BROOKS_COLOR,
+            "footer": {"text": datetime.now().strftime("%Y-%m-%d %H:%M:%S")},
+        }], username="Brooks-Bot")
+    print(f"{datetime.now().strftime('%F %T')} → {'pushed' if results else 'no signal'} {len(results)}")
+
+
+if __name__ == "__main__":
+    host = ScannerHost()
+    host.register(BrooksDetector())
+    try:
+        # python brooks_reversal.py [--stream]
+        asyncio.run(host.run_stream() if "--stream" in sys.argv else host.run())
+    except KeyboardInterrupt:
+        print("\nBye ✌️")
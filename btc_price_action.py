@@ -13,8 +13,14 @@ import warnings
 import os
 import ccxt
 from dotenv import load_dotenv
+from okx_async_client import route_ccxt
+from pattern_engine import inside_bars, outside_bars, three_pushes
 warnings.filterwarnings('ignore')
 
+# Body_Ratio cutoffs for Trend_Strength (tunable with param_sweep.py)
+STRONG_BODY_RATIO = 0.6
+MODERATE_BODY_RATIO = 0.4
+
 def get_btc_data(period='6mo', interval='1d'):
     """Fetch BTC data"""
     try:
@@ -35,7 +41,7 @@ def get_btc_data(period='6mo', interval='1d'):
         print(f"❌ Failed to fetch data: {e}")
         return None
 
-def calculate_price_action(data):
+def calculate_price_action(data, strong_ratio=STRONG_BODY_RATIO, moderate_ratio=MODERATE_BODY_RATIO):
     """Calculate price action indicators"""
     try:
         # Calculate candlestick body and shadows
@@ -54,8 +60,8 @@ def calculate_price_action(data):
         
         # Trend strength
         data['Trend_Strength'] = np.where(
-            data['Body_Ratio'] > 0.6, 'Strong',
-            np.where(data['Body_Ratio'] > 0.4, 'Moderate', 'Weak')
+            data['Body_Ratio'] > strong_ratio, 'Strong',
+            np.where(data['Body_Ratio'] > moderate_ratio, 'Moderate', 'Weak')
         )
         
         # Support and resistance
@@ -72,100 +78,84 @@ def calculate_price_action(data):
         print(f"Failed to calculate price action indicators: {e}")
         return None
 
+# Pattern columns in priority order: when several fire on the same bar,
+# the leftmost one drives the signal
+PATTERNS = ['Bullish_Engulfing', 'Bearish_Engulfing', 'Inside_Bar', 'Outside_Bar',
+            'Three_Pushes_Down', 'Three_Pushes_Up']
+SIGNALS = np.array(['Hold', 'Strong_Buy', 'Strong_Sell', 'Wait', 'Buy', 'Sell', 'Buy_Dip', 'Sell_Rally'],
+                   dtype=object)
+
 def detect_patterns(data):
-    """Detect Al Brooks patterns"""
+    """Detect Al Brooks patterns
+
+    Returns a boolean DataFrame aligned with data.index, one column per
+    pattern in PATTERNS.
+    """
     try:
-        patterns = []
+        body = data['Body'].to_numpy()
+        prev_body = np.r_[np.nan, body[:-1]]
+        arr = data[['Open', 'High', 'Low', 'Close', 'Volume']].to_numpy(dtype=np.float64)[None]
+        bar = np.arange(len(data))
         
-        for i in range(2, len(data)):
-            # Engulfing pattern
-            if (data['Body'].iloc[i] > 0 and data['Body'].iloc[i-1] < 0 and
-                abs(data['Body'].iloc[i]) > abs(data['Body'].iloc[i-1]) * 1.1):
-                patterns.append(('Bullish_Engulfing', i))
-            elif (data['Body'].iloc[i] < 0 and data['Body'].iloc[i-1] > 0 and
-                  abs(data['Body'].iloc[i]) > abs(data['Body'].iloc[i-1]) * 1.1):
-                patterns.append(('Bearish_Engulfing', i))
-            
-            # Inside bar
-            if (data['High'].iloc[i] < data['High'].iloc[i-1] and
-                data['Low'].iloc[i] > data['Low'].iloc[i-1]):
-                patterns.append(('Inside_Bar', i))
-            
-            # Outside bar
-            if (data['High'].iloc[i] > data['High'].iloc[i-1] and
-                data['Low'].iloc[i] < data['Low'].iloc[i-1]):
-                patterns.append(('Outside_Bar', i))
-            
-            # Three pushes pattern
-            if i >= 4:
-                highs = [data['High'].iloc[i-j] for j in range(4)]
-                lows = [data['Low'].iloc[i-j] for j in range(4)]
-                
-                if (highs[0] > highs[1] > highs[2] > highs[3] and
-                    data['Trend'].iloc[i] == 'Bear'):
-                    patterns.append(('Three_Pushes_Down', i))
-                elif (lows[0] < lows[1] < lows[2] < lows[3] and
-                      data['Trend'].iloc[i] == 'Bull'):
-                    patterns.append(('Three_Pushes_Up', i))
+        # Engulfing pattern (body size only)
+        larger = np.abs(body) > np.abs(prev_body) * 1.1
+        bullish_engulfing = (body > 0) & (prev_body < 0) & larger
+        bearish_engulfing = (body < 0) & (prev_body > 0) & larger
+        
+        # Three pushes pattern
+        pushes_up, pushes_down = three_pushes(arr)
         
-        return patterns
+        matrix = pd.DataFrame({
+            'Bullish_Engulfing': bullish_engulfing,
+            'Bearish_Engulfing': bearish_engulfing,
+            'Inside_Bar': inside_bars(arr)[0],
+            'Outside_Bar': outside_bars(arr)[0],
+            'Three_Pushes_Down': pushes_down[0] & (bar >= 4),
+            'Three_Pushes_Up': pushes_up[0] & (bar >= 4),
+        }, index=data.index)[PATTERNS]
+        matrix.iloc[:2] = False
+        return matrix
         
     except Exception as e:
         print(f"Failed to detect patterns: {e}")
-        return []
+        return pd.DataFrame(False, index=data.index, columns=PATTERNS)
 
 def generate_signals(data, patterns):
-    """Generate trading signals"""
+    """Generate trading signals
+
+    patterns is the matrix from detect_patterns; the signal for each bar is
+    picked by priority in a single vectorized select.
+    """
     try:
-        signals = []
+        close = data['Close'].to_numpy()
+        bull = (data['Trend'] == 'Bull').to_numpy()
+        bear = ~bull
+        strong = (data['Trend_Strength'] == 'Strong').to_numpy()
+        resistance = data['Resistance'].shift(1).to_numpy()
+        support = data['Support'].shift(1).to_numpy()
+        p = {name: patterns[name].to_numpy() for name in PATTERNS}
+        warmup = np.arange(len(data)) < 20  # Not enough data
         
-        for i in range(len(data)):
-            if i < 20:  # Not enough data
-                signals.append('Hold')
-                continue
-                
-            current_price = data['Close'].iloc[i]
-            trend = data['Trend'].iloc[i]
-            strength = data['Trend_Strength'].iloc[i]
-            resistance = data['Resistance'].iloc[i-1]
-            support = data['Support'].iloc[i-1]
-            
-            # Check if current candle has a pattern
-            current_patterns = [p for p in patterns if p[1] == i]
-            
-            # Generate signal
-            if current_patterns:
-                pattern_name = current_patterns[0][0]
-                
-                if pattern_name == 'Bullish_Engulfing':
-                    signals.append('Strong_Buy')
-                elif pattern_name == 'Bearish_Engulfing':
-                    signals.append('Strong_Sell')
-                elif pattern_name == 'Inside_Bar':
-                    signals.append('Wait')
-                elif pattern_name == 'Outside_Bar':
-                    if trend == 'Bull':
-                        signals.append('Buy')
-                    else:
-                        signals.append('Sell')
-                elif pattern_name == 'Three_Pushes_Down':
-                    signals.append('Sell')
-                elif pattern_name == 'Three_Pushes_Up':
-                    signals.append('Buy')
-            else:
-                # Signal based on trend and support/resistance
-                if trend == 'Bull' and strength == 'Strong' and current_price > resistance:
-                    signals.append('Buy')
-                elif trend == 'Bear' and strength == 'Strong' and current_price < support:
-                    signals.append('Sell')
-                elif trend == 'Bull' and current_price < support:
-                    signals.append('Buy_Dip')
-                elif trend == 'Bear' and current_price > resistance:
-                    signals.append('Sell_Rally')
-                else:
-                    signals.append('Hold')
+        codes = np.select(
+            [warmup,
+             # Candle has a pattern
+             p['Bullish_Engulfing'],
+             p['Bearish_Engulfing'],
+             p['Inside_Bar'],
+             p['Outside_Bar'] & bull,
+             p['Outside_Bar'],
+             p['Three_Pushes_Down'],
+             p['Three_Pushes_Up'],
+             # Signal based on trend and support/resistance
+             bull & strong & (close > resistance),
+             bear & strong & (close < support),
+             bull & (close < support),
+             bear & (close > resistance)],
+            [0, 1, 2, 3, 4, 5, 5, 4, 4, 5, 6, 7],
+            default=0
+        )
         
-        data['Signal'] = signals
+        data['Signal'] = SIGNALS[codes]
         return data
         
     except Exception as e:
@@ -196,10 +186,10 @@ def plot_analysis(data, patterns):
                        marker='v', color='red', s=100, alpha=0.8, label='Sell')
         
         # Mark patterns
-        for pattern, idx in patterns:
-            if pattern in ['Bullish_Engulfing', 'Bearish_Engulfing']:
-                color = 'green' if pattern == 'Bullish_Engulfing' else 'red'
-                ax1.scatter(data.index[idx], data['Close'].iloc[idx], 
+        for pattern, color in [('Bullish_Engulfing', 'green'), ('Bearish_Engulfing', 'red')]:
+            marked = data[patterns[pattern]]
+            if not marked.empty:
+                ax1.scatter(marked.index, marked['Close'], 
                            marker='*', color=color, s=200, alpha=0.8)
         
         ax1.set_title('BTC Price Action Analysis')
@@ -249,7 +239,7 @@ def get_btc_okx_4h_data(limit=200):
     if not all([api_key, api_secret, passphrase]):
         print("❌ OKX API credentials not set in environment variables.")
         return None
-    exchange = ccxt.okx({
+    exchange = route_ccxt(ccxt.okx({
         'apiKey': api_key,
         'secret': api_secret,
         'password': passphrase,
@@ -258,7 +248,7 @@ def get_btc_okx_4h_data(limit=200):
             'defaultType': 'spot',
             'adjustForTimeDifference': True
         }
-    })
+    }))
     try:
         ohlcv = exchange.fetch_ohlcv('BTC/USDT', timeframe='4h', limit=limit)
         df = pd.DataFrame(ohlcv, columns=['timestamp', 'Open', 'High', 'Low', 'Close', 'Volume'])
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地K线仓库 · 按 (交易对, 周期) 持久化 · 增量补齐
+每个序列按列存储为定长二进制文件（可 memmap），扫描时只拉取最后一根已收盘K线之后的新数据
+"""
+
+import os, shutil, time, threading
+import numpy as np
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:   # Windows：只保留进程内锁
+    fcntl = None
+
+# ── 常量 ──────────────────────────────────────────────────
+STORE_DIR   = os.getenv("CANDLE_STORE_DIR",
+                        os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "candles"))
+COLUMNS     = ("ts", "open", "high", "low", "close", "volume")
+DTYPES      = {"ts": np.int64, "open": np.float64, "high": np.float64,
+               "low": np.float64, "close": np.float64, "volume": np.float64}
+MAX_FETCH   = 300         # OKX candles 单次最多返回 300 根
+
+_UNIT_MS = {"m": 60_000, "h": 3_600_000, "d": 86_400_000, "w": 604_800_000}
+
+
+def normalize_timeframe(timeframe: str) -> str:
+    """统一周期写法：OKX 的 1H/4H/1D 与 ccxt 的 1h/4h/1d 视为同一序列"""
+    return timeframe.lower()
+
+
+def timeframe_ms(timeframe: str) -> int:
+    """周期字符串转毫秒，例如 5m → 300000"""
+    tf = normalize_timeframe(timeframe)
+    return int(tf[:-1]) * _UNIT_MS[tf[-1]]
+
+
+def _current_open(timeframe: str, now_ms: Optional[int] = None) -> int:
+    """当前（未收盘）K线的开盘时间，对齐方式同 bar_clock.bar_open"""
+    from bar_clock import bar_open   # bar_clock 依赖本模块，延迟导入
+    return int(bar_open(timeframe, now_ms if now_ms is not None else int(time.time() * 1000)))
+
+
+class CandleStore:
+    """按列存储的本地K线仓库
+
+    目录结构: {root}/{SYMBOL}/{timeframe}/{column}.bin
+    只保存已收盘的K线；未收盘的最新一根每次随增量请求一并返回，不落盘。
+    """
+
+    def __init__(self, root: str = STORE_DIR):
+        self.root = root
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    # ── 路径与锁 ──────────────────────────────────────────
+    def _series_dir(self, symbol: str, timeframe: str) -> str:
+        key = symbol.replace("/", "-").replace(":", "_")
+        return os.path.join(self.root, key, normalize_timeframe(timeframe))
+
+    @contextmanager
+    def _lock(self, series_dir: str, shared: bool = False) -> Iterator[None]:
+        """序列锁：进程内 threading.Lock + 跨进程 flock（多个扫描进程与 backfill 共用同一仓库）
+
+        按序列目录加锁，BTC/USDT 与 BTC-USDT 落在同一目录也就共用同一把锁；锁文件放在序列目录旁，
+        不随 _swap 换走。读取用共享锁，写入 / 换入用独占锁。
+        """
+        with self._locks_guard:
+            lock = self._locks.setdefault(series_dir, threading.Lock())
+        with lock:
+            parent = os.path.dirname(series_dir)
+            if fcntl is None or (shared and not os.path.isdir(parent)):
+                yield   # 无 fcntl（Windows）时只有进程内锁；只读且目录尚不存在时无需加锁
+                return
+            os.makedirs(parent, exist_ok=True)
+            with open(series_dir + ".lock", "a") as f:
+                fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _column_path(self, series_dir: str, col: str) -> str:
+        return os.path.join(series_dir, f"{col}.bin")
+
+    def _length(self, series_dir: str) -> int:
+        """序列长度；各列长度不一致时（写入中断）以最短列为准并截断修复（调用方持有序列锁）"""
+        if not os.path.isdir(series_dir):
+            return 0
+        lengths = []
+        for col in COLUMNS:
+            path = self._column_path(series_dir, col)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            lengths.append(size // np.dtype(DTYPES[col]).itemsize)
+        n = min(lengths)
+        if n != max(lengths):
+            for col in COLUMNS:
+                with open(self._column_path(series_dir, col), "ab") as f:
+                    f.truncate(n * np.dtype(DTYPES[col]).itemsize)
+        return n
+
+    def _ts_at(self, series_dir: str, i: int) -> Optional[int]:
+        n = self._length(series_dir)
+        if n == 0:
+            return None
+        ts = np.memmap(self._column_path(series_dir, "ts"), dtype=np.int64, mode="r",
+                       offset=(i % n) * 8, shape=(1,))
+        return int(ts[0])
+
+    def _tail(self, series_dir: str, limit: int) -> np.ndarray:
+        n = self._length(series_dir)
+        k = min(limit, n)
+        out = np.empty((k, len(COLUMNS)), dtype=np.float64)
+        if k == 0:
+            return out
+        for j, col in enumerate(COLUMNS):
+            itemsize = np.dtype(DTYPES[col]).itemsize
+            out[:, j] = np.memmap(self._column_path(series_dir, col), dtype=DTYPES[col], mode="r",
+                                  offset=(n - k) * itemsize, shape=(k,))
+        return out
+
+    # ── 读取 ──────────────────────────────────────────────
+    def length(self, symbol: str, timeframe: str) -> int:
+        """已存储的已收盘K线数量"""
+        series_dir = self._series_dir(symbol, timeframe)
+        with self._lock(series_dir, shared=True):
+            return self._length(series_dir)
+
+    def first_ts(self, symbol: str, timeframe: str) -> Optional[int]:
+        """第一根已存储K线的开盘时间戳（毫秒）"""
+        series_dir = self._series_dir(symbol, timeframe)
+        with self._lock(series_dir, shared=True):
+            return self._ts_at(series_dir, 0)
+
+    def last_ts(self, symbol: str, timeframe: str) -> Optional[int]:
+        """最后一根已存储K线的开盘时间戳（毫秒）"""
+        series_dir = self._series_dir(symbol, timeframe)
+        with self._lock(series_dir, shared=True):
+            return self._ts_at(series_dir, -1)
+
+    def column(self, symbol: str, timeframe: str, col: str) -> np.ndarray:
+        """整列只读 memmap，适合长历史的研究/回测（多列一起用时改用 history，保证各列来自同一版本）"""
+        series_dir = self._series_dir(symbol, timeframe)
+        with self._lock(series_dir, shared=True):
+            n = self._length(series_dir)
+            if n == 0:
+                return np.empty(0, dtype=DTYPES[col])
+            return np.memmap(self._column_path(series_dir, col), dtype=DTYPES[col], mode="r", shape=(n,))
+
+    def tail(self, symbol: str, timeframe: str, limit: int) -> np.ndarray:
+        """读取最近 limit 根已收盘K线，返回 (n, 6) float64 数组 [ts, o, h, l, c, v]"""
+        series_dir = self._series_dir(symbol, timeframe)
+        with self._lock(series_dir, shared=True):
+            return self._tail(series_dir, limit)
+
+    def history(self, symbol: str, timeframe: str) -> np.ndarray:
+        """读取全部已收盘K线，格式同 tail"""
+        series_dir = self._series_dir(symbol, timeframe)
+        with self._lock(series_dir, shared=True):
+            return self._tail(series_dir, self._length(series_dir))
+
+    # ── 写入 ──────────────────────────────────────────────
+    def _append(self, series_dir: str, arr: np.ndarray) -> int:
+        """追加晚于最后一根的行（调用方持有序列锁）"""
+        os.makedirs(series_dir, exist_ok=True)
+        last = self._ts_at(series_dir, -1)
+        arr = arr[np.unique(arr[:, 0], return_index=True)[1]]   # 按 ts 排序去重
+        if last is not None:
+            arr = arr[arr[:, 0] > last]
+        if len(arr) == 0:
+            return 0
+        # ts 列最后写入：中途中断时其余列会被 _length 截断回一致状态
+        for j, col in reversed(list(enumerate(COLUMNS))):
+            with open(self._column_path(series_dir, col), "ab") as f:
+                f.write(arr[:, j].astype(DTYPES[col]).tobytes())
+        return len(arr)
+
+    def _swap(self, series_dir: str, arr: np.ndarray) -> None:
+        """先写入同级临时目录，再整体换入，中途中断不会留下列长度不一致的序列（调用方持有序列锁）"""
+        tmp_dir, old_dir = series_dir + ".tmp", series_dir + ".old"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for j, col in enumerate(COLUMNS):
+            with open(self._column_path(tmp_dir, col), "wb") as f:
+                f.write(arr[:, j].astype(DTYPES[col]).tobytes())
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if os.path.isdir(series_dir):
+            os.replace(series_dir, old_dir)
+        os.replace(tmp_dir, series_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    def append(self, symbol: str, timeframe: str, rows: List[List]) -> int:
+        """追加已收盘K线，自动丢弃不晚于最后存储时间戳的重复行
+
+        Returns:
+            实际写入的K线数量
+        """
+        if len(rows) == 0:
+            return 0
+        arr = np.asarray(rows, dtype=np.float64)[:, :len(COLUMNS)]
+        series_dir = self._series_dir(symbol, timeframe)
+        with self._lock(series_dir):
+            return self._append(series_dir, arr)
+
+    def replace(self, symbol: str, timeframe: str, arr: np.ndarray) -> None:
+        """以完整序列 (n, 6) 替换现有数据"""
+        series_dir = self._series_dir(symbol, timeframe)
+        with self._lock(series_dir):
+            self._swap(series_dir, arr)
+
+    def merge(self, symbol: str, timeframe: str, rows) -> int:
+        """按时间戳并入任意时间段的已收盘K线（重复以仓库为准），读取现有数据与写入在同一把序列锁内
+
+        全部晚于最后一根时直接追加；否则与现有序列合并后整体换入（补更早的历史、回填时使用）。
+
+        Returns:
+            新增的K线数量
+        """
+        arr = np.asarray(rows, dtype=np.float64).reshape(-1, len(COLUMNS))
+        if len(arr) == 0:
+            return 0
+        series_dir = self._series_dir(symbol, timeframe)
+        with self._lock(series_dir):
+            last = self._ts_at(series_dir, -1)
+            if last is None or arr[:, 0].min() > last:
+                return self._append(series_dir, arr)
+            have = self._tail(series_dir, self._length(series_dir))
+            both = np.concatenate([have, arr])
+            _, idx = np.unique(both[:, 0], return_index=True)   # 按 ts 排序，保留首次出现（仓库在前）
+            if len(idx) > len(have):
+                self._swap(series_dir, both[idx])
+            return len(idx) - len(have)
+
+    # ── 增量补齐 ──────────────────────────────────────────
+    def plan(self, symbol: str, timeframe: str, limit: int,
+             now_ms: Optional[int] = None) -> Tuple[int, int]:
+        """计算第一页的请求范围
+
+        Returns:
+            (since, n)：从 since（含）起向后请求 n 根。已存储的不足 limit 根时从窗口起点取
+            （与已有数据按时间戳合并），否则从最后一根已收盘K线之后取；超过 MAX_FETCH 的部分由
+            top_up 继续向后翻页，已有历史不会被丢弃。
+        """
+        tf_ms = timeframe_ms(timeframe)
+        current = _current_open(timeframe, now_ms)
+        start = current - (max(limit, 1) - 1) * tf_ms   # 窗口起点
+        last = self.last_ts(symbol, timeframe)
+        if last is None:
+            since = start
+        elif self.length(symbol, timeframe) < limit - 1 and self.first_ts(symbol, timeframe) > start:
+            # 已存储的不足 limit 根且窗口起点之前还有数据：从窗口起点（或更早的缺口）重取，按时间戳合并
+            since = min(start, last + 1)
+        else:
+            # 稳态：只请求最后一根已收盘K线之后的数据（通常 1~2 根）
+            since = last + 1
+        return since, self._page(since, current, tf_ms)
+
+    @staticmethod
+    def _page(since: int, current: int, tf_ms: int) -> int:
+        return int(min(max((current - since) // tf_ms + 1, 1), MAX_FETCH))
+
+    def commit(self, symbol: str, timeframe: str, rows: List[List],
+               now_ms: Optional[int] = None) -> List[List]:
+        """并入一页中已收盘的K线，返回其中未收盘的部分"""
+        tf_ms = timeframe_ms(timeframe)
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        closed = [r[:len(COLUMNS)] for r in rows if r[0] + tf_ms <= now_ms]
+        self.merge(symbol, timeframe, closed)
+        return sorted((list(r) for r in rows if r[0] + tf_ms > now_ms), key=lambda r: r[0])
+
+    def window(self, symbol: str, timeframe: str, limit: int, live: List[List]) -> List[List]:
+        """最近 limit 根（已存储的已收盘K线 + 未收盘的最新一根）"""
+        history = self.tail(symbol, timeframe, max(limit - len(live), 0)).tolist()
+        for r in history:
+            r[0] = int(r[0])
+        return (history + live)[-limit:] if limit > 0 else []
+
+    def _next(self, since: int, n: int, rows: List[List], timeframe: str,
+              now_ms: Optional[int]) -> Optional[Tuple[int, int]]:
+        """下一页的 (since, n)；已取到最新K线时返回 None"""
+        tf_ms = timeframe_ms(timeframe)
+        current = _current_open(timeframe, now_ms)
+        newest = max((int(r[0]) for r in rows), default=None)
+        if newest is None:
+            since = since + n * tf_ms        # 该区间无成交（停牌 / 维护），跳过
+        elif newest >= current:
+            return None                      # 已取到未收盘的最新一根
+        else:
+            since = newest + 1
+        return (since, self._page(since, current, tf_ms)) if since < current else None
+
+    def top_up(self, symbol: str, timeframe: str, limit: int,
+               fetch: Callable[[int, int], List[List]],
+               now_ms: Optional[int] = None) -> List[List]:
+        """增量补齐并返回最近 limit 根K线（含未收盘的最新一根）
+
+        Args:
+            symbol: 交易对
+            timeframe: 周期
+            limit: 需要返回的K线数量
+            fetch: 拉取函数 fetch(since_ms, n)，返回 since（含）起的 n 根 [[ts, o, h, l, c, v], ...]
+                （ccxt fetch_ohlcv 的 since 语义）；缺口超过 MAX_FETCH 时会被连续调用向后翻页
+            now_ms: 当前毫秒时间戳，默认取系统时间
+
+        Returns:
+            与 ccxt fetch_ohlcv 相同格式的列表，按时间正序
+        """
+        page = self.plan(symbol, timeframe, limit, now_ms)
+        live: List[List] = []
+        while page is not None:
+            rows = fetch(*page)
+            live = self.commit(symbol, timeframe, rows, now_ms) or live
+            page = self._next(*page, rows, timeframe, now_ms)
+        return self.window(symbol, timeframe, limit, live)
+
+    async def top_up_async(self, symbol: str, timeframe: str, limit: int,
+                           fetch: Callable[[int, int], Awaitable[List[List]]],
+                           now_ms: Optional[int] = None) -> List[List]:
+        """top_up 的协程版本，fetch 为异步拉取函数"""
+        page = self.plan(symbol, timeframe, limit, now_ms)
+        live: List[List] = []
+        while page is not None:
+            rows = await fetch(*page)
+            live = self.commit(symbol, timeframe, rows, now_ms) or live
+            page = self._next(*page, rows, timeframe, now_ms)
+        return self.window(symbol, timeframe, limit, live)
+
+    def fetch_ohlcv(self, exchange, symbol: str, timeframe: str = "1m", limit: int = 100) -> List[List]:
+        """ccxt fetch_ohlcv 的带缓存替代版，返回格式完全一致"""
+        def fetch(since: int, n: int) -> List[List]:
+            return exchange.fetch_ohlcv(symbol, timeframe=timeframe, since=since, limit=n)
+
+        return self.top_up(symbol, timeframe, limit, fetch)
+
+    async def fetch_ohlcv_async(self, client, symbol: str, timeframe: str = "1m",
+                                limit: int = 100) -> List[List]:
+        """异步客户端（OKXAsyncClient 或 ccxt.async_support）的带缓存 fetch_ohlcv"""
+        async def fetch(since: int, n: int) -> List[List]:
+            return await client.fetch_ohlcv(symbol, timeframe=timeframe, since=since, limit=n)
+
+        return await self.top_up_async(symbol, timeframe, limit, fetch)
+
+
+# ── 进程内共享实例 ────────────────────────────────────────
+CANDLES = CandleStore()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Discord 推送队列 · 后台线程 · 长连接复用
+扫描只负责入队，推送在后台完成：embeds 按每条 10 个 / 6000 字符打包，429 按 Retry-After 等待后重试
+"""
+
+import asyncio, atexit, sys, threading, time, traceback, aiohttp
+from typing import Dict, List, Optional
+
+# ── 常量 ──────────────────────────────────────────────────
+MAX_EMBEDS      = 10      # 每条消息最多 10 个 embed
+MAX_TOTAL_CHARS = 6000    # 每条消息所有 embed 文本合计上限
+MAX_DESC_CHARS  = 4096    # 单个 embed description 上限
+MAX_CONTENT     = 2000    # 纯文本消息 content 上限
+MAX_RETRIES     = 5
+QUEUE_SIZE      = 1000
+FLUSH_TIMEOUT   = 15      # 进程退出前等待队列清空的秒数
+DEFAULT_RETRY_AFTER = 1.0 # 429 未给出等待时间时的默认秒数
+
+
+def embed_chars(embed: Dict) -> int:
+    """按 Discord 规则计入 6000 字符上限的文本长度"""
+    n = len(embed.get("title", "")) + len(embed.get("description", ""))
+    n += len(embed.get("footer", {}).get("text", "")) + len(embed.get("author", {}).get("name", ""))
+    for field in embed.get("fields", []):
+        n += len(field.get("name", "")) + len(field.get("value", ""))
+    return n
+
+
+def split_text(text: str, limit: int) -> List[str]:
+    """按行切分为不超过 limit 的片段（单行过长时硬切）"""
+    chunks, current = [], ""
+    for line in text.split("\n"):
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit:
+            chunks.append(current)
+            current = line
+        else:
+            current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_embed(embed: Dict) -> List[Dict]:
+    """description 超过 4096 字符的 embed 拆成多个，标题只保留在第一个"""
+    desc = embed.get("description", "")
+    if len(desc) <= MAX_DESC_CHARS:
+        return [embed]
+    parts = []
+    for i, chunk in enumerate(split_text(desc, MAX_DESC_CHARS)):
+        part = dict(embed, description=chunk)
+        if i:
+            part.pop("title", None)
+        parts.append(part)
+    return parts
+
+
+def pack_embeds(embeds: List[Dict]) -> List[List[Dict]]:
+    """按顺序打包：每组不超过 10 个 embed 且文本合计不超过 6000 字符"""
+    batches, current, size = [], [], 0
+    for embed in (p for e in embeds for p in split_embed(e)):
+        n = embed_chars(embed)
+        if current and (len(current) >= MAX_EMBEDS or size + n > MAX_TOTAL_CHARS):
+            batches.append(current)
+            current, size = [], 0
+        current.append(embed)
+        size += n
+    if current:
+        batches.append(current)
+    return batches
+
+
+class DiscordQueue:
+    """Webhook 推送队列（线程安全，同步 / 异步脚本均可直接调用 send）
+
+    用法:
+        DISCORD.send(WEBHOOK, embeds=embeds, username="Engulf-Bot")
+        DISCORD.send(WEBHOOK, content="纯文本消息")
+    """
+
+    def __init__(self, maxsize: int = QUEUE_SIZE):
+        self.maxsize = maxsize
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.thread: Optional[threading.Thread] = None
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.started = threading.Event()
+
+    # ── 入队 ──
+    def send(self, webhook: Optional[str], embeds: Optional[List[Dict]] = None,
+             content: Optional[str] = None, username: Optional[str] = None) -> None:
+        """拆分为符合 Discord 限制的若干条消息后入队，立即返回"""
+        if not webhook or not (embeds or content):
+            return
+        payloads = []
+        if content:
+            payloads += [{"content": chunk} for chunk in split_text(content, MAX_CONTENT)]
+        if embeds:
+            payloads += [{"embeds": batch} for batch in pack_embeds(embeds)]
+        for payload in payloads:
+            if username:
+                payload["username"] = username
+            self._put(webhook, payload)
+
+    def _put(self, webhook: str, payload: Dict) -> None:
+        self._ensure_started()
+        with self.lock:
+            if self.pending >= self.maxsize:
+                print("Discord 推送队列已满，丢弃消息", file=sys.stderr)
+                return
+            self.pending += 1
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, (webhook, payload))
+
+    # ── 后台线程 ──
+    def _ensure_started(self) -> None:
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="discord-queue", daemon=True)
+                self.thread.start()
+        self.started.wait()
+
+    def _run(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.queue = asyncio.Queue()
+        self.started.set()
+        self.loop.run_until_complete(self._worker())
+
+    async def _worker(self) -> None:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15)) as sess:
+            while True:
+                webhook, payload = await self.queue.get()
+                try:
+                    await self._deliver(sess, webhook, payload)
+                except Exception:
+                    traceback.print_exc()
+                finally:
+                    with self.lock:
+                        self.pending -= 1
+
+    async def _deliver(self, sess: aiohttp.ClientSession, webhook: str, payload: Dict) -> None:
+        """发送一条消息：429 按 Retry-After 等待，5xx 与网络错误指数退避，其余 4xx 直接放弃"""
+        delay = 1.0
+        for _ in range(MAX_RETRIES):
+            try:
+                async with sess.post(webhook, json=payload) as resp:
+                    if resp.status in (200, 204):
+                        # 本窗口额度用完时主动等待，避免下一条触发 429
+                        if resp.headers.get("X-RateLimit-Remaining") == "0":
+                            await asyncio.sleep(float(resp.headers.get("X-RateLimit-Reset-After", 1)))
+                        return
+                    if resp.status == 429:
+                        wait = await self._retry_after(resp)
+                        print(f"Discord 限流，{wait:.1f}秒后重试", file=sys.stderr)
+                        await asyncio.sleep(wait)
+                        continue
+                    if resp.status < 500:
+                        print(f"Discord Error: {resp.status} {await resp.text()}", file=sys.stderr)
+                        return
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"Discord 推送失败: {type(e).__name__}: {e}", file=sys.stderr)
+            await asyncio.sleep(delay)
+            delay *= 2
+        print("Discord 推送多次失败，已放弃", file=sys.stderr)
+
+    @staticmethod
+    async def _retry_after(resp: aiohttp.ClientResponse) -> float:
+        """429 的等待秒数：优先 Retry-After 头，其次 JSON 里的 retry_after；响应体不是 JSON（如 Cloudflare 页面）时取默认值"""
+        try:
+            return float(resp.headers["Retry-After"])
+        except (KeyError, ValueError):
+            pass
+        try:
+            body = await resp.json(content_type=None)
+            return float(body["retry_after"])
+        except (ValueError, TypeError, KeyError, aiohttp.ClientError):
+            return DEFAULT_RETRY_AFTER
+
+    def flush(self, timeout: float = FLUSH_TIMEOUT) -> bool:
+        """等待队列中的消息发送完毕（单次运行的脚本退出前调用）"""
+        deadline = time.time() + timeout
+        while self.pending and time.time() < deadline:
+            time.sleep(0.05)
+        return not self.pending
+
+
+# ── 进程内共享实例 ────────────────────────────────────────
+DISCORD = DiscordQueue()
+atexit.register(DISCORD.flush)
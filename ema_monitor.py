@@ -5,8 +5,15 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 import time
-import requests
 import schedule
+from alert_store import ALERTS, tier
+from bar_clock import last_closed
+from candle_store import CANDLES, timeframe_ms
+from discord_queue import DISCORD
+from okx_async_client import route_ccxt
+from indicators import IndicatorBank, EMATouchStreak
+from scanner_host import Detector
+from universe import UNIVERSE
 
 # 加载环境变量
 load_dotenv()
@@ -19,44 +26,42 @@ OKX_API_KEY = os.getenv('OKX_API_KEY')
 OKX_SECRET_KEY = os.getenv('OKX_SECRET_KEY')
 OKX_PASSPHRASE = os.getenv('OKX_PASSPHRASE')
 
+EMA_ALERT_TITLES = {'5m': "📊 5分钟K线 EMA20 警报", '1h': "📈 1小时K线 EMA20 警报"}
+EMA_TOUCH_STREAK = 20                 # 连续未触及 EMA20 的K线数达到该值即报警（可用 param_sweep.py 寻优）
+EMA_ALERT_TIERS = tuple(EMA_TOUCH_STREAK * k for k in (1, 2, 4, 8))   # 未触及根数升到下一档时再次推送，同一档内只推送一次
+
+# EMA20 未触及计数的增量状态，按 (交易对, 周期) 持久化
+EMA_STATE = IndicatorBank("ema20_touch", lambda: EMATouchStreak(20))
+
 # 初始化OKX交易所
-exchange = ccxt.okx({
+exchange = route_ccxt(ccxt.okx({
     'apiKey': OKX_API_KEY,
     'secret': OKX_SECRET_KEY,
     'password': OKX_PASSPHRASE,
     'enableRateLimit': True
-})
+}))
 
 def send_discord_message(message, color=0x00ff00):
-    """发送Discord消息"""
-    try:
-        data = {
-            "embeds": [{
-                "color": color,
-                "description": message,
-                "type": "rich"
-            }]
-        }
-        response = requests.post(WEBHOOK_URL, json=data)
-        response.raise_for_status()
-    except Exception as e:
-        print(f"发送Discord消息时出错: {e}")
+    """发送Discord消息（入队后立即返回，不阻塞检查循环）"""
+    DISCORD.send(WEBHOOK_URL, embeds=[{
+        "color": color,
+        "description": message,
+        "type": "rich"
+    }])
 
 def calculate_ema(data, period=20):
     """计算EMA指标"""
     return data.ewm(span=period, adjust=False).mean()
 
-def get_klines(symbol, timeframe):
-    """获取K线数据"""
+def get_ohlcv(symbol, timeframe):
+    """获取K线数据（ccxt 列表格式）"""
     try:
         # 根据时间周期设置获取的K线数量
         limit = 200 if timeframe == '5m' else 100
-        ohlcv = exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
+        ohlcv = CANDLES.fetch_ohlcv(exchange, symbol, timeframe, limit=limit)
         if len(ohlcv) < 50:  # 确保至少有50根K线
             return None
-        df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-        return df
+        return ohlcv
     except ccxt.NetworkError as e:
         print(f"网络错误 - {symbol} {timeframe}: {e}")
         return None
@@ -67,64 +72,74 @@ def get_klines(symbol, timeframe):
         print(f"获取K线数据时出错 - {symbol} {timeframe}: {e}")
         return None
 
+def get_klines(symbol, timeframe):
+    """获取K线数据"""
+    ohlcv = get_ohlcv(symbol, timeframe)
+    if ohlcv is None:
+        return None
+    df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    return df
+
 def check_ema_touch(symbol, timeframe):
-    """检查是否有连续20根K线没有触及EMA20"""
+    """检查是否有连续20根K线没有触及EMA20
+    
+    EMA20 与未触及计数按 (交易对, 周期) 增量维护，每次只喂入新收盘的K线；
+    未收盘的最新一根只试算，不计入状态。
+    """
     try:
-        df = get_klines(symbol, timeframe)
-        if df is None or len(df) < 50:  # 确保有足够的数据
+        ohlcv = get_ohlcv(symbol, timeframe)
+        if ohlcv is None or len(ohlcv) < 50:  # 确保有足够的数据
             return None, None
         
-        # 计算EMA20
-        df['ema20'] = calculate_ema(df['close'], 20)
-        
-        # 检查每根K线是否触及EMA20
-        df['touches_ema'] = ((df['high'] >= df['ema20']) & (df['low'] <= df['ema20']))
-        
-        # 计算连续未触及EMA20的K线数量
-        df['not_touch_count'] = (~df['touches_ema']).astype(int).groupby((df['touches_ema'] != df['touches_ema'].shift()).cumsum()).cumsum()
-        
-        # 获取最新的连续未触及数量
-        latest_count = df['not_touch_count'].iloc[-1]
+        # 区分已收盘K线与未收盘的最新K线
+        now_ms = int(time.time() * 1000)
+        live = ohlcv[-1] if ohlcv[-1][0] + timeframe_ms(timeframe) > now_ms else None
+        closed = ohlcv[:-1] if live else ohlcv
         
-        # 判断是高于还是低于EMA20
-        is_above = df['close'].iloc[-1] > df['ema20'].iloc[-1]
+        state = EMA_STATE.sync(symbol, timeframe, closed)
+        if live:
+            latest_count, is_above = state.peek_state(live)
+        else:
+            latest_count, is_above = state.streak, state.above
         
         return latest_count, is_above
     except Exception as e:
         print(f"处理{symbol} {timeframe}时出错: {e}")
         return None, None
 
+def format_volume(volume_usdt):
+    """24小时成交额显示"""
+    return f"{volume_usdt/1000000:.1f}M USDT" if volume_usdt >= 1000000 else f"{volume_usdt/1000:.1f}K USDT"
+
+def is_new_alert(symbol, timeframe, count, is_above):
+    """同一轮未触及只在首次达到20根及每次升档时推送"""
+    return ALERTS.check("ema20", symbol, timeframe, "above" if is_above else "below",
+                        last_closed(timeframe), tier(count, EMA_ALERT_TIERS)) is not None
+
+def alert_line(symbol, count, volume_display):
+    return f"`{symbol:<12}`      已连续`{count}`根K线 (24h成交: {volume_display})"
+
+def send_ema_alerts(title, alerts_above, alerts_below):
+    """按EMA20上方/下方分组发送一个周期的警报"""
+    if not alerts_above and not alerts_below:
+        return
+    message = f"**{title}**\n"
+    if alerts_above:
+        message += "\n**🟢 价格在EMA20上方：**\n" + "\n".join(alerts_above)
+    if alerts_below:
+        message += "\n**🔴 价格在EMA20下方：**\n" + "\n".join(alerts_below)
+    send_discord_message(message, color=0x00ff00 if alerts_above else 0xff0000)
+
 def get_top_volume_symbols(limit=100):
     """获取24小时交易量排名前100的交易对"""
     try:
-        # 获取所有USDT交易对的24小时行情
-        markets = exchange.load_markets()
-        usdt_symbols = [symbol for symbol in markets.keys() if symbol.endswith('/USDT')]
-        
-        # 获取24小时行情数据
-        tickers = exchange.fetch_tickers(usdt_symbols)
-        
-        # 创建交易量数据框
-        volume_data = []
-        for symbol, ticker in tickers.items():
-            if 'quoteVolume' in ticker and ticker['quoteVolume'] is not None:
-                # 24小时交易量（以USDT计算）
-                volume_usdt = ticker['quoteVolume']
-                volume_data.append({
-                    'symbol': symbol,
-                    'volume': volume_usdt,
-                    'volume_display': f"{volume_usdt/1000000:.1f}M USDT" if volume_usdt >= 1000000 else f"{volume_usdt/1000:.1f}K USDT"
-                })
-        
-        # 转换为DataFrame并按24小时交易量排序
-        df = pd.DataFrame(volume_data)
-        df = df.sort_values('volume', ascending=False)
-        
-        # 获取前100个交易对及其交易量
-        top_pairs = df.head(limit).to_dict('records')
+        # 共享交易对池：交易对元数据按 TTL 缓存，行情一次请求后用 argpartition 取前 N
+        ranking = UNIVERSE.select(limit, quote="USDT")
         
         # 返回交易对列表和其对应的交易量显示
-        return [(pair['symbol'], pair['volume_display']) for pair in top_pairs]
+        return [(symbol, format_volume(volume_usdt))
+                for symbol, volume_usdt in zip(ranking.symbols, ranking.volumes.tolist())]
     except Exception as e:
         print(f"获取交易量排名时出错: {e}")
         return []
@@ -150,8 +165,8 @@ def monitor_ema():
         try:
             # 检查5分钟K线
             count_5m, is_above_5m = check_ema_touch(symbol, '5m')
-            if count_5m is not None and count_5m >= 20:
-                message = f"`{symbol:<12}`      已连续`{count_5m}`根K线 (24h成交: {volume_display})"
+            if count_5m is not None and count_5m >= EMA_TOUCH_STREAK and is_new_alert(symbol, '5m', count_5m, is_above_5m):
+                message = alert_line(symbol, count_5m, volume_display)
                 if is_above_5m:
                     alerts_5m_above.append(message)
                 else:
@@ -159,8 +174,8 @@ def monitor_ema():
             
             # 检查1小时K线
             count_1h, is_above_1h = check_ema_touch(symbol, '1h')
-            if count_1h is not None and count_1h >= 20:
-                message = f"`{symbol:<12}`      已连续`{count_1h}`根K线 (24h成交: {volume_display})"
+            if count_1h is not None and count_1h >= EMA_TOUCH_STREAK and is_new_alert(symbol, '1h', count_1h, is_above_1h):
+                message = alert_line(symbol, count_1h, volume_display)
                 if is_above_1h:
                     alerts_1h_above.append(message)
                 else:
@@ -169,23 +184,38 @@ def monitor_ema():
         except Exception as e:
             print(f"处理{symbol}时出错: {e}")
 
-    # 发送5分钟K线警报
-    if alerts_5m_above or alerts_5m_below:
-        message = "**📊 5分钟K线 EMA20 警报**\n"
-        if alerts_5m_above:
-            message += "\n**🟢 价格在EMA20上方：**\n" + "\n".join(alerts_5m_above)
-        if alerts_5m_below:
-            message += "\n**🔴 价格在EMA20下方：**\n" + "\n".join(alerts_5m_below)
-        send_discord_message(message, color=0x00ff00 if alerts_5m_above else 0xff0000)
-
-    # 发送1小时K线警报
-    if alerts_1h_above or alerts_1h_below:
-        message = "**📈 1小时K线 EMA20 警报**\n"
-        if alerts_1h_above:
-            message += "\n**🟢 价格在EMA20上方：**\n" + "\n".join(alerts_1h_above)
-        if alerts_1h_below:
-            message += "\n**🔴 价格在EMA20下方：**\n" + "\n".join(alerts_1h_below)
-        send_discord_message(message, color=0x00ff00 if alerts_1h_above else 0xff0000)
+    # 发送5分钟、1小时K线警报
+    send_ema_alerts(EMA_ALERT_TITLES['5m'], alerts_5m_above, alerts_5m_below)
+    send_ema_alerts(EMA_ALERT_TITLES['1h'], alerts_1h_above, alerts_1h_below)
+
+    # 保存指标状态，重启后无需重新预热
+    EMA_STATE.save()
+
+class EMATouchDetector(Detector):
+    """扫描宿主插件：连续20根K线未触及EMA20"""
+
+    name = "ema20"
+    timeframes = ['5m', '1h']
+    window = 200
+    top_n = 100
+
+    def scan(self, tf, windows, volumes):
+        results = []
+        for symbol, rows in windows.items():
+            if len(rows) < 50:  # 确保有足够的数据
+                continue
+            state = EMA_STATE.sync(symbol, tf, rows)
+            if state.streak >= EMA_TOUCH_STREAK:
+                results.append((tf, symbol, state.streak, state.above, volumes.get(symbol, 0)))
+        return results
+
+    async def report(self, results):
+        EMA_STATE.save()
+        for tf in self.timeframes:
+            hits = [r for r in results if r[0] == tf and is_new_alert(r[1], tf, r[2], r[3])]
+            above = [alert_line(s, c, format_volume(v)) for _, s, c, up, v in hits if up]
+            below = [alert_line(s, c, format_volume(v)) for _, s, c, up, v in hits if not up]
+            send_ema_alerts(EMA_ALERT_TITLES[tf], above, below)
 
 def main():
     symbol_data = get_top_volume_symbols()
@@ -5,10 +5,19 @@ OKX 顶流交易对 · 吞没扫描 · Discord 极简推送
 Designed with  minimalism in mind – 加强版 (robust).
 """
 
-import os, asyncio, aiohttp, ccxt, sys, traceback
-from datetime import datetime, timezone, timedelta
+import os, asyncio, sys, traceback
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 from typing import List, Tuple, Dict, Optional
+from alert_store import ALERTS
+from bar_clock import BarClock, closed_bars, last_closed
+from candle_store import CANDLES
+from discord_queue import DISCORD
+from okx_async_client import OKXAsyncClient
+from okx_stream import ResampledStream
+from pattern_engine import stack_ohlcv, engulfing
+from scanner_host import Detector
+from universe import UNIVERSE
 
 # ── 环境变量 ──────────────────────────────────────────────
 load_dotenv()
@@ -20,23 +29,15 @@ PASSPHRASE= os.getenv("OKX_PASSPHRASE")
 # ── 常量 ──────────────────────────────────────────────────
 TOP_N              = 100
 TIMEFRAMES         = ["5m", "15m", "1h", "4h", "1d"]
-SCAN_INTERVAL_MIN  = 5          # 每 15 分钟跑一次
-BATCH_SIZE         = 20          # 并发请求批量
 APPLE_SPACE_GRAY   = 0x1F1F1F    # 深空灰
 MIN_VOLUME_USDT    = 100000      # 最小成交量阈值
 ENGULF_RATIO       = 1.1         # 吞没比例阈值
+WINDOW_SIZE        = 3           # 每次检测的K线窗口
+STREAM_FLUSH_SEC   = 3           # 实时模式下同批收盘信号的聚合等待秒数
 
 # ── 交易所实例 ────────────────────────────────────────────
-okx = ccxt.okx({
-    "apiKey": API_KEY,
-    "secret": API_SEC,
-    "password": PASSPHRASE,
-    "enableRateLimit": True,
-    "options": {
-        "defaultType": "spot",
-        "adjustForTimeDifference": True
-    }
-})
+# 公共行情走异步客户端：长连接复用，按 OKX 各接口限速自动排队
+okx = OKXAsyncClient()
 
 # ── 技术形态检测 ───────────────────────────────────────────
 def engulf(prev_o: float, prev_c: float, cur_o: float, cur_c: float) -> Optional[str]:
@@ -69,21 +70,9 @@ def engulf(prev_o: float, prev_c: float, cur_o: float, cur_c: float) -> Optional
     return None
 
 # ── Discord 推送 ─────────────────────────────────────────
-async def push_to_discord(embeds: List[Dict]) -> None:
-    """推送消息到Discord"""
-    if not WEBHOOK or not embeds:
-        return
-        
-    try:
-        async with aiohttp.ClientSession() as sess:
-            resp = await sess.post(
-                WEBHOOK,
-                json={"embeds": embeds[:10], "username": "Engulf-Bot"}  # Discord限制最多10个embeds
-            )
-            if resp.status != 204:
-                print(f"Discord Error: {resp.status}", file=sys.stderr)
-    except Exception:
-        traceback.print_exc()
+def push_to_discord(embeds: List[Dict]) -> None:
+    """推送消息到Discord（入队后立即返回，由后台队列按每条10个embed分批发送）"""
+    DISCORD.send(WEBHOOK, embeds=embeds, username="Engulf-Bot")
 
 def make_embed(title: str, desc: str, color: int = APPLE_SPACE_GRAY) -> Dict:
     """创建Discord embed对象"""
@@ -94,67 +83,100 @@ def make_embed(title: str, desc: str, color: int = APPLE_SPACE_GRAY) -> Dict:
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
 
-# ── 扫描一次 ─────────────────────────────────────────────
-async def scan_once() -> None:
-    """执行一次扫描"""
+# ── 交易对筛选 ───────────────────────────────────────────
+async def select_top_symbols() -> Optional[Tuple[List[str], Dict[str, float]]]:
+    """按24h成交额筛选 TOP N 的 USDT 交易对
+
+    Returns:
+        (symbols, symbol_volumes) 或 None（获取行情失败）
+    """
     try:
-        # 1) 获取所有交易对行情
-        tickers = await asyncio.to_thread(okx.fetch_tickers)
+        # 共享交易对池：行情一次请求，元数据按 TTL 缓存
+        ranking = await UNIVERSE.select_async(okx, TOP_N, "USDT", MIN_VOLUME_USDT)
     except Exception:
         traceback.print_exc()
-        return
+        return None
 
-    # 过滤交易对
-    filtered_tickers = []
-    symbol_volumes = {}  # 保存每个交易对的成交量
-    
-    for symbol, ticker in tickers.items():
-        if not symbol.endswith("/USDT"):
-            continue
-            
-        quote_volume = ticker.get("quoteVolume", 0)
-        if quote_volume < MIN_VOLUME_USDT:
-            continue
-            
-        filtered_tickers.append((symbol, quote_volume))
-        symbol_volumes[symbol] = quote_volume  # 保存成交量信息
+    print(f"过滤后的交易对数量: {ranking.eligible}")
+    return ranking.symbols, ranking.volume_map()
 
-    print(f"过滤后的交易对数量: {len(filtered_tickers)}")
-    
-    # 获取成交量TOP N
-    top = sorted(filtered_tickers, key=lambda x: x[1], reverse=True)[:TOP_N]
-    symbols = [s for s, _ in top]
+# ── 扫描一次 ─────────────────────────────────────────────
+async def scan_once(timeframes: List[str] = TIMEFRAMES) -> None:
+    """执行一次扫描，只拉取 timeframes 中的周期（默认全部）"""
+    # 1) 获取成交量TOP N
+    selected = await select_top_symbols()
+    if selected is None:
+        return
+    symbols, symbol_volumes = selected
     
     print(f"扫描TOP {len(symbols)}个交易对")
 
     results = []  # (tf, pattern, symbol, volume)
+    windows = {tf: {} for tf in timeframes}  # tf -> {symbol: 已收盘 ohlcv}
 
     async def fetch_symbol(sym: str) -> None:
-        """获取单个交易对的K线数据并检测形态"""
-        for tf in TIMEFRAMES:
+        """获取单个交易对各周期的K线数据"""
+        for tf in timeframes:
             try:
-                # 获取最近3根K线（多获取一根作为备份）
-                ohlcv = await asyncio.to_thread(okx.fetch_ohlcv, sym, timeframe=tf, limit=3)
-                if len(ohlcv) < 2:
-                    continue
-                    
-                prev, cur = ohlcv[-2], ohlcv[-1]
-                pat = engulf(prev[1], prev[4], cur[1], cur[4])
-                if pat:
-                    results.append((tf, pat, sym, symbol_volumes.get(sym, 0)))
+                # 获取最近3根已收盘K线（多取一根用于去掉未收盘K线，本地仓库增量补齐）
+                ohlcv = closed_bars(await CANDLES.fetch_ohlcv_async(okx, sym, tf, WINDOW_SIZE + 1), tf)
+                if len(ohlcv) >= 2:
+                    windows[tf][sym] = ohlcv
             except Exception as e:
                 # 只在调试时打印错误
                 if os.getenv("DEBUG"):
                     print(f"{sym} {tf}: {type(e).__name__}: {e}")
 
-    # 2) 并发批量处理
-    for i in range(0, len(symbols), BATCH_SIZE):
-        batch = symbols[i:i + BATCH_SIZE]
-        tasks = [fetch_symbol(s) for s in batch]
-        await asyncio.gather(*tasks, return_exceptions=True)
-        await asyncio.sleep(0.25)  # 避免请求过快
+    # 2) 全部并发，由客户端令牌桶按 OKX 限速排队
+    await asyncio.gather(*(fetch_symbol(s) for s in symbols), return_exceptions=True)
+
+    # 每个周期所有交易对堆叠成一个数组，一次完成检测
+    for tf in timeframes:
+        results += detect_batch(tf, windows[tf], symbol_volumes)
+
+    # 3) 推送结果
+    await report(results)
+
+def detect_batch(tf: str, windows: Dict[str, List[List]], symbol_volumes: Dict[str, float]) -> List[Tuple]:
+    """同一周期全部交易对一次检测（判定同 engulf），返回 (tf, pattern, symbol, volume) 列表"""
+    syms = [s for s, w in windows.items() if len(w) >= 2]
+    if not syms:
+        return []
+    bullish, bearish = engulfing(stack_ohlcv([windows[s] for s in syms], WINDOW_SIZE), ENGULF_RATIO)
+    results = []
+    for i, sym in enumerate(syms):
+        pat = "Bullish" if bullish[i, -1] else "Bearish" if bearish[i, -1] else None
+        if pat:
+            results.append((tf, pat, sym, symbol_volumes.get(sym, 0)))
+    return results
+
+class EngulfingDetector(Detector):
+    """扫描宿主插件：吞没形态"""
+
+    name = "engulfing"
+    timeframes = TIMEFRAMES
+    window = WINDOW_SIZE
+    top_n = TOP_N
 
-    # 3) 组装Discord消息
+    def scan(self, tf: str, windows: Dict[str, List[List]], volumes: Dict[str, float]) -> List[Tuple]:
+        return detect_batch(tf, windows, volumes)
+
+    async def report(self, results: List[Tuple]) -> None:
+        await report(results)
+
+# ── 结果推送 ─────────────────────────────────────────────
+def fresh_signals(results: List[Tuple]) -> List[Tuple]:
+    """只保留新出现的信号（同一根K线、同一轮信号不重复推送）"""
+    fresh = [(tf, p, s, v) for tf, p, s, v in results
+             if ALERTS.check("engulfing", s, tf, p, last_closed(tf))]
+    if len(fresh) < len(results):
+        print(f"已抑制 {len(results) - len(fresh)} 条重复信号")
+    return fresh
+
+async def report(results: List[Tuple]) -> None:
+    """按周期分组组装 embed 并推送，results 元素为 (tf, pattern, symbol, volume)"""
+    results = fresh_signals(results)
+    # 组装Discord消息
     embeds = []
     
     # 按时间周期分组
@@ -199,7 +221,7 @@ async def scan_once() -> None:
             f"📊 总计: {len(results)}"
         )
         embeds.insert(0, make_embed("📊 吞没形态扫描报告", stats))
-        await push_to_discord(embeds)
+        push_to_discord(embeds)
 
     print(f"{datetime.now().strftime('%F %T')} → "
           f"{'pushed' if embeds else 'no signal'} {len(results)}")
@@ -214,36 +236,72 @@ async def scheduler() -> None:
     print("🚀 Engulf-Bot started…")
     print(f"配置：TOP_N={TOP_N}, MIN_VOLUME={MIN_VOLUME_USDT:,} USDT")
     print(f"时间周期：{', '.join(TIMEFRAMES)}")
-    print(f"扫描间隔：{SCAN_INTERVAL_MIN}分钟")
+    print("调度方式：K线收盘触发，只拉取刚收盘的周期（日线按 UTC+8）")
     
-    while True:
-        try:
-            now = datetime.now(timezone.utc)  # 使用UTC时间
-            
-            # 检查是否到了扫描时间
-            if now.minute % SCAN_INTERVAL_MIN == 0:
+    clock = BarClock(TIMEFRAMES)
+    try:
+        while True:
+            try:
+                # 首次立即扫描全部周期，之后每次只处理刚收盘的周期
+                due = await clock.wait()
                 print(f"\n{'='*50}")
-                print(f"开始扫描 - {now.strftime('%Y-%m-%d %H:%M:%S UTC')}")
-                
-                await scan_once()
-                
-                # 计算下一次扫描时间
-                next_scan = now.replace(second=0, microsecond=0) + timedelta(minutes=SCAN_INTERVAL_MIN)
-                sleep_seconds = (next_scan - datetime.now(timezone.utc)).total_seconds()
-                
-                if sleep_seconds > 0:
-                    print(f"下次扫描时间：{next_scan.strftime('%H:%M:%S UTC')}")
-                    await asyncio.sleep(sleep_seconds)
-            else:
-                # 等待到下一分钟
-                await asyncio.sleep(60 - now.second)
-                
-        except Exception:
-            traceback.print_exc()
-            await asyncio.sleep(10)
+                print(f"开始扫描 - {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')} "
+                      f"周期：{', '.join(due)}")
+
+                await scan_once(due)
+
+                next_close = datetime.fromtimestamp(clock.next_close() / 1000, timezone.utc)
+                print(f"下次收盘：{next_close.strftime('%H:%M:%S UTC')}")
+
+            except Exception:
+                traceback.print_exc()
+                await asyncio.sleep(10)
+    finally:
+        await okx.close()
+
+# ── 实时推送模式 ─────────────────────────────────────────
+async def stream_mode() -> None:
+    """WebSocket 模式：每个 TOP N 交易对只订阅 1m 频道，各周期本地重采样，K线收盘即检测
+
+    同一时刻收盘的信号先聚合 STREAM_FLUSH_SEC 秒，再按扫描报告格式合并推送。
+    """
+    selected = await select_top_symbols()
+    if selected is None:
+        return
+    symbols, symbol_volumes = selected
+
+    stream = ResampledStream(symbols, TIMEFRAMES, window=WINDOW_SIZE)
+    pending: List[Tuple] = []
+    flush_task: Optional[asyncio.Task] = None
+
+    async def flush() -> None:
+        await asyncio.sleep(STREAM_FLUSH_SEC)
+        batch = pending[:]
+        pending.clear()
+        await report(batch)
+
+    async def on_close(sym: str, tf: str, candles: List[List]) -> None:
+        nonlocal flush_task
+        if len(candles) < 2:
+            return
+        prev, cur = candles[-2], candles[-1]
+        pat = engulf(prev[1], prev[4], cur[1], cur[4])
+        if not pat:
+            return
+        pending.append((tf, pat, sym, symbol_volumes.get(sym, 0)))
+        if flush_task is None or flush_task.done():
+            flush_task = asyncio.create_task(flush())
+
+    stream.on_close(on_close)
+    print("🚀 Engulf-Bot started (WebSocket 实时模式)…")
+    try:
+        await stream.run()
+    finally:
+        await okx.close()
 
 if __name__ == "__main__":
     try:
-        asyncio.run(scheduler())
+        # python xxx.py --stream 使用 WebSocket 实时模式，否则按时间轮询
+        asyncio.run(stream_mode() if "--stream" in sys.argv else scheduler())
     except KeyboardInterrupt:
         print("\nBye ✌️")
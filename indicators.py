@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量指标库 · 每根新K线 O(1) 更新 · 状态可序列化
+EMA / RSI / ATR / 滚动均值 / 滚动最高最低，结果与现有批量公式逐值一致
+"""
+
+import copy, json, math, os
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+# ── 常量 ──────────────────────────────────────────────────
+STATE_DIR = os.getenv("INDICATOR_STATE_DIR",
+                      os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "indicators"))
+TS, OPEN, HIGH, LOW, CLOSE, VOLUME = 0, 1, 2, 3, 4, 5   # ccxt K线行的字段位置
+NAN = float("nan")
+TA_EPSILON = 1e-8     # talib TA_IS_ZERO 阈值：avg_gain + avg_loss 低于此值时 RSI 取 0
+
+_REGISTRY: Dict[str, type] = {}
+
+
+def _register(cls):
+    _REGISTRY[cls.__name__] = cls
+    return cls
+
+
+class Indicator:
+    """增量指标基类
+
+    update(row) 提交一根已收盘K线并返回最新值；peek(row) 只试算不提交，
+    用于把未收盘的最新K线计入结果（与批量计算包含最后一根K线的行为一致）。
+    """
+
+    def __init__(self):
+        self.last_ts: Optional[int] = None
+        self.value = NAN
+
+    def _step(self, row: List) -> float:
+        raise NotImplementedError
+
+    def update(self, row: List) -> float:
+        self.value = self._step(row)
+        self.last_ts = int(row[TS])
+        return self.value
+
+    def peek(self, row: List) -> float:
+        return copy.deepcopy(self).update(row)
+
+    # ── 序列化 ──
+    def to_dict(self) -> Dict:
+        state = {k: (list(v) if isinstance(v, deque) else v) for k, v in self.__dict__.items()}
+        state["type"] = type(self).__name__
+        return state
+
+    @staticmethod
+    def from_dict(state: Dict) -> "Indicator":
+        """由 to_dict() 的结果还原指标"""
+        return _restore(state)
+
+
+@_register
+class EMA(Indicator):
+    """指数移动平均，等价于 pandas ewm(span=period, adjust=False).mean()"""
+
+    def __init__(self, period: int = 20, source: int = CLOSE):
+        super().__init__()
+        self.period = period
+        self.source = source
+        self.alpha = 2.0 / (period + 1)
+
+    def _step(self, row: List) -> float:
+        x = float(row[self.source])
+        if math.isnan(self.value):
+            return x
+        # 与 pandas ewma 的运算顺序保持一致，保证逐位相同
+        old_wt = 1.0 - self.alpha
+        return (old_wt * self.value + self.alpha * x) / (old_wt + self.alpha)
+
+
+@_register
+class RSI(Indicator):
+    """Wilder RSI，等价于 talib.RSI(close, timeperiod=period)（前 period 根为 NaN）"""
+
+    def __init__(self, period: int = 14, source: int = CLOSE):
+        super().__init__()
+        self.period = period
+        self.source = source
+        self.prev: Optional[float] = None
+        self.count = 0
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+
+    def _step(self, row: List) -> float:
+        x = float(row[self.source])
+        if self.prev is None:
+            self.prev = x
+            return NAN
+        diff = x - self.prev
+        self.prev = x
+        gain, loss = (diff, 0.0) if diff > 0 else (0.0, -diff)
+        self.count += 1
+
+        if self.count < self.period:
+            self.avg_gain += gain
+            self.avg_loss += loss
+            return NAN
+        if self.count == self.period:
+            self.avg_gain = (self.avg_gain + gain) / self.period
+            self.avg_loss = (self.avg_loss + loss) / self.period
+        else:
+            self.avg_gain = (self.avg_gain * (self.period - 1) + gain) / self.period
+            self.avg_loss = (self.avg_loss * (self.period - 1) + loss) / self.period
+
+        total = self.avg_gain + self.avg_loss
+        return 100.0 * (self.avg_gain / total) if abs(total) >= TA_EPSILON else 0.0
+
+
+@_register
+class RollingMean(Indicator):
+    """滚动均值（补偿求和），等价于 pandas rolling(window).mean()，前 window-1 根为 NaN
+
+    source 为 "range" 时取 high - low，即 btc_price_action 中的 ATR 写法。
+    """
+
+    def __init__(self, window: int = 14, source=CLOSE):
+        super().__init__()
+        self.window = window
+        self.source = source
+        self.buf = deque()
+        self.total = 0.0
+        self.comp = 0.0
+
+    def _x(self, row: List) -> float:
+        if self.source == "range":
+            return float(row[HIGH]) - float(row[LOW])
+        return float(row[self.source])
+
+    def _add(self, x: float) -> None:
+        # Neumaier 补偿求和，长期运行不累积误差
+        t = self.total + x
+        if abs(self.total) >= abs(x):
+            self.comp += (self.total - t) + x
+        else:
+            self.comp += (x - t) + self.total
+        self.total = t
+
+    def _step(self, row: List) -> float:
+        x = self._x(row)
+        self.buf.append(x)
+        self._add(x)
+        if len(self.buf) > self.window:
+            self._add(-self.buf.popleft())
+        if len(self.buf) < self.window:
+            return NAN
+        return (self.total + self.comp) / self.window
+
+
+@_register
+class RollingMax(Indicator):
+    """滚动最高（单调队列，均摊 O(1)），等价于 pandas rolling(window).max()"""
+
+    sign = 1.0
+
+    def __init__(self, window: int = 20, source: int = HIGH):
+        super().__init__()
+        self.window = window
+        self.source = source
+        self.n = 0
+        self.dq = deque()   # [(index, value)]，value 单调
+
+    def _step(self, row: List) -> float:
+        x = float(row[self.source])
+        while self.dq and self.sign * self.dq[-1][1] <= self.sign * x:
+            self.dq.pop()
+        self.dq.append((self.n, x))
+        if self.dq[0][0] <= self.n - self.window:
+            self.dq.popleft()
+        self.n += 1
+        return self.dq[0][1] if self.n >= self.window else NAN
+
+
+@_register
+class RollingMin(RollingMax):
+    """滚动最低，等价于 pandas rolling(window).min()"""
+
+    sign = -1.0
+
+    def __init__(self, window: int = 20, source: int = LOW):
+        super().__init__(window, source)
+
+
+@_register
+class ATR(Indicator):
+    """真实波幅 ATR（Wilder RMA），等价于 Pine ta.atr(period)"""
+
+    def __init__(self, period: int = 14):
+        super().__init__()
+        self.period = period
+        self.prev_close: Optional[float] = None
+        self.seed: List[float] = []
+
+    def _step(self, row: List) -> float:
+        h, l, c = float(row[HIGH]), float(row[LOW]), float(row[CLOSE])
+        tr = h - l if self.prev_close is None else \
+            max(h - l, abs(h - self.prev_close), abs(l - self.prev_close))
+        self.prev_close = c
+        if math.isnan(self.value):
+            self.seed.append(tr)
+            if len(self.seed) < self.period:
+                return NAN
+            value, self.seed = sum(self.seed) / self.period, []
+            return value
+        alpha = 1.0 / self.period
+        return alpha * tr + (1 - alpha) * self.value
+
+
+@_register
+class EMATouchStreak(Indicator):
+    """连续未触及 EMA 的K线数，等价于 ema_monitor.check_ema_touch 的 not_touch_count
+
+    value 为连续根数；above 表示最新收盘价是否在 EMA 上方。
+    """
+
+    def __init__(self, period: int = 20):
+        super().__init__()
+        self.ema = EMA(period)
+        self.streak = 0
+        self.above = False
+
+    def _step(self, row: List) -> float:
+        ema = self.ema.update(row)
+        touches = float(row[HIGH]) >= ema and float(row[LOW]) <= ema
+        self.streak = 0 if touches else self.streak + 1
+        self.above = float(row[CLOSE]) > ema
+        return self.streak
+
+    def peek_state(self, row: List):
+        """试算未收盘K线，返回 (连续根数, 是否在EMA上方)"""
+        probe = copy.deepcopy(self)
+        probe.update(row)
+        return probe.streak, probe.above
+
+    def to_dict(self) -> Dict:
+        state = super().to_dict()
+        state["ema"] = self.ema.to_dict()
+        return state
+
+
+def _restore(state: Dict) -> Indicator:
+    state = dict(state)
+    obj = object.__new__(_REGISTRY[state.pop("type")])
+    for k, v in state.items():
+        if k == "buf":
+            v = deque(v)
+        elif k == "dq":
+            v = deque(tuple(p) for p in v)
+        elif isinstance(v, dict) and "type" in v:
+            v = _restore(v)
+        setattr(obj, k, v)
+    return obj
+
+
+# ── 按 (交易对, 周期) 管理的指标状态 ─────────────────────
+class IndicatorBank:
+    """为每个 (交易对, 周期) 维护一个指标实例，支持落盘与重启恢复
+
+    用法:
+        bank = IndicatorBank("ema20_touch", lambda: EMATouchStreak(20))
+        ind = bank.sync(symbol, "5m", closed_rows)   # 只喂入比上次更新的已收盘K线
+        ind.peek_state(live_row)
+        bank.save()
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Indicator], state_dir: str = STATE_DIR):
+        self.name = name
+        self.factory = factory
+        self.path = os.path.join(state_dir, f"{name}.json")
+        self.states: Dict[str, Indicator] = {}
+        self.load()
+
+    @staticmethod
+    def _key(symbol: str, timeframe: str) -> str:
+        # BTC/USDT 与 BTC-USDT、1h 与 1H 视为同一序列
+        return f"{symbol.replace('/', '-')}|{timeframe.lower()}"
+
+    def get(self, symbol: str, timeframe: str) -> Optional[Indicator]:
+        return self.states.get(self._key(symbol, timeframe))
+
+    def sync(self, symbol: str, timeframe: str, closed_rows: List[List]) -> Indicator:
+        """喂入已收盘K线（按时间正序）
+
+        状态的最后时间戳不在 closed_rows 中（首次使用、数据出现缺口）时，以 closed_rows 重新预热。
+        """
+        key = self._key(symbol, timeframe)
+        ind = self.states.get(key)
+        stamps = [int(r[TS]) for r in closed_rows]
+        if ind is None or ind.last_ts is None or \
+                (ind.last_ts not in stamps and stamps and stamps[0] > ind.last_ts):
+            ind = self.factory()
+            self.states[key] = ind
+        for row in closed_rows:
+            if ind.last_ts is None or int(row[TS]) > ind.last_ts:
+                ind.update(row)
+        return ind
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({k: v.to_dict() for k, v in self.states.items()}, f)
+        os.replace(tmp, self.path)
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                self.states = {k: Indicator.from_dict(v) for k, v in json.load(f).items()}
+        except (ValueError, KeyError) as e:
+            print(f"指标状态文件损坏，重新预热: {e}")
+            self.states = {}
@@ -5,45 +5,72 @@ OKX 市场价格监控器
 使用公开API获取BTC和ETH的价格信息，无需API密钥
 """
 
+import sys
 import ccxt
 import pandas as pd
 from datetime import datetime
 import time
 
+from okx_async_client import route_ccxt
+from order_book import BookStream
+
+DEPTH_BPS = 10      # 深度统计范围：中间价上下 10 个基点
+TOP_MOVERS = 10     # --all 模式下显示的涨幅 / 跌幅前几名
+
 class MarketPriceMonitor:
     def __init__(self):
         """初始化OKX交易所连接（仅公开API）"""
-        self.exchange = ccxt.okx({
+        self.exchange = route_ccxt(ccxt.okx({
             'enableRateLimit': True,
             'options': {
                 'defaultType': 'spot'
             }
-        })
+        }))
+        self.book_stream = None
         print("✅ OKX 市场价格监控器初始化成功")
     
+    @staticmethod
+    def parse_ticker(symbol, ticker):
+        """ccxt ticker → 监控用的精简价格记录"""
+        return {
+            'symbol': symbol,
+            'last': ticker['last'],
+            'bid': ticker['bid'],
+            'ask': ticker['ask'],
+            'high': ticker['high'],
+            'low': ticker['low'],
+            'volume': ticker['baseVolume'],
+            'change': ticker['change'],
+            'change_percent': ticker['percentage'],
+            'timestamp': ticker['timestamp']
+        }
+    
     def get_market_prices(self, symbols=['BTC/USDT', 'ETH/USDT']):
-        """获取市场价格"""
+        """获取市场价格（一次 tickers 批量请求覆盖全部交易对）"""
         try:
+            tickers = self.exchange.fetch_tickers(symbols)
             prices = {}
             for symbol in symbols:
-                ticker = self.exchange.fetch_ticker(symbol)
-                prices[symbol] = {
-                    'symbol': symbol,
-                    'last': ticker['last'],
-                    'bid': ticker['bid'],
-                    'ask': ticker['ask'],
-                    'high': ticker['high'],
-                    'low': ticker['low'],
-                    'volume': ticker['baseVolume'],
-                    'change': ticker['change'],
-                    'change_percent': ticker['percentage'],
-                    'timestamp': ticker['timestamp']
-                }
+                if symbol not in tickers:
+                    print(f"⚠️ 未找到交易对: {symbol}")
+                    continue
+                prices[symbol] = self.parse_ticker(symbol, tickers[symbol])
             return prices
         except Exception as e:
             print(f"❌ 获取价格失败: {e}")
             return None
     
+    def get_all_market_prices(self, quote='USDT'):
+        """一次请求获取全部现货交易对价格，只保留指定计价币种"""
+        try:
+            tickers = self.exchange.fetch_tickers()
+            suffix = '/' + quote
+            return {symbol: self.parse_ticker(symbol, ticker)
+                    for symbol, ticker in tickers.items() if symbol.endswith(suffix)}
+        except Exception as e:
+            print(f"❌ 获取价格失败: {e}")
+            return None
+    
     def get_order_book(self, symbol, limit=10):
         """获取订单簿信息"""
         try:
@@ -53,8 +80,32 @@ class MarketPriceMonitor:
             print(f"❌ 获取订单簿失败: {e}")
             return None
     
+    def start_order_books(self, symbols, channel='books'):
+        """启动本地订单簿（WebSocket 快照 + 增量），之后深度分析直接读内存"""
+        self.book_stream = BookStream(symbols, channel)
+        self.book_stream.start()
+        if not self.book_stream.wait_synced():
+            print("⚠️ 部分订单簿尚未同步，暂时使用 REST 深度")
+    
     def analyze_market_depth(self, symbol):
         """分析市场深度"""
+        book = self.book_stream.books.get(symbol) if self.book_stream else None
+        if book is not None and book.synced:
+            pressure = book.pressure(10)
+            top_bid, top_ask = book.best()
+            return {
+                'symbol': symbol,
+                'bid_pressure': pressure['bid_pressure'],
+                'ask_pressure': pressure['ask_pressure'],
+                'bid_total': pressure['bid_total'],
+                'ask_total': pressure['ask_total'],
+                'top_bid': top_bid,
+                'top_ask': top_ask,
+                'spread': (top_ask - top_bid) if top_bid and top_ask else 0,
+                'imbalance': pressure['imbalance'],
+                'depth': book.depth_bps(DEPTH_BPS)
+            }
+        
         orderbook = self.get_order_book(symbol, limit=20)
         if not orderbook:
             return None
@@ -109,6 +160,23 @@ class MarketPriceMonitor:
                 spread_percent = (depth['spread'] / price_info['last']) * 100
                 print(f"   📊 买卖压力: 买盘 {depth['bid_pressure']:.1f}% | 卖盘 {depth['ask_pressure']:.1f}%")
                 print(f"   💸 点差: ${depth['spread']:.2f} ({spread_percent:.3f}%)")
+                if 'depth' in depth:
+                    d = depth['depth']
+                    print(f"   🧱 ±{DEPTH_BPS}bps深度: 买 ${d['bid_notional']:,.0f} | 卖 ${d['ask_notional']:,.0f} | 失衡度 {depth['imbalance']:+.2f}")
+    
+    def display_all_prices(self, prices, top=TOP_MOVERS):
+        """全市场模式：只显示 24h 涨跌幅前后各 top 个交易对（逐个查深度 / 情绪请求过多）"""
+        if not prices:
+            return
+        ranked = sorted((p for p in prices.values() if p['change_percent'] is not None),
+                        key=lambda p: p['change_percent'], reverse=True)
+        
+        print(f"\n📊 全市场价格 ({len(prices)} 个交易对) - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        print("=" * 80)
+        for title, rows in (("📈 涨幅榜", ranked[:top]), ("📉 跌幅榜", ranked[::-1][:top])):
+            print(f"\n{title}")
+            for p in rows:
+                print(f"   {p['symbol']:<16} ${p['last']:>14,.6g} {p['change_percent']:+8.2f}%  成交量 {p['volume'] or 0:,.0f}")
     
     def get_market_sentiment(self, symbol):
         """获取市场情绪"""
@@ -151,17 +219,25 @@ class MarketPriceMonitor:
             print(f"❌ 获取市场情绪失败: {e}")
             return None
     
-    def monitor_prices(self, symbols=['BTC/USDT', 'ETH/USDT'], interval=30):
-        """监控价格"""
+    def monitor_prices(self, symbols=['BTC/USDT', 'ETH/USDT'], interval=30, live_book=False, all_pairs=False):
+        """监控价格（live_book=True 时深度来自本地 WebSocket 订单簿；all_pairs=True 时监控全部 USDT 现货）"""
+        if live_book and not all_pairs:
+            self.start_order_books(symbols)
         print("🚀 OKX 市场价格监控器启动")
         print("=" * 60)
-        print(f"监控交易对: {', '.join(symbols)}")
+        print(f"监控交易对: {'全部 USDT 现货' if all_pairs else ', '.join(symbols)}")
         print(f"更新间隔: {interval}秒")
         print("按 Ctrl+C 停止监控")
         print("=" * 60)
         
         try:
             while True:
+                if all_pairs:
+                    self.display_all_prices(self.get_all_market_prices())
+                    print(f"\n⏳ {interval}秒后更新...")
+                    time.sleep(interval)
+                    continue
+                
                 # 获取价格
                 prices = self.get_market_prices(symbols)
                 if prices:
@@ -184,7 +260,7 @@ class MarketPriceMonitor:
 def main():
     """主函数"""
     monitor = MarketPriceMonitor()
-    monitor.monitor_prices(interval=30)
+    monitor.monitor_prices(interval=30, live_book="--book" in sys.argv, all_pairs="--all" in sys.argv)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
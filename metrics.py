@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+扫描管线监控 · 分阶段计时 · 接口延迟直方图 · Prometheus 本地端点
+每轮扫描记录行情 / K线 / 检测 / 推送各阶段耗时、每秒扫描交易对数与收盘到推送的延迟，
+结束时追加一行 JSON 到扫描日志；计数与直方图可由 http://127.0.0.1:9108/metrics 抓取
+"""
+
+import json, os, sys, threading, time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from candle_store import timeframe_ms
+
+# ── 常量 ──────────────────────────────────────────────────
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+SCAN_LOG     = os.getenv("SCAN_LOG",
+                         os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "scan_metrics.jsonl"))
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)             # 单次请求（秒）
+STAGE_BUCKETS   = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)             # 扫描阶段（秒）
+DELAY_BUCKETS   = (1, 2, 5, 10, 20, 30, 60, 120, 300, 900)                 # 收盘到推送（秒）
+
+# 指标名 → (类型, 说明, 直方图分桶)
+METRICS_SPEC = {
+    "okx_request_seconds":        ("histogram", "OKX REST 单次请求耗时", LATENCY_BUCKETS),
+    "okx_rate_limited_total":     ("counter", "OKX 返回限速错误（429 / 50011 / 50061）的次数", None),
+    "okx_retries_total":          ("counter", "OKX 请求重试次数", None),
+    "okx_throttle_seconds_total": ("counter", "客户端令牌桶排队等待的累计秒数", None),
+    "scan_stage_seconds":         ("histogram", "扫描各阶段耗时", STAGE_BUCKETS),
+    "scan_seconds":               ("histogram", "整轮扫描耗时", STAGE_BUCKETS),
+    "scans_total":                ("counter", "完成的扫描轮数", None),
+    "scan_symbols_per_second":    ("gauge", "最近一轮每秒扫描的交易对数", None),
+    "alert_delay_seconds":        ("histogram", "K线收盘到信号入队推送的延迟", DELAY_BUCKETS),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels] + ([extra] if extra else [])
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Scan:
+    """一轮扫描的记录，由 METRICS.scan() 创建
+
+    用法:
+        with METRICS.scan("continuous") as scan:
+            with scan.stage("tickers"):
+                ...
+            scan.symbols = len(symbols)
+    """
+
+    def __init__(self, metrics: "Metrics", name: str):
+        self.metrics = metrics
+        self.name = name
+        self.stages: Dict[str, float] = {}
+        self.symbols = 0
+        self.delays: List[float] = []
+        self.started = time.monotonic()
+
+    @contextmanager
+    def stage(self, stage: str) -> Iterator[None]:
+        """计时一个阶段；同名阶段多次进入时累加"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self.stages[stage] = self.stages.get(stage, 0.0) + elapsed
+            self.metrics.observe("scan_stage_seconds", elapsed, scan=self.name, stage=stage)
+
+    def alert_delay(self, timeframe: str, bar_ts: int) -> None:
+        self.metrics.alert_delay(self.name, timeframe, bar_ts)
+
+
+class Metrics:
+    """进程内的计数器 / 直方图 / 仪表盘（线程安全），输出 Prometheus 文本格式"""
+
+    def __init__(self, log_path: str = SCAN_LOG):
+        self.log_path = log_path
+        self.lock = threading.Lock()
+        self.values: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], List] = {}   # [各分桶计数, 总和, 次数]
+        self.active: Dict[str, Scan] = {}
+        self.server: Optional[ThreadingHTTPServer] = None
+
+    # ── 记录 ──────────────────────────────────────────────
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = (name, _labels(labels))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        with self.lock:
+            self.values[(name, _labels(labels))] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        buckets = METRICS_SPEC[name][2]
+        key = (name, _labels(labels))
+        with self.lock:
+            hist = self.histograms.setdefault(key, [[0] * len(buckets), 0.0, 0])
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    hist[0][i] += 1
+            hist[1] += value
+            hist[2] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """把 with 块的耗时记入直方图（异常退出同样记录）"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - started, **labels)
+
+    def alert_delay(self, scan: str, timeframe: str, bar_ts: int) -> None:
+        """记录 bar_ts 开盘的K线从收盘到推送的延迟；未收盘K线上的信号不计"""
+        delay = time.time() - (bar_ts + timeframe_ms(timeframe)) / 1000
+        if delay < 0:
+            return
+        self.observe("alert_delay_seconds", delay, scan=scan, timeframe=timeframe)
+        if scan in self.active:
+            self.active[scan].delays.append(delay)
+
+    def total(self, name: str) -> float:
+        """某个计数器在全部标签上的合计（直方图取次数）"""
+        with self.lock:
+            if METRICS_SPEC[name][0] == "histogram":
+                return float(sum(h[2] for (n, _), h in self.histograms.items() if n == name))
+            return sum(v for (n, _), v in self.values.items() if n == name)
+
+    # ── 扫描 ──────────────────────────────────────────────
+    @contextmanager
+    def scan(self, name: str) -> Iterator[Scan]:
+        """一轮扫描：结束时更新汇总指标并写入一行 JSON 日志"""
+        scan = Scan(self, name)
+        before = {k: self.total(k) for k in ("okx_request_seconds", "okx_rate_limited_total", "okx_retries_total")}
+        self.active[name] = scan
+        error = None
+        try:
+            yield scan
+        except BaseException as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self.active.pop(name, None)
+            elapsed = time.monotonic() - scan.started
+            rate = scan.symbols / elapsed if elapsed > 0 else 0.0
+            self.observe("scan_seconds", elapsed, scan=name)
+            self.inc("scans_total", scan=name)
+            self.set("scan_symbols_per_second", rate, scan=name)
+            self._log({
+                "ts": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "scan": name,
+                "seconds": round(elapsed, 3),
+                "stages": {k: round(v, 3) for k, v in scan.stages.items()},
+                "symbols": scan.symbols,
+                "symbols_per_sec": round(rate, 2),
+                "requests": int(self.total("okx_request_seconds") - before["okx_request_seconds"]),
+                "rate_limited": int(self.total("okx_rate_limited_total") - before["okx_rate_limited_total"]),
+                "retries": int(self.total("okx_retries_total") - before["okx_retries_total"]),
+                "alerts": len(scan.delays),
+                "alert_delay_max": round(max(scan.delays), 3) if scan.delays else None,
+                "error": error,
+            })
+
+    def _log(self, record: Dict) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"扫描日志写入失败: {e}", file=sys.stderr)
+
+    # ── 导出 ──────────────────────────────────────────────
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        with self.lock:
+            values = dict(self.values)
+            histograms = {k: (list(h[0]), h[1], h[2]) for k, h in self.histograms.items()}
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS_SPEC.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            if kind != "histogram":
+                lines += [f"{name}{_format_labels(labels)} {value:g}"
+                          for (n, labels), value in sorted(values.items()) if n == name]
+                continue
+            for (n, labels), (counts, total, count) in sorted(histograms.items()):
+                if n != name:
+                    continue
+                bounds = [f'le="{b:g}"' for b in buckets] + ['le="+Inf"']
+                lines += [f"{name}_bucket{_format_labels(labels, le)} {c}"
+                          for le, c in zip(bounds, counts + [count])]
+                lines += [f"{name}_sum{_format_labels(labels)} {total:g}",
+                          f"{name}_count{_format_labels(labels)} {count}"]
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int = METRICS_PORT, host: str = "127.0.0.1") -> None:
+        """后台线程启动 /metrics 端点（重复调用无副作用，端口被占用时只提示）"""
+        if self.server is not None:
+            return
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            self.server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            print(f"监控端点启动失败 {host}:{port}: {e}", file=sys.stderr)
+            return
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True).start()
+        print(f"📈 监控端点: http://{host}:{port}/metrics")
+
+
+# ── 进程内共享实例 ────────────────────────────────────────
+METRICS = Metrics()
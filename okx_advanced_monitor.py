@@ -6,6 +6,8 @@ OKX 高级挂单监控器
 """
 
 import os
+import sys
+import asyncio
 import ccxt
 import pandas as pd
 import numpy as np
@@ -14,6 +16,13 @@ from dotenv import load_dotenv
 import time
 import threading
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from candle_store import CANDLES
+from okx_async_client import route_ccxt
+from okx_private_stream import PrivateStream, describe_change
+
+SENTIMENT_TTL = 300     # 小时K线缓存秒数，期间用最新价刷新未收盘K线
 
 class OKXAdvancedMonitor:
     def __init__(self):
@@ -32,7 +41,7 @@ class OKXAdvancedMonitor:
             print("  - OKX_PASSPHRASE")
             return None
             
-        self.exchange = ccxt.okx({
+        self.exchange = route_ccxt(ccxt.okx({
             'apiKey': self.api_key,
             'secret': self.api_secret,
             'password': self.passphrase,
@@ -41,11 +50,12 @@ class OKXAdvancedMonitor:
                 'defaultType': 'spot',
                 'adjustForTimeDifference': True
             }
-        })
+        }))
         
         # 数据存储
         self.price_history = defaultdict(list)
         self.order_history = defaultdict(list)
+        self.sentiment_cache = {}   # symbol -> (拉取时间, 最近24根小时K线)
         self.monitoring = False
         
         print("✅ OKX 高级监控器初始化成功")
@@ -59,13 +69,48 @@ class OKXAdvancedMonitor:
             print(f"❌ 获取账户余额失败: {e}")
             return None
     
-    def get_position_info(self, symbols):
-        """获取持仓信息"""
+    def get_current_prices(self, symbols, tickers=None):
+        """获取当前价格（一次批量 tickers 请求覆盖全部交易对）"""
+        try:
+            if tickers is None:
+                tickers = self.exchange.fetch_tickers(symbols)
+            prices = {}
+            for symbol in symbols:
+                ticker = tickers[symbol]
+                prices[symbol] = {
+                    'bid': ticker['bid'],
+                    'ask': ticker['ask'],
+                    'last': ticker['last'],
+                    'high': ticker['high'],
+                    'low': ticker['low']
+                }
+            return prices
+        except Exception as e:
+            print(f"❌ 获取价格失败: {e}")
+            return None
+    
+    def get_open_orders(self, symbols, orders=None):
+        """获取挂单信息（一次请求取全部交易对的挂单，再按交易对分组）"""
+        try:
+            if orders is None:
+                orders = self.exchange.fetch_open_orders()
+            all_orders = {symbol: [] for symbol in symbols}
+            for order in orders:
+                if order['symbol'] in all_orders:
+                    all_orders[order['symbol']].append(order)
+            return all_orders
+        except Exception as e:
+            print(f"❌ 获取挂单失败: {e}")
+            return None
+    
+    def get_position_info(self, symbols, balance=None):
+        """获取持仓信息（只查询一次余额）"""
         try:
+            if balance is None:
+                balance = self.exchange.fetch_balance()
             positions = {}
             for symbol in symbols:
                 # 获取现货持仓
-                balance = self.exchange.fetch_balance()
                 base_currency = symbol.split('/')[0]  # BTC, ETH
                 quote_currency = symbol.split('/')[1]  # USDT
                 
@@ -83,6 +128,36 @@ class OKXAdvancedMonitor:
             print(f"❌ 获取持仓信息失败: {e}")
             return None
     
+    def get_account_snapshot(self, symbols):
+        """每轮一次的账户快照
+        
+        余额、批量行情、全部挂单三个请求并发发出，再按交易对分发，
+        请求数与监控的交易对数量无关。
+        
+        Returns:
+            (prices, positions, open_orders)，获取失败的部分为 None
+        """
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            balance = pool.submit(self.exchange.fetch_balance)
+            tickers = pool.submit(self.exchange.fetch_tickers, symbols)
+            orders = pool.submit(self.exchange.fetch_open_orders)
+        
+        def result(future, name):
+            try:
+                return future.result()
+            except Exception as e:
+                print(f"❌ 获取{name}失败: {e}")
+                return None
+        
+        balance = result(balance, "账户余额")
+        tickers = result(tickers, "价格")
+        orders = result(orders, "挂单")
+        
+        prices = self.get_current_prices(symbols, tickers) if tickers is not None else None
+        positions = self.get_position_info(symbols, balance) if balance is not None else None
+        open_orders = self.get_open_orders(symbols, orders) if orders is not None else None
+        return prices, positions, open_orders
+    
     def get_market_depth(self, symbol, limit=20):
         """获取市场深度"""
         try:
@@ -242,12 +317,24 @@ class OKXAdvancedMonitor:
         print(f"   总潜在盈亏: ${total_potential_pnl:+.2f}")
         print(f"   盈亏比例: {(total_potential_pnl/total_order_value*100):+.2f}%" if total_order_value > 0 else "   盈亏比例: N/A")
     
-    def get_market_sentiment(self, symbol):
-        """获取市场情绪指标"""
+    def get_market_sentiment(self, symbol, current_price=None):
+        """获取市场情绪指标
+        
+        小时K线经本地K线仓库增量获取，并在 SENTIMENT_TTL 内复用；
+        传入 current_price 时用最新价刷新未收盘K线的收盘价。
+        """
         try:
             # 获取最近的价格数据
-            ohlcv = self.exchange.fetch_ohlcv(symbol, timeframe='1h', limit=24)
-            df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+            now = time.time()
+            cached = self.sentiment_cache.get(symbol)
+            if cached is None or now - cached[0] >= SENTIMENT_TTL or \
+                    cached[1][-1][0] + 3600 * 1000 <= now * 1000:
+                cached = (now, CANDLES.fetch_ohlcv(self.exchange, symbol, '1h', 24))
+                self.sentiment_cache[symbol] = cached
+            
+            df = pd.DataFrame(cached[1], columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+            if current_price and current_price.get('last'):
+                df.loc[df.index[-1], 'close'] = float(current_price['last'])
             
             # 计算简单的技术指标
             df['price_change'] = df['close'].pct_change()
@@ -299,16 +386,12 @@ class OKXAdvancedMonitor:
                 print(f"\n⏰ {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
                 print("-" * 60)
                 
-                # 获取当前价格
-                prices = self.get_current_prices(symbols)
+                # 价格、持仓、挂单一次并发获取
+                prices, positions, open_orders = self.get_account_snapshot(symbols)
                 if not prices:
+                    time.sleep(interval)
                     continue
                 
-                # 获取持仓信息
-                positions = self.get_position_info(symbols)
-                
-                # 获取挂单
-                open_orders = self.get_open_orders(symbols)
                 if not open_orders:
                     print("❌ 无法获取挂单信息")
                     time.sleep(interval)
@@ -321,7 +404,7 @@ class OKXAdvancedMonitor:
                     position_info = positions[symbol] if positions else None
                     
                     # 获取市场情绪
-                    sentiment = self.get_market_sentiment(symbol)
+                    sentiment = self.get_market_sentiment(symbol, current_price)
                     
                     # 分析挂单
                     analyzed_orders = self.analyze_stop_loss_take_profit(orders, current_price, position_info)
@@ -342,12 +425,60 @@ class OKXAdvancedMonitor:
             print("\n\n🛑 监控已停止")
             self.monitoring = False
     
+    def monitor_orders_stream(self, symbols=['BTC/USDT', 'ETH/USDT']):
+        """实时挂单监控（私有 WebSocket）
+        
+        订单新增、成交、撤销即时推送，只重新分析发生变化的订单；
+        余额来自 account 频道，价格来自 tickers 频道，不再轮询 REST。
+        """
+        print("🚀 OKX 高级挂单监控器启动（WebSocket 实时模式）")
+        print("=" * 60)
+        print(f"监控交易对: {', '.join(symbols)}")
+        print("按 Ctrl+C 停止监控")
+        print("=" * 60)
+        
+        stream = PrivateStream(self.api_key, self.api_secret, self.passphrase, symbols,
+                               snapshot=lambda: self.exchange.fetch_open_orders())
+        analyzed = {symbol: {} for symbol in symbols}   # 交易对 -> {订单ID: 分析结果}
+        
+        async def on_order(order, previous):
+            symbol = order['symbol']
+            current_price = stream.tickers.get(symbol)
+            if current_price is None:
+                prices = await asyncio.to_thread(self.get_current_prices, [symbol])
+                if not prices:
+                    return
+                current_price = prices[symbol]
+            positions = self.get_position_info(symbols, stream.balances) if stream.balances else None
+            position_info = positions[symbol] if positions else None
+            
+            print(f"\n⏰ {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} {describe_change(order, previous)} "
+                  f"{symbol} {order['side'].upper()} ${order['price']:.2f} x {order['amount']:.4f}")
+            
+            # 只分析发生变化的这一笔订单
+            if order['status'] == 'open':
+                analyzed[symbol][order['id']] = self.analyze_stop_loss_take_profit(
+                    [order], current_price, position_info)[0]
+            else:
+                analyzed[symbol].pop(order['id'], None)
+            
+            self.display_advanced_analysis(symbol, list(analyzed[symbol].values()), current_price, positions)
+        
+        stream.on_order(on_order)
+        self.monitoring = True
+        try:
+            asyncio.run(stream.run())
+        except KeyboardInterrupt:
+            print("\n\n🛑 监控已停止")
+            self.monitoring = False
+    
     def get_order_statistics(self, symbols):
         """获取挂单统计信息"""
         try:
             stats = {}
+            open_orders = self.get_open_orders(symbols)
             for symbol in symbols:
-                orders = self.exchange.fetch_open_orders(symbol)
+                orders = open_orders[symbol]
                 
                 buy_orders = [o for o in orders if o['side'] == 'buy']
                 sell_orders = [o for o in orders if o['side'] == 'sell']
@@ -373,8 +504,11 @@ def main():
     """主函数"""
     monitor = OKXAdvancedMonitor()
     if monitor.exchange:
-        # 运行高级监控
-        monitor.monitor_orders_advanced(interval=30)
+        # 运行高级监控（--stream 为 WebSocket 实时模式）
+        if "--stream" in sys.argv:
+            monitor.monitor_orders_stream()
+        else:
+            monitor.monitor_orders_advanced(interval=30)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
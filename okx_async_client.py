@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OKX 异步行情客户端 · 长连接复用 · 按接口令牌桶限速
+所有扫描脚本共用：行情 tickers、K线 candles、深度 books
+"""
+
+import asyncio, os, time, aiohttp
+from typing import Dict, List, Optional, Tuple
+
+from candle_store import timeframe_ms
+from metrics import METRICS
+
+# ── 常量 ──────────────────────────────────────────────────
+BASE_URL       = os.getenv("OKX_BASE_URL", "https://www.okx.com")   # 指向 okx_replay 录制 / 回放服务时覆盖
+POOL_SIZE      = 50          # 连接池上限（keep-alive 复用）
+MAX_RETRIES    = 4           # 限速/网络错误最大重试次数
+RETRY_BACKOFF  = 0.5         # 重试初始退避秒数（指数增长）
+RATE_LIMIT_CODES = {"50011", "50061"}   # OKX 限速错误码
+HISTORY_LIMIT  = 100         # history-candles 单次最多返回 100 根
+RECENT_BARS    = 1440        # candles 只提供最近 1440 根，更早的走 history-candles
+
+# OKX 公共接口限速（按 IP）：(请求数, 窗口秒数)
+ENDPOINT_LIMITS = {
+    "/api/v5/market/tickers":         (20, 2),
+    "/api/v5/market/ticker":          (20, 2),
+    "/api/v5/market/candles":         (40, 2),
+    "/api/v5/market/history-candles": (20, 2),
+    "/api/v5/market/books":           (40, 2),
+    "/api/v5/public/instruments":     (20, 2),
+}
+DEFAULT_LIMIT  = (10, 2)
+
+# ccxt 周期写法 → OKX bar 参数
+BAR_MAP = {"1m": "1m", "3m": "3m", "5m": "5m", "15m": "15m", "30m": "30m",
+           "1h": "1H", "2h": "2H", "4h": "4H", "6h": "6H", "12h": "12H",
+           "1d": "1D", "1w": "1W"}
+
+
+def to_inst_id(symbol: str) -> str:
+    """BTC/USDT → BTC-USDT（已是 instId 时原样返回）"""
+    return symbol.replace("/", "-")
+
+
+def to_symbol(inst_id: str) -> str:
+    """BTC-USDT → BTC/USDT"""
+    return inst_id.replace("-", "/")
+
+
+def to_bar(timeframe: str) -> str:
+    """5m/1h/1d → OKX 的 5m/1H/1D"""
+    return BAR_MAP.get(timeframe, timeframe)
+
+
+def candles_request(symbol: str, timeframe: str, since: Optional[int] = None,
+                    limit: int = 100) -> Tuple[str, Dict]:
+    """K线请求的 (路径, 参数)
+
+    since 不为空时限定在 [since, since + limit 根) 区间内（同时给出 before / after），
+    超出 candles 可回溯范围时改用 history-candles，单页随之降为 HISTORY_LIMIT 根
+    """
+    path = "/api/v5/market/candles"
+    params = {"instId": to_inst_id(symbol), "bar": to_bar(timeframe), "limit": limit}
+    if since is not None:
+        tf_ms = timeframe_ms(timeframe)
+        if since < time.time() * 1000 - (RECENT_BARS - 1) * tf_ms:
+            path = "/api/v5/market/history-candles"
+            params["limit"] = min(limit, HISTORY_LIMIT)
+        params["before"] = since - 1
+        params["after"] = since + params["limit"] * tf_ms
+    return path, params
+
+
+def route_ccxt(exchange):
+    """让 ccxt.okx 实例与本模块走同一个 REST 地址（设置 OKX_BASE_URL 后对 ccxt 脚本同样生效）"""
+    exchange.urls["api"]["rest"] = BASE_URL
+    return exchange
+
+
+def parse_candles(data: List[List]) -> List[List]:
+    """OKX 倒序K线 → ccxt 格式正序 [ts, o, h, l, c, v]"""
+    return [[int(c[0]), float(c[1]), float(c[2]), float(c[3]), float(c[4]), float(c[5])]
+            for c in reversed(data)]
+
+
+class OKXAPIError(Exception):
+    """OKX 返回非 0 业务码"""
+
+    def __init__(self, code: str, msg: str):
+        super().__init__(f"{code}: {msg}")
+        self.code = code
+
+
+class TokenBucket:
+    """异步令牌桶：窗口内最多 capacity 次请求，令牌匀速回填"""
+
+    def __init__(self, capacity: int, per_seconds: float):
+        self.capacity = capacity
+        self.rate = capacity / per_seconds
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """取一个令牌，不足时等待到恰好有令牌为止"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def drain(self) -> None:
+        """收到限速错误时清空令牌，迫使后续请求按回填速度排队"""
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+
+
+class OKXAsyncClient:
+    """OKX 公共行情异步客户端
+
+    用法:
+        async with OKXAsyncClient() as client:
+            tickers = await client.fetch_tickers()
+    """
+
+    def __init__(self, base_url: str = BASE_URL, pool_size: int = POOL_SIZE):
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.buckets: Dict[str, TokenBucket] = {}
+
+    async def __aenter__(self) -> "OKXAsyncClient":
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def open(self) -> None:
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, ttl_dns_cache=300,
+                                             keepalive_timeout=30)
+            self.session = aiohttp.ClientSession(
+                base_url=self.base_url,
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=15)
+            )
+
+    async def close(self) -> None:
+        if self.session and not self.session.closed:
+            await self.session.close()
+
+    def _bucket(self, path: str) -> TokenBucket:
+        if path not in self.buckets:
+            self.buckets[path] = TokenBucket(*ENDPOINT_LIMITS.get(path, DEFAULT_LIMIT))
+        return self.buckets[path]
+
+    # ── 通用请求 ──────────────────────────────────────────
+    async def get(self, path: str, params: Optional[Dict] = None) -> List:
+        """限速 + 重试的 GET 请求，返回 OKX 响应中的 data 字段"""
+        await self.open()
+        bucket = self._bucket(path)
+        params = {k: str(v) for k, v in (params or {}).items() if v is not None}
+
+        for attempt in range(MAX_RETRIES + 1):
+            if attempt:
+                METRICS.inc("okx_retries_total", endpoint=path)
+            queued = time.monotonic()
+            await bucket.acquire()
+            METRICS.inc("okx_throttle_seconds_total", time.monotonic() - queued, endpoint=path)
+            try:
+                with METRICS.timer("okx_request_seconds", endpoint=path):
+                    async with self.session.get(path, params=params) as resp:
+                        if resp.status == 429:
+                            raise OKXAPIError("429", "Too Many Requests")
+                        resp.raise_for_status()
+                        payload = await resp.json()
+                if payload.get("code") != "0":
+                    raise OKXAPIError(payload.get("code"), payload.get("msg", ""))
+                return payload["data"]
+            except OKXAPIError as e:
+                if e.code not in RATE_LIMIT_CODES and e.code != "429":
+                    raise
+                METRICS.inc("okx_rate_limited_total", endpoint=path)
+                bucket.drain()
+                if attempt == MAX_RETRIES:
+                    raise
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == MAX_RETRIES:
+                    raise
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+    # ── 行情接口 ──────────────────────────────────────────
+    async def fetch_tickers(self, inst_type: str = "SPOT") -> List[Dict]:
+        """全市场 tickers（一次请求），原始 OKX 字段"""
+        return await self.get("/api/v5/market/tickers", {"instType": inst_type})
+
+    async def fetch_ticker(self, symbol: str) -> Dict:
+        """单个交易对 ticker"""
+        data = await self.get("/api/v5/market/ticker", {"instId": to_inst_id(symbol)})
+        return data[0]
+
+    async def fetch_ohlcv(self, symbol: str, timeframe: str = "1m",
+                          since: Optional[int] = None, limit: int = 100) -> List[List]:
+        """K线，返回与 ccxt fetch_ohlcv 相同的正序 [ts, o, h, l, c, v] 列表
+
+        since 不为空时只返回该时间戳（含）起的 limit 根以内的K线（见 candles_request）
+        """
+        data = await self.get(*candles_request(symbol, timeframe, since, limit))
+        return parse_candles(data)
+
+    async def fetch_history(self, symbol: str, timeframe: str = "1m",
+                            after: Optional[int] = None, limit: int = HISTORY_LIMIT) -> List[List]:
+        """历史K线（history-candles，可回溯数年），格式同 fetch_ohlcv
+
+        after 不为空时只返回该时间戳（不含）之前的K线，用于向前翻页
+        """
+        params = {"instId": to_inst_id(symbol), "bar": to_bar(timeframe), "limit": limit, "after": after}
+        data = await self.get("/api/v5/market/history-candles", params)
+        return parse_candles(data)
+
+    async def fetch_order_book(self, symbol: str, limit: int = 20) -> Dict:
+        """深度快照，格式同 ccxt：{'bids': [[price, size], ...], 'asks': [...], 'timestamp': ms}"""
+        data = await self.get("/api/v5/market/books", {"instId": to_inst_id(symbol), "sz": limit})
+        book = data[0]
+        return {
+            "bids": [[float(p), float(s)] for p, s, *_ in book["bids"]],
+            "asks": [[float(p), float(s)] for p, s, *_ in book["asks"]],
+            "timestamp": int(book["ts"]),
+        }
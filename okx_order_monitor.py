@@ -6,12 +6,17 @@ OKX 挂单监控器
 """
 
 import os
+import sys
+import asyncio
 import ccxt
 import pandas as pd
 from datetime import datetime
 from dotenv import load_dotenv
 import time
 
+from okx_async_client import route_ccxt
+from okx_private_stream import PrivateStream, describe_change
+
 class OKXOrderMonitor:
     def __init__(self):
         """初始化OKX交易所连接"""
@@ -29,7 +34,7 @@ class OKXOrderMonitor:
             print("  - OKX_PASSPHRASE")
             return None
             
-        self.exchange = ccxt.okx({
+        self.exchange = route_ccxt(ccxt.okx({
             'apiKey': self.api_key,
             'secret': self.api_secret,
             'password': self.passphrase,
@@ -38,7 +43,7 @@ class OKXOrderMonitor:
                 'defaultType': 'spot',
                 'adjustForTimeDifference': True
             }
-        })
+        }))
         
         print("✅ OKX API 连接初始化成功")
     
@@ -227,11 +232,48 @@ class OKXOrderMonitor:
             
             print(f"{symbol}: 买入挂单 {len(buy_orders)}个, 卖出挂单 {len(sell_orders)}个")
 
+    def monitor_orders_stream(self, symbols=['BTC/USDT', 'ETH/USDT']):
+        """实时监控挂单（私有 WebSocket），订单变化时只重新分析该笔订单"""
+        print("🔍 OKX 挂单监控器启动（WebSocket 实时模式）")
+        print("=" * 50)
+        
+        stream = PrivateStream(self.api_key, self.api_secret, self.passphrase, symbols,
+                               snapshot=lambda: self.exchange.fetch_open_orders())
+        analyzed = {symbol: {} for symbol in symbols}   # 交易对 -> {订单ID: 分析结果}
+        
+        async def on_order(order, previous):
+            symbol = order['symbol']
+            current_price = stream.tickers.get(symbol)
+            if current_price is None:
+                prices = await asyncio.to_thread(self.get_current_prices, [symbol])
+                if not prices:
+                    return
+                current_price = prices[symbol]
+            
+            print(f"\n⏰ {datetime.now().strftime('%H:%M:%S')} {describe_change(order, previous)} "
+                  f"{symbol} {order['side'].upper()} ${order['price']:.2f} x {order['amount']:.4f}")
+            
+            if order['status'] == 'open':
+                analyzed[symbol][order['id']] = self.analyze_orders([order], current_price['last'])[0]
+            else:
+                analyzed[symbol].pop(order['id'], None)
+            self.display_order_summary(symbol, list(analyzed[symbol].values()), current_price)
+        
+        stream.on_order(on_order)
+        try:
+            asyncio.run(stream.run())
+        except KeyboardInterrupt:
+            print("\n🛑 监控已停止")
+
 def main():
     """主函数"""
     monitor = OKXOrderMonitor()
     if monitor.exchange:
-        monitor.monitor_orders()
+        # --stream 为 WebSocket 实时模式
+        if "--stream" in sys.argv:
+            monitor.monitor_orders_stream()
+        else:
+            monitor.monitor_orders()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OKX 私有 WebSocket 流 · 订单 / 账户 / 持仓实时推送
+登录后订阅 orders、account、positions 频道，在内存中增量维护自己的挂单簿，订单一有变化立即回调
+"""
+
+import asyncio, base64, hashlib, hmac, json, sys, time, traceback, aiohttp
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from okx_async_client import to_inst_id, to_symbol
+from okx_stream import PING_INTERVAL, RECONNECT_MAX, WS_BASE_URL, WS_PUBLIC_URL
+
+# ── 常量 ──────────────────────────────────────────────────
+WS_PRIVATE_URL = f"{WS_BASE_URL}/ws/v5/private"
+# OKX 订单状态 → ccxt status
+STATUS_MAP     = {"live": "open", "partially_filled": "open", "filled": "closed",
+                  "canceled": "canceled", "mmp_canceled": "canceled"}
+
+OrderHandler = Callable[[Dict, Optional[Dict]], Awaitable[None]]
+
+
+def ws_login_args(api_key: str, api_secret: str, passphrase: str) -> Dict:
+    """私有频道登录参数：sign = Base64(HMAC-SHA256(timestamp + 'GET' + '/users/self/verify'))"""
+    timestamp = str(int(time.time()))
+    mac = hmac.new(bytes(api_secret, encoding='utf8'),
+                   bytes(timestamp + "GET" + "/users/self/verify", encoding='utf-8'),
+                   digestmod=hashlib.sha256)
+    return {"apiKey": api_key, "passphrase": passphrase, "timestamp": timestamp,
+            "sign": base64.b64encode(mac.digest()).decode()}
+
+
+def parse_order(o: Dict) -> Dict:
+    """OKX orders 频道推送 → ccxt fetch_open_orders 的订单格式"""
+    ts = int(o.get("uTime") or o.get("cTime") or 0)
+    return {
+        "id": o["ordId"],
+        "clientOrderId": o.get("clOrdId") or None,
+        "symbol": to_symbol(o["instId"]),
+        "type": o.get("ordType"),
+        "side": o["side"],
+        "price": float(o.get("px") or 0),
+        "amount": float(o.get("sz") or 0),
+        "filled": float(o.get("accFillSz") or 0),
+        "status": STATUS_MAP.get(o.get("state"), o.get("state")),
+        "timestamp": int(o.get("cTime") or ts),
+        "datetime": datetime.fromtimestamp(int(o.get("cTime") or ts) / 1000, timezone.utc).isoformat(),
+        "lastUpdateTimestamp": ts,
+        "info": o,
+    }
+
+
+def parse_ticker(t: Dict) -> Dict:
+    """OKX tickers 频道推送 → get_current_prices 的价格格式"""
+    return {
+        "bid": float(t["bidPx"] or 0),
+        "ask": float(t["askPx"] or 0),
+        "last": float(t["last"]),
+        "high": float(t["high24h"]),
+        "low": float(t["low24h"]),
+    }
+
+
+def describe_change(order: Dict, previous: Optional[Dict]) -> str:
+    """订单变化的简短说明，用于日志输出"""
+    if previous is None:
+        return "🆕 新挂单"
+    if order["status"] == "closed":
+        return "✅ 订单成交"
+    if order["status"] == "canceled":
+        return "❌ 订单撤销"
+    if order["filled"] != previous["filled"]:
+        return "🔄 部分成交"
+    return "✏️ 订单修改"
+
+
+class PrivateStream:
+    """账户私有推送流
+
+    用法:
+        stream = PrivateStream(api_key, secret, passphrase, symbols, snapshot=exchange.fetch_open_orders)
+        stream.on_order(handler)      # async handler(order, previous)
+        await stream.run()
+
+    orders 为当前全部未完成订单 {ordId: order}；previous 为该订单上一次的状态（新订单为 None）。
+    订单成交完或撤销后回调一次（order['status'] 不再是 'open'）并从 orders 中移除。
+    orders 频道只推送变化，启动和每次重连后用 snapshot()（同步 REST）对账一次。
+    """
+
+    def __init__(self, api_key: str, api_secret: str, passphrase: str,
+                 symbols: Optional[List[str]] = None,
+                 snapshot: Optional[Callable[[], List[Dict]]] = None,
+                 with_tickers: bool = True):
+        self.credentials = (api_key, api_secret, passphrase)
+        self.symbols = [to_symbol(s) for s in symbols] if symbols else None
+        self.snapshot = snapshot
+        self.with_tickers = with_tickers and bool(self.symbols)
+        self.orders: Dict[str, Dict] = {}
+        self.balances: Dict[str, Dict] = {}    # 币种 → {'free', 'used', 'total'}，与 ccxt fetch_balance 一致
+        self.positions: Dict[str, Dict] = {}   # posId → OKX 原始持仓字段
+        self.tickers: Dict[str, Dict] = {}
+        self.handlers: List[OrderHandler] = []
+
+    def on_order(self, handler: OrderHandler) -> None:
+        """注册订单变化回调"""
+        self.handlers.append(handler)
+
+    def orders_for(self, symbol: str) -> List[Dict]:
+        return [o for o in self.orders.values() if o["symbol"] == symbol]
+
+    # ── 订单簿维护 ────────────────────────────────────────
+    def _watched(self, symbol: str) -> bool:
+        return self.symbols is None or symbol in self.symbols
+
+    async def _apply(self, order: Dict) -> None:
+        """合并一条订单更新，有实质变化时回调"""
+        if not self._watched(order["symbol"]):
+            return
+        previous = self.orders.get(order["id"])
+        if previous and previous.get("lastUpdateTimestamp", 0) > order["lastUpdateTimestamp"]:
+            return  # 乱序的旧推送
+        if order["status"] == "open":
+            self.orders[order["id"]] = order
+        elif previous is None:
+            return  # 未跟踪过的订单已结束，无需处理
+        else:
+            del self.orders[order["id"]]
+
+        keys = ("status", "price", "amount", "filled")
+        if previous is None or any(previous[k] != order[k] for k in keys):
+            for handler in self.handlers:
+                try:
+                    await handler(order, previous)
+                except Exception:
+                    traceback.print_exc()
+
+    async def _reconcile(self) -> None:
+        """用 REST 快照对账：补上断线期间新增或变化的订单，移除已消失的订单"""
+        if self.snapshot is None:
+            return
+        try:
+            rows = await asyncio.to_thread(self.snapshot)
+        except Exception as e:
+            print(f"挂单快照获取失败: {type(e).__name__}: {e}", file=sys.stderr)
+            return
+        now = int(time.time() * 1000)
+        live = {o["id"]: dict(o, lastUpdateTimestamp=o.get("lastUpdateTimestamp") or 0) for o in rows}
+        for oid, old in list(self.orders.items()):
+            if oid not in live:
+                await self._apply(dict(old, status="closed", lastUpdateTimestamp=now))
+        for order in live.values():
+            await self._apply(order)   # 旧于本地的快照由 _apply 按 lastUpdateTimestamp 跳过，无变化不回调
+
+    # ── 消息处理 ──────────────────────────────────────────
+    async def _dispatch(self, msg: Dict) -> None:
+        channel = msg.get("arg", {}).get("channel", "")
+        if "data" not in msg:
+            if msg.get("event") == "error":
+                print(f"WS 错误: {msg.get('code')} {msg.get('msg')}", file=sys.stderr)
+            return
+
+        if channel == "orders":
+            for o in msg["data"]:
+                await self._apply(parse_order(o))
+        elif channel == "account":
+            for acct in msg["data"]:
+                for d in acct.get("details", []):
+                    self.balances[d["ccy"]] = {
+                        "free": float(d.get("availBal") or 0),
+                        "used": float(d.get("frozenBal") or 0),
+                        "total": float(d.get("cashBal") or 0),
+                    }
+        elif channel == "positions":
+            for p in msg["data"]:
+                if float(p.get("pos") or 0) == 0:
+                    self.positions.pop(p["posId"], None)
+                else:
+                    self.positions[p["posId"]] = p
+        elif channel == "tickers":
+            for t in msg["data"]:
+                self.tickers[to_symbol(t["instId"])] = parse_ticker(t)
+
+    # ── 连接 ──────────────────────────────────────────────
+    async def _connection(self, url: str, args: List[Dict], login: bool) -> None:
+        """单条 WS 连接：（登录）、订阅、心跳、断线重连"""
+        delay = 1
+        while True:
+            try:
+                async with aiohttp.ClientSession() as sess:
+                    async with sess.ws_connect(url, heartbeat=None) as ws:
+                        if login:
+                            await ws.send_str(json.dumps({"op": "login",
+                                                          "args": [ws_login_args(*self.credentials)]}))
+                            reply = json.loads((await ws.receive(timeout=10)).data)
+                            if reply.get("event") != "login" or reply.get("code") != "0":
+                                raise RuntimeError(f"WS 登录失败: {reply.get('code')} {reply.get('msg')}")
+                        await ws.send_str(json.dumps({"op": "subscribe", "args": args}))
+                        if login:
+                            await self._reconcile()
+                        delay = 1
+                        while True:
+                            try:
+                                msg = await ws.receive(timeout=PING_INTERVAL)
+                            except asyncio.TimeoutError:
+                                await ws.send_str("ping")
+                                continue
+                            if msg.type != aiohttp.WSMsgType.TEXT:
+                                break
+                            if msg.data == "pong":
+                                continue
+                            await self._dispatch(json.loads(msg.data))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                traceback.print_exc()
+
+            print(f"WS 断开，{delay}秒后重连: {url}", file=sys.stderr)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX)
+
+    async def run(self) -> None:
+        """常驻运行"""
+        private_args = [{"channel": "orders", "instType": "ANY"},
+                        {"channel": "account"},
+                        {"channel": "positions", "instType": "ANY"}]
+        tasks = [self._connection(WS_PRIVATE_URL, private_args, login=True)]
+        if self.with_tickers:
+            ticker_args = [{"channel": "tickers", "instId": to_inst_id(s)} for s in self.symbols]
+            tasks.append(self._connection(WS_PUBLIC_URL, ticker_args, login=False))
+        print(f"🔐 私有 WS 已启动，跟踪 {', '.join(self.symbols) if self.symbols else '全部交易对'} 的挂单")
+        await asyncio.gather(*tasks)
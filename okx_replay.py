@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OKX 录制 / 回放替身 · 离线可复现的扫描速度基准
+record 模式作为本地代理转发到真实 OKX，把 REST 响应与 WS 推送写入夹具文件；
+replay 模式用夹具在本地模拟 OKX，可注入延迟、抖动与限速错误，WS 推送可按倍速回放。
+
+各脚本通过环境变量切换到本地服务，无需改代码：
+    OKX_BASE_URL=http://127.0.0.1:8899  OKX_WS_URL=ws://127.0.0.1:8899  python continuous_pattern.py
+（ccxt 脚本经 okx_async_client.route_ccxt 使用同一个 OKX_BASE_URL）
+
+夹具格式（每行一条 JSON）:
+    rest.jsonl  {"method", "path", "query", "body", "status", "payload"}
+    ws.jsonl    {"t": 距连接建立的秒数, "path": "/ws/v5/business", "text": 原始推送}
+"""
+
+import asyncio, json, os, random, sys, time, aiohttp
+from aiohttp import web
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# ── 常量 ──────────────────────────────────────────────────
+UPSTREAM_REST  = "https://www.okx.com"           # 录制时转发的目标（不受 OKX_BASE_URL 影响）
+UPSTREAM_WS    = "wss://ws.okx.com:8443"
+FIXTURE_DIR    = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "fixtures", "okx")
+HOST           = "127.0.0.1"
+PORT           = 8899
+CANDLE_PATHS   = {"/api/v5/market/candles", "/api/v5/market/history-candles"}
+CANDLE_LIMIT   = 100         # OKX 未传 limit 时的默认根数
+MATCH_FIELDS   = ("instId", "instType", "bar", "ccy", "ordType")   # 精确匹配失败时的退化匹配字段
+DROP_HEADERS   = {"host", "content-length", "accept-encoding", "connection"}
+
+
+class ReplayConfig(NamedTuple):
+    """回放参数"""
+    latency_ms: float = 0.0      # 每个 REST 响应的固定延迟
+    jitter_ms: float = 0.0       # 在 ±jitter 内均匀抖动
+    rate_limit: float = 0.0      # 以该概率返回 429 / 50011 限速错误
+    speed: float = 1.0           # WS 推送回放倍速（0 表示不等待，立即推完）
+    seed: int = 0                # 抖动与限速注入的随机种子，保证多次运行一致
+    loop: bool = False           # WS 推送放完后从头循环
+
+
+def _query_key(method: str, path: str, query: Dict, body: str = "") -> str:
+    return f"{method} {path}?{'&'.join(f'{k}={query[k]}' for k in sorted(query))} {body}".rstrip()
+
+
+def _loose_key(path: str, query: Dict) -> Tuple:
+    return (path,) + tuple(query.get(f) for f in MATCH_FIELDS)
+
+
+class Fixtures:
+    """录制的 REST 响应与 WS 推送
+
+    REST 先按 (方法, 路径, 查询参数, 请求体) 精确匹配；匹配不到时按路径 + instId/bar 等字段退化匹配，
+    K线接口把同一序列录到的全部K线合并后按 after / before / limit 重新切片，因此回放时
+    翻页、增量拉取等录制时没出现过的参数组合也能得到正确结果。
+    """
+
+    def __init__(self, root: str = FIXTURE_DIR):
+        self.root = root
+        self.exact: Dict[str, Dict] = {}
+        self.loose: Dict[Tuple, Dict] = {}
+        self.candles: Dict[Tuple, Dict[int, List]] = {}
+        self.ws: List[Dict] = []
+
+    @property
+    def rest_path(self) -> str:
+        return os.path.join(self.root, "rest.jsonl")
+
+    @property
+    def ws_path(self) -> str:
+        return os.path.join(self.root, "ws.jsonl")
+
+    def load(self) -> "Fixtures":
+        if os.path.exists(self.rest_path):
+            with open(self.rest_path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._index(json.loads(line))
+        if os.path.exists(self.ws_path):
+            with open(self.ws_path, encoding="utf-8") as f:
+                self.ws = [json.loads(line) for line in f if line.strip()]
+        return self
+
+    def _index(self, rec: Dict) -> None:
+        query = rec.get("query", {})
+        self.exact[_query_key(rec["method"], rec["path"], query, rec.get("body", ""))] = rec
+        payload = rec["payload"]
+        if rec.get("status", 200) != 200 or payload.get("code") != "0":
+            return
+        self.loose[_loose_key(rec["path"], query)] = rec
+        if rec["path"] in CANDLE_PATHS:
+            series = self.candles.setdefault(_loose_key(rec["path"], query), {})
+            for c in payload["data"]:
+                series[int(c[0])] = c
+
+    # ── 录制 ──────────────────────────────────────────────
+    def add(self, method: str, path: str, query: Dict, payload: Dict,
+            body: str = "", status: int = 200) -> None:
+        """追加一条 REST 响应（录制或合成夹具时使用）"""
+        rec = {"method": method, "path": path, "query": query, "body": body,
+               "status": status, "payload": payload}
+        self._index(rec)
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.rest_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+    def add_ws(self, t: float, path: str, text: str) -> None:
+        rec = {"t": round(t, 3), "path": path, "text": text}
+        self.ws.append(rec)
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.ws_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+    # ── 回放 ──────────────────────────────────────────────
+    def lookup(self, method: str, path: str, query: Dict, body: str = "") -> Optional[Tuple[int, Dict]]:
+        """返回 (HTTP 状态码, 响应体)，没有对应夹具时返回 None"""
+        key = _loose_key(path, query)
+        if path in CANDLE_PATHS and key in self.candles:
+            return 200, {"code": "0", "msg": "", "data": self._slice(self.candles[key], query)}
+        rec = self.exact.get(_query_key(method, path, query, body)) or self.loose.get(key)
+        if rec is None:
+            return None
+        return rec.get("status", 200), rec["payload"]
+
+    @staticmethod
+    def _slice(series: Dict[int, List], query: Dict) -> List[List]:
+        """按 OKX 语义切片：after 之前、before 之后，倒序取 limit 根"""
+        after = int(query["after"]) if query.get("after") else None
+        before = int(query["before"]) if query.get("before") else None
+        limit = int(query.get("limit") or CANDLE_LIMIT)
+        rows = []
+        for ts in sorted(series, reverse=True):
+            if after is not None and ts >= after:
+                continue
+            if before is not None and ts <= before:
+                break
+            rows.append(series[ts])
+            if len(rows) == limit:
+                break
+        return rows
+
+
+def _subscribed(subs: List[Dict], arg: Dict) -> bool:
+    """推送的 arg 是否落在已订阅的频道内（订阅中没写的字段不作限制）"""
+    return any(all(arg.get(k) == v for k, v in s.items() if k != "uid") for s in subs)
+
+
+class ReplayServer:
+    """本地 OKX 替身
+
+    用法:
+        async with ReplayServer(Fixtures().load(), ReplayConfig(latency_ms=80, jitter_ms=40)) as server:
+            async with OKXAsyncClient(base_url=server.url) as client:
+                ...
+        print(server.stats)
+    """
+
+    def __init__(self, fixtures: Fixtures, config: ReplayConfig = ReplayConfig(),
+                 host: str = HOST, port: int = 0):
+        self.fixtures = fixtures
+        self.config = config
+        self.host = host
+        self.port = port
+        self.rng = random.Random(config.seed)
+        self.stats = {"requests": 0, "rate_limited": 0, "missing": 0, "ws_sent": 0}
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def ws_url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    async def start(self) -> "ReplayServer":
+        app = web.Application()
+        app.router.add_route("*", "/ws/{tail:.*}", self._ws)
+        app.router.add_route("*", "/{tail:.*}", self._rest)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self.port = self._runner.addresses[0][1]
+        return self
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "ReplayServer":
+        return await self.start()
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+    # ── REST ──────────────────────────────────────────────
+    async def _rest(self, request: web.Request) -> web.Response:
+        cfg = self.config
+        self.stats["requests"] += 1
+        delay = cfg.latency_ms + self.rng.uniform(-cfg.jitter_ms, cfg.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if cfg.rate_limit and self.rng.random() < cfg.rate_limit:
+            self.stats["rate_limited"] += 1
+            return web.json_response({"code": "50011", "msg": "Too Many Requests", "data": []}, status=429)
+
+        body = await request.text()
+        found = self.fixtures.lookup(request.method, request.path, dict(request.query), body)
+        if found is None:
+            self.stats["missing"] += 1
+            return web.json_response({"code": "51001", "msg": f"回放夹具缺失: {request.path_qs}", "data": []})
+        status, payload = found
+        return web.json_response(payload, status=status)
+
+    # ── WebSocket ─────────────────────────────────────────
+    async def _ws(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        subs: List[Dict] = []
+        feed: Optional[asyncio.Task] = None
+        try:
+            async for msg in ws:
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    break
+                if msg.data == "ping":
+                    await ws.send_str("pong")
+                    continue
+                req = json.loads(msg.data)
+                op = req.get("op")
+                if op == "login":
+                    await ws.send_str(json.dumps({"event": "login", "code": "0", "msg": ""}))
+                elif op in ("subscribe", "unsubscribe"):
+                    for arg in req.get("args", []):
+                        if op == "subscribe":
+                            subs.append(arg)
+                        elif arg in subs:
+                            subs.remove(arg)
+                        await ws.send_str(json.dumps({"event": op, "arg": arg, "connId": "replay"}))
+                    if feed is None:
+                        feed = asyncio.create_task(self._feed(ws, request.path, subs))
+        finally:
+            if feed is not None:
+                feed.cancel()
+        return ws
+
+    async def _feed(self, ws: web.WebSocketResponse, path: str, subs: List[Dict]) -> None:
+        """按录制时的间隔（除以倍速）推送该路径下已订阅频道的消息"""
+        records = [r for r in self.fixtures.ws if r["path"] == path]
+        speed = self.config.speed
+        while records:
+            started = time.monotonic()
+            for rec in records:
+                if speed > 0:
+                    wait = rec["t"] / speed - (time.monotonic() - started)
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                msg = json.loads(rec["text"])
+                if _subscribed(subs, msg.get("arg", {})):
+                    await ws.send_str(rec["text"])
+                    self.stats["ws_sent"] += 1
+            if not self.config.loop:
+                break
+
+
+class Recorder:
+    """录制代理：请求原样转发到真实 OKX，响应写入夹具后返回给调用方"""
+
+    def __init__(self, fixtures: Fixtures, host: str = HOST, port: int = PORT):
+        self.fixtures = fixtures
+        self.host = host
+        self.port = port
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self) -> "Recorder":
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15))
+        app = web.Application()
+        app.router.add_route("*", "/ws/{tail:.*}", self._ws)
+        app.router.add_route("*", "/{tail:.*}", self._rest)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        return self
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+        if self.session is not None:
+            await self.session.close()
+
+    async def _rest(self, request: web.Request) -> web.Response:
+        body = await request.text()
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in DROP_HEADERS}
+        async with self.session.request(request.method, UPSTREAM_REST + request.path_qs,
+                                        headers=headers, data=body or None) as resp:
+            text = await resp.text()
+            status = resp.status
+        try:
+            payload = json.loads(text)
+        except ValueError:
+            return web.Response(text=text, status=status)
+        self.fixtures.add(request.method, request.path, dict(request.query), payload, body, status)
+        print(f"REST {status} {request.method} {request.path_qs}")
+        return web.json_response(payload, status=status)
+
+    async def _ws(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        started = time.monotonic()
+        async with self.session.ws_connect(UPSTREAM_WS + request.path, heartbeat=None) as upstream:
+            async def downstream() -> None:
+                async for msg in upstream:
+                    if msg.type != aiohttp.WSMsgType.TEXT:
+                        break
+                    if msg.data != "pong" and '"data"' in msg.data:   # 订阅/登录回执由回放端自行应答
+                        self.fixtures.add_ws(time.monotonic() - started, request.path, msg.data)
+                    await ws.send_str(msg.data)
+                await ws.close()
+
+            pump = asyncio.create_task(downstream())
+            try:
+                async for msg in ws:
+                    if msg.type != aiohttp.WSMsgType.TEXT:
+                        break
+                    await upstream.send_str(msg.data)
+            finally:
+                pump.cancel()
+        print(f"WS 结束 {request.path}，共录制 {len(self.fixtures.ws)} 条推送")
+        return ws
+
+
+async def main(args: List[str]) -> None:
+    opts: Dict[str, str] = {}
+    for flag in ("--port", "--dir", "--latency", "--jitter", "--rate-limit", "--speed", "--seed"):
+        if flag in args:
+            i = args.index(flag)
+            opts[flag] = args[i + 1]
+            del args[i:i + 2]
+    loop = "--loop" in args
+    mode = args[0] if args else "replay"
+    fixtures = Fixtures(opts.get("--dir", FIXTURE_DIR))
+    port = int(opts.get("--port", PORT))
+
+    if mode == "record":
+        server = await Recorder(fixtures, port=port).start()
+        print(f"🎙️ 录制代理已启动，夹具写入 {fixtures.root}")
+    else:
+        fixtures.load()
+        config = ReplayConfig(latency_ms=float(opts.get("--latency", 0)),
+                              jitter_ms=float(opts.get("--jitter", 0)),
+                              rate_limit=float(opts.get("--rate-limit", 0)),
+                              speed=float(opts.get("--speed", 1)),
+                              seed=int(opts.get("--seed", 0)), loop=loop)
+        server = await ReplayServer(fixtures, config, port=port).start()
+        print(f"▶️ 回放服务已启动：{len(fixtures.exact)} 条 REST、{len(fixtures.ws)} 条 WS 推送 | {config}")
+    print(f"   OKX_BASE_URL=http://{HOST}:{port}  OKX_WS_URL=ws://{HOST}:{port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+        if mode != "record":
+            print(f"统计: {server.stats}")
+
+
+if __name__ == "__main__":
+    # python okx_replay.py record                       （录制到 data/fixtures/okx）
+    # python okx_replay.py replay --latency 80 --jitter 40 --rate-limit 0.02 --speed 20
+    try:
+        asyncio.run(main(sys.argv[1:]))
+    except KeyboardInterrupt:
+        print("\n已停止")
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OKX WebSocket 实时K线/行情流 · 内存滚动窗口 · 收盘即触发
+订阅 candle 频道，K线确认收盘（confirm=1）的瞬间回调各形态检测器
+"""
+
+import asyncio, json, os, time, sys, traceback, aiohttp
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from bar_clock import CLOSE_DELAY_SEC
+from candle_store import CANDLES, timeframe_ms
+from okx_async_client import OKXAsyncClient, to_bar, to_inst_id, to_symbol
+from resampler import BASE_TIMEFRAME, Resampler
+
+# ── 常量 ──────────────────────────────────────────────────
+WS_BASE_URL      = os.getenv("OKX_WS_URL", "wss://ws.okx.com:8443")   # 指向 okx_replay 时覆盖
+WS_PUBLIC_URL    = f"{WS_BASE_URL}/ws/v5/public"      # tickers / books
+WS_BUSINESS_URL  = f"{WS_BASE_URL}/ws/v5/business"    # candle 频道
+WINDOW           = 200         # 每个 (交易对, 周期) 保留的已收盘K线数
+PING_INTERVAL    = 25          # OKX 30 秒无消息断开，25 秒发一次 ping
+SUBSCRIBE_CHUNK  = 100         # 每条订阅消息携带的频道数
+RECONNECT_MAX    = 60          # 断线重连最大退避秒数
+SEED_BARS        = 300         # 重采样预热使用的 1m K线数（OKX 单次上限）
+
+BarHandler = Callable[[str, str, List[List]], Awaitable[None]]
+
+
+class CandleStream:
+    """多交易对多周期K线流
+
+    用法:
+        stream = CandleStream(symbols, ["5m", "1h"])
+        stream.on_close(handler)      # async handler(symbol, timeframe, candles)
+        await stream.run()
+
+    candles 为该序列最近 WINDOW 根已收盘K线，格式同 ccxt fetch_ohlcv，最后一根即刚收盘的K线。
+    """
+
+    def __init__(self, symbols: List[str], timeframes: List[str], window: int = WINDOW,
+                 with_tickers: bool = False):
+        self.symbols = [to_symbol(s) for s in symbols]
+        self.timeframes = list(timeframes)
+        self.window = window
+        self.with_tickers = with_tickers
+        self.windows: Dict[Tuple[str, str], Deque[List]] = {
+            (s, tf): deque(maxlen=window) for s in self.symbols for tf in self.timeframes
+        }
+        self.tickers: Dict[str, Dict] = {}
+        self.handlers: List[BarHandler] = []
+        self._channels = {"candle" + to_bar(tf): tf for tf in self.timeframes}
+        self._pending = set()
+
+    def on_close(self, handler: BarHandler) -> None:
+        """注册收盘回调"""
+        self.handlers.append(handler)
+
+    # ── 预热 ──────────────────────────────────────────────
+    async def warm_up(self) -> None:
+        """用 REST（经本地K线仓库增量补齐）填满滚动窗口；启动和每次重连后调用"""
+        now_ms = int(time.time() * 1000)
+
+        async with OKXAsyncClient() as client:
+            async def load(symbol: str, tf: str) -> None:
+                try:
+                    rows = await CANDLES.fetch_ohlcv_async(client, symbol, tf, self.window + 1)
+                except Exception as e:
+                    print(f"预热失败 {symbol} {tf}: {type(e).__name__}: {e}", file=sys.stderr)
+                    return
+                closed = [r for r in rows if r[0] + timeframe_ms(tf) <= now_ms]
+                buf = self.windows[(symbol, tf)]
+                buf.clear()
+                buf.extend(closed[-self.window:])
+
+            await asyncio.gather(*(load(s, tf) for s, tf in self.windows))
+
+    # ── 消息处理 ──────────────────────────────────────────
+    async def _on_candle(self, symbol: str, tf: str, row: List) -> None:
+        """收到一根确认收盘的K线：更新窗口、落盘并回调"""
+        buf = self.windows[(symbol, tf)]
+        if buf and buf[-1][0] >= row[0]:
+            return  # 重连后重复推送
+        buf.append(row)
+        CANDLES.merge(symbol, tf, [row])   # 持序列锁写入，不与回填换入交错
+
+        # 回调放到后台任务，推送等慢操作不阻塞消息接收
+        self._spawn(self._run_handlers(symbol, tf, list(buf)))
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _run_handlers(self, symbol: str, tf: str, candles: List[List]) -> None:
+        results = await asyncio.gather(*(h(symbol, tf, candles) for h in self.handlers),
+                                       return_exceptions=True)
+        for r in results:
+            if isinstance(r, Exception):
+                traceback.print_exception(type(r), r, r.__traceback__)
+
+    async def _dispatch(self, msg: Dict) -> None:
+        arg = msg.get("arg", {})
+        channel = arg.get("channel", "")
+        if "data" not in msg:
+            if msg.get("event") == "error":
+                print(f"WS 订阅错误: {msg.get('code')} {msg.get('msg')}", file=sys.stderr)
+            return
+
+        if channel == "tickers":
+            for t in msg["data"]:
+                self.tickers[to_symbol(t["instId"])] = t
+            return
+
+        tf = self._channels.get(channel)
+        if tf is None:
+            return
+        symbol = to_symbol(arg["instId"])
+        for c in msg["data"]:
+            if c[8] == "1":
+                await self._on_candle(symbol, tf, [int(c[0]), float(c[1]), float(c[2]),
+                                                   float(c[3]), float(c[4]), float(c[5])])
+
+    # ── 连接 ──────────────────────────────────────────────
+    async def _connection(self, url: str, args: List[Dict]) -> None:
+        """单条 WS 连接：订阅、心跳、断线重连"""
+        delay = 1
+        while True:
+            try:
+                async with aiohttp.ClientSession() as sess:
+                    async with sess.ws_connect(url, heartbeat=None) as ws:
+                        for i in range(0, len(args), SUBSCRIBE_CHUNK):
+                            await ws.send_str(json.dumps({"op": "subscribe",
+                                                          "args": args[i:i + SUBSCRIBE_CHUNK]}))
+                        delay = 1
+                        while True:
+                            try:
+                                msg = await ws.receive(timeout=PING_INTERVAL)
+                            except asyncio.TimeoutError:
+                                await ws.send_str("ping")
+                                continue
+                            if msg.type != aiohttp.WSMsgType.TEXT:
+                                break
+                            if msg.data == "pong":
+                                continue
+                            await self._dispatch(json.loads(msg.data))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                traceback.print_exc()
+
+            print(f"WS 断开，{delay}秒后重连: {url}", file=sys.stderr)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX)
+            if url == WS_BUSINESS_URL:
+                await self.warm_up()   # 补齐断线期间错过的K线
+
+    async def run(self) -> None:
+        """预热后常驻运行"""
+        await self.warm_up()
+        print(f"📡 WS 已订阅 {len(self.symbols)} 个交易对 × {len(self.timeframes)} 个周期")
+
+        candle_args = [{"channel": ch, "instId": to_inst_id(s)}
+                       for s in self.symbols for ch in self._channels]
+        tasks = [self._connection(WS_BUSINESS_URL, candle_args)]
+        if self.with_tickers:
+            ticker_args = [{"channel": "tickers", "instId": to_inst_id(s)} for s in self.symbols]
+            tasks.append(self._connection(WS_PUBLIC_URL, ticker_args))
+        await asyncio.gather(*tasks)
+
+
+class ResampledStream(CandleStream):
+    """只订阅 1m 频道，其余周期在本地由 1m 重采样得到（每个交易对一个订阅覆盖全部周期）
+
+    用法与 CandleStream 相同；另可用 current(symbol, tf) 读取随 1m 推送更新的未收盘K线。
+    启动或断线后第一根高周期K线缺少开头的 1m，收盘时改用 REST 拉取该根。
+    """
+
+    def __init__(self, symbols: List[str], timeframes: List[str], window: int = WINDOW,
+                 with_tickers: bool = False):
+        super().__init__(symbols, timeframes, window, with_tickers)
+        self._channels = {"candle" + to_bar(BASE_TIMEFRAME): BASE_TIMEFRAME}
+        self.resamplers: Dict[str, Resampler] = {s: Resampler(self.timeframes) for s in self.symbols}
+        self._client: Optional[OKXAsyncClient] = None
+
+    def current(self, symbol: str, timeframe: str) -> Optional[List]:
+        """未收盘的高周期K线 [ts, o, h, l, c, v]"""
+        return self.resamplers[symbol].current(timeframe)
+
+    async def warm_up(self) -> None:
+        """填满各周期窗口后，用最近的已收盘 1m 预热重采样状态"""
+        await super().warm_up()
+        now_ms = int(time.time() * 1000)
+
+        async with OKXAsyncClient() as client:
+            async def seed(symbol: str) -> None:
+                resampler = Resampler(self.timeframes)
+                try:
+                    rows = await CANDLES.fetch_ohlcv_async(client, symbol, BASE_TIMEFRAME, SEED_BARS)
+                    resampler.seed([r for r in rows if r[0] + timeframe_ms(BASE_TIMEFRAME) <= now_ms])
+                except Exception as e:
+                    print(f"预热失败 {symbol} {BASE_TIMEFRAME}: {type(e).__name__}: {e}", file=sys.stderr)
+                self.resamplers[symbol] = resampler
+
+            await asyncio.gather(*(seed(s) for s in self.symbols))
+
+    async def _fetch_closed(self, symbol: str, tf: str, ts: int) -> None:
+        """不完整的桶收盘后从 REST 取该根K线"""
+        await asyncio.sleep(CLOSE_DELAY_SEC)
+        if self._client is None:
+            self._client = OKXAsyncClient()
+        try:
+            rows = await CANDLES.fetch_ohlcv_async(self._client, symbol, tf, 3)
+        except Exception as e:
+            print(f"补取失败 {symbol} {tf}: {type(e).__name__}: {e}", file=sys.stderr)
+            return
+        for row in rows:
+            if row[0] == ts:
+                await self._on_candle(symbol, tf, row)
+
+    async def _dispatch(self, msg: Dict) -> None:
+        arg = msg.get("arg", {})
+        if "data" not in msg or arg.get("channel") not in self._channels:
+            await super()._dispatch(msg)
+            return
+        symbol = to_symbol(arg["instId"])
+        resampler = self.resamplers[symbol]
+        for c in msg["data"]:
+            row = [int(c[0]), float(c[1]), float(c[2]), float(c[3]), float(c[4]), float(c[5])]
+            confirmed = c[8] == "1"
+            if confirmed and BASE_TIMEFRAME in self.timeframes:
+                await self._on_candle(symbol, BASE_TIMEFRAME, row)
+            for tf, bar, complete in resampler.update(row, confirmed):
+                if complete:
+                    await self._on_candle(symbol, tf, bar)
+                else:
+                    self._spawn(self._fetch_closed(symbol, tf, bar[0]))
+
+    async def run(self) -> None:
+        try:
+            await super().run()
+        finally:
+            if self._client is not None:
+                await self._client.close()
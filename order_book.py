@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地 L2 订单簿 · WebSocket 快照 + 增量 · CRC32 校验
+每个交易对在内存中维护有序价格档位数组，买卖压力 / 点差 / 深度 / 失衡度直接读内存，不再走 REST
+"""
+
+import asyncio, json, sys, threading, time, traceback, zlib, aiohttp
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from okx_async_client import to_inst_id, to_symbol
+from okx_stream import PING_INTERVAL, RECONNECT_MAX, WS_PUBLIC_URL
+
+# ── 常量 ──────────────────────────────────────────────────
+CHECKSUM_LEVELS = 25          # OKX 校验和取买卖各前 25 档
+BOOK_CHANNELS   = ("books", "books5")   # books: 400 档快照+增量；books5: 5 档全量推送
+
+
+class BookSide:
+    """单边价格档位：按从优到劣排序的 numpy 数组
+
+    key 为排序键（卖盘为价格，买盘为负价格），保证 searchsorted 对两边都按升序查找。
+    同时保留 OKX 原始字符串，用于计算校验和。
+    """
+
+    def __init__(self, is_bid: bool):
+        self.sign = -1.0 if is_bid else 1.0
+        self.clear()
+
+    def clear(self) -> None:
+        self.keys = np.empty(0)
+        self.sizes = np.empty(0)
+        self.px_str = np.empty(0, dtype=object)
+        self.sz_str = np.empty(0, dtype=object)
+
+    def load(self, levels: List[List[str]]) -> None:
+        """整体替换（快照）"""
+        px = np.array([float(l[0]) for l in levels])
+        order = np.argsort(self.sign * px, kind="stable")
+        self.keys = (self.sign * px)[order]
+        self.sizes = np.array([float(l[1]) for l in levels])[order]
+        self.px_str = np.array([l[0] for l in levels], dtype=object)[order]
+        self.sz_str = np.array([l[1] for l in levels], dtype=object)[order]
+
+    def update(self, levels: List[List[str]]) -> None:
+        """增量合并：数量为 0 删除档位，否则新增或覆盖"""
+        for level in levels:
+            key = self.sign * float(level[0])
+            size = float(level[1])
+            i = int(np.searchsorted(self.keys, key))
+            exists = i < len(self.keys) and self.keys[i] == key
+            if size == 0:
+                if exists:
+                    self.keys = np.delete(self.keys, i)
+                    self.sizes = np.delete(self.sizes, i)
+                    self.px_str = np.delete(self.px_str, i)
+                    self.sz_str = np.delete(self.sz_str, i)
+            elif exists:
+                self.sizes[i] = size
+                self.sz_str[i] = level[1]
+            else:
+                self.keys = np.insert(self.keys, i, key)
+                self.sizes = np.insert(self.sizes, i, size)
+                self.px_str = np.insert(self.px_str, i, level[0])
+                self.sz_str = np.insert(self.sz_str, i, level[1])
+
+    @property
+    def prices(self) -> np.ndarray:
+        return self.sign * self.keys
+
+    def size_within(self, limit_price: float) -> Tuple[float, float]:
+        """价格不劣于 limit_price 的累计数量与金额"""
+        n = int(np.searchsorted(self.keys, self.sign * limit_price, side="right"))
+        return float(self.sizes[:n].sum()), float((self.prices[:n] * self.sizes[:n]).sum())
+
+
+class OrderBook:
+    """单个交易对的本地订单簿（线程安全读取）"""
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.bids = BookSide(is_bid=True)
+        self.asks = BookSide(is_bid=False)
+        self.timestamp = 0
+        self.synced = False
+        self.lock = threading.Lock()
+
+    # ── 写入 ──
+    def apply_snapshot(self, bids: List[List[str]], asks: List[List[str]], ts: int = 0) -> None:
+        with self.lock:
+            self.bids.load(bids)
+            self.asks.load(asks)
+            self.timestamp = ts
+            self.synced = True
+
+    def apply_delta(self, bids: List[List[str]], asks: List[List[str]], ts: int = 0) -> None:
+        with self.lock:
+            self.bids.update(bids)
+            self.asks.update(asks)
+            self.timestamp = ts
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self.bids.clear()
+            self.asks.clear()
+            self.synced = False
+
+    def checksum(self) -> int:
+        """OKX 校验和：买卖前 25 档交替拼接 price:size，CRC32 取有符号 32 位整数"""
+        with self.lock:
+            parts = []
+            nb, na = len(self.bids.keys), len(self.asks.keys)
+            for i in range(CHECKSUM_LEVELS):
+                if i < nb:
+                    parts += [self.bids.px_str[i], self.bids.sz_str[i]]
+                if i < na:
+                    parts += [self.asks.px_str[i], self.asks.sz_str[i]]
+        crc = zlib.crc32(":".join(parts).encode())
+        return crc - (1 << 32) if crc >= 1 << 31 else crc
+
+    # ── 读取 ──
+    def top(self, levels: int = 10) -> Dict[str, List[List[float]]]:
+        """前 levels 档，格式同 ccxt fetch_order_book"""
+        with self.lock:
+            return {
+                "bids": np.column_stack([self.bids.prices[:levels], self.bids.sizes[:levels]]).tolist(),
+                "asks": np.column_stack([self.asks.prices[:levels], self.asks.sizes[:levels]]).tolist(),
+                "timestamp": self.timestamp,
+            }
+
+    def best(self) -> Tuple[float, float]:
+        """(买一价, 卖一价)，缺失为 0"""
+        with self.lock:
+            bid = float(self.bids.prices[0]) if len(self.bids.keys) else 0.0
+            ask = float(self.asks.prices[0]) if len(self.asks.keys) else 0.0
+        return bid, ask
+
+    def pressure(self, levels: int = 10) -> Dict[str, float]:
+        """前 levels 档的买卖盘数量、占比与失衡度 (bid-ask)/(bid+ask)"""
+        with self.lock:
+            bid_total = float(self.bids.sizes[:levels].sum())
+            ask_total = float(self.asks.sizes[:levels].sum())
+        total = bid_total + ask_total
+        return {
+            "bid_total": bid_total,
+            "ask_total": ask_total,
+            "bid_pressure": bid_total / total * 100 if total else 0.0,
+            "ask_pressure": ask_total / total * 100 if total else 0.0,
+            "imbalance": (bid_total - ask_total) / total if total else 0.0,
+        }
+
+    def depth_bps(self, bps: float) -> Dict[str, float]:
+        """中间价上下 bps 基点内的买卖盘数量与金额"""
+        bid, ask = self.best()
+        if not bid or not ask:
+            return {"bid_size": 0.0, "ask_size": 0.0, "bid_notional": 0.0, "ask_notional": 0.0}
+        mid = (bid + ask) / 2
+        with self.lock:
+            bid_size, bid_notional = self.bids.size_within(mid * (1 - bps / 10000))
+            ask_size, ask_notional = self.asks.size_within(mid * (1 + bps / 10000))
+        return {"bid_size": bid_size, "ask_size": ask_size,
+                "bid_notional": bid_notional, "ask_notional": ask_notional}
+
+
+class BookStream:
+    """多交易对订单簿 WebSocket 流
+
+    用法:
+        stream = BookStream(["BTC/USDT", "ETH/USDT"])
+        stream.start()                        # 后台线程运行，适合同步脚本
+        book = stream.books["BTC/USDT"]       # book.synced 为 True 后可读
+    """
+
+    def __init__(self, symbols: List[str], channel: str = "books"):
+        if channel not in BOOK_CHANNELS:
+            raise ValueError(f"不支持的深度频道: {channel}")
+        self.channel = channel
+        self.books: Dict[str, OrderBook] = {to_symbol(s): OrderBook(to_symbol(s)) for s in symbols}
+        self.thread: Optional[threading.Thread] = None
+
+    async def _resubscribe(self, ws, symbol: str) -> None:
+        """校验失败：丢弃本地簿，重新订阅以获取新快照"""
+        self.books[symbol].invalidate()
+        arg = [{"channel": self.channel, "instId": to_inst_id(symbol)}]
+        await ws.send_str(json.dumps({"op": "unsubscribe", "args": arg}))
+        await ws.send_str(json.dumps({"op": "subscribe", "args": arg}))
+
+    async def _dispatch(self, ws, msg: Dict) -> None:
+        if "data" not in msg:
+            if msg.get("event") == "error":
+                print(f"WS 订阅错误: {msg.get('code')} {msg.get('msg')}", file=sys.stderr)
+            return
+        symbol = to_symbol(msg["arg"]["instId"])
+        book = self.books.get(symbol)
+        if book is None:
+            return
+
+        for d in msg["data"]:
+            ts = int(d.get("ts", 0))
+            if self.channel == "books5" or msg.get("action") == "snapshot":
+                book.apply_snapshot(d["bids"], d["asks"], ts)
+            elif book.synced:
+                book.apply_delta(d["bids"], d["asks"], ts)
+            else:
+                continue  # 等待重新订阅后的快照
+
+            if "checksum" in d and book.checksum() != int(d["checksum"]):
+                print(f"{symbol} 订单簿校验失败，重新同步", file=sys.stderr)
+                await self._resubscribe(ws, symbol)
+                return
+
+    async def run(self) -> None:
+        """常驻运行：订阅、心跳、断线重连（重连后以新快照重建）"""
+        args = [{"channel": self.channel, "instId": to_inst_id(s)} for s in self.books]
+        delay = 1
+        while True:
+            try:
+                async with aiohttp.ClientSession() as sess:
+                    async with sess.ws_connect(WS_PUBLIC_URL, heartbeat=None) as ws:
+                        await ws.send_str(json.dumps({"op": "subscribe", "args": args}))
+                        delay = 1
+                        while True:
+                            try:
+                                msg = await ws.receive(timeout=PING_INTERVAL)
+                            except asyncio.TimeoutError:
+                                await ws.send_str("ping")
+                                continue
+                            if msg.type != aiohttp.WSMsgType.TEXT:
+                                break
+                            if msg.data == "pong":
+                                continue
+                            await self._dispatch(ws, json.loads(msg.data))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                traceback.print_exc()
+
+            for book in self.books.values():
+                book.invalidate()
+            print(f"深度 WS 断开，{delay}秒后重连", file=sys.stderr)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX)
+
+    def start(self) -> None:
+        """在后台守护线程中运行"""
+        self.thread = threading.Thread(target=lambda: asyncio.run(self.run()), daemon=True)
+        self.thread.start()
+
+    def wait_synced(self, timeout: float = 10) -> bool:
+        """等待所有订单簿收到首个快照"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if all(b.synced for b in self.books.values()):
+                return True
+            time.sleep(0.1)
+        return False
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+参数寻优 · 多进程网格 / 随机搜索
+各扫描脚本的阈值在历史K线上逐组评估信号的命中率与前瞻收益；行情只放入一块共享内存，子进程直接映射读取
+"""
+
+import itertools, os, random, sys, time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from backtest import CLOSE, HIGH, LOW, OPEN, load_ohlcv, signals_from_labels, to_frame
+from pattern_engine import continuous_runs, engulfing, pinbars, run_lengths
+
+# ── 常量 ──────────────────────────────────────────────────
+HORIZON     = 6               # 前瞻收益的K线数
+MIN_SIGNALS = 30              # 信号数不足的参数组排在最后
+MAX_WORKERS = os.cpu_count() or 4
+RSI_PERIOD  = 14
+EMA_PERIOD  = 20
+TA_EPSILON  = 1e-8            # talib TA_IS_ZERO 阈值
+
+
+# ── 向量化指标 ────────────────────────────────────────────
+def _wilder(x: np.ndarray, period: int) -> np.ndarray:
+    """Wilder 平滑（前 period 个值的均值起算），x 从下标 0 起有效"""
+    out = np.full(len(x), np.nan)
+    if len(x) < period:
+        return out
+    seeded = np.r_[x[:period].mean(), x[period:]]
+    out[period - 1:] = pd.Series(seeded).ewm(alpha=1 / period, adjust=False).mean().to_numpy()
+    return out
+
+
+def rsi(close: np.ndarray, period: int = RSI_PERIOD) -> np.ndarray:
+    """Wilder RSI，等价于 talib.RSI(close, period)"""
+    out = np.full(len(close), np.nan)
+    diff = np.diff(close)
+    avg_gain, avg_loss = _wilder(np.clip(diff, 0, None), period), _wilder(np.clip(-diff, 0, None), period)
+    total = avg_gain + avg_loss
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out[1:] = np.where(np.abs(total) >= TA_EPSILON, 100.0 * avg_gain / total, 0.0)
+    out[1:][np.isnan(avg_gain)] = np.nan
+    return out
+
+
+def ema(x: np.ndarray, period: int = EMA_PERIOD) -> np.ndarray:
+    """等价于 pandas ewm(span=period, adjust=False)"""
+    return pd.Series(x).ewm(span=period, adjust=False).mean().to_numpy()
+
+
+def _onset(active: np.ndarray) -> np.ndarray:
+    """只保留每段连续满足条件的第一根（与警报去重后的推送时点一致）"""
+    return active & ~np.r_[False, active[:-1]]
+
+
+# ── 各脚本的信号（ohlcv 为 (n, 6) 数组，返回 1 / -1 / 0）──
+def continuous_signals(ohlcv: np.ndarray, max_shadow_ratio: float = 0.2,
+                       min_candles: int = 3) -> np.ndarray:
+    """continuous_pattern：顺着连续K线方向"""
+    direction, count = continuous_runs(ohlcv[None, :, OPEN:], max_shadow_ratio)
+    hit = count[0] >= min_candles
+    return np.where(_onset(hit), direction[0], 0).astype(np.int8)
+
+
+def engulfing_signals(ohlcv: np.ndarray, engulf_ratio: float = 1.1) -> np.ndarray:
+    """engulfing_pattern：看涨吞没做多，看跌吞没做空"""
+    bull, bear = engulfing(ohlcv[None, :, OPEN:], engulf_ratio)
+    return (bull[0].astype(np.int8) - bear[0].astype(np.int8))
+
+
+def rsi_pinbar_signals(ohlcv: np.ndarray, rsi_upper: float = 70, rsi_lower: float = 30,
+                       pinbar_ratio: float = 0.3) -> np.ndarray:
+    """OKXScanner：RSI 超买/超卖 + Pin Bar 或严格吞没"""
+    arr = ohlcv[None, :, OPEN:]
+    value = rsi(ohlcv[:, CLOSE])
+    pin_bull, pin_bear = pinbars(arr, pinbar_ratio)
+    eng_bull, eng_bear = engulfing(arr, 0, inclusive=False)
+    with np.errstate(invalid="ignore"):
+        long = (value < rsi_lower) & (pin_bull[0] | eng_bull[0])
+        short = (value > rsi_upper) & (pin_bear[0] | eng_bear[0])
+    return (long.astype(np.int8) - short.astype(np.int8))
+
+
+def ema_touch_signals(ohlcv: np.ndarray, streak: int = 20) -> np.ndarray:
+    """ema_monitor：连续 streak 根未触及 EMA20 时顺势"""
+    line = ema(ohlcv[:, CLOSE])
+    touched = (ohlcv[:, HIGH] >= line) & (ohlcv[:, LOW] <= line)
+    hit = run_lengths(~touched) == streak
+    return np.where(hit, np.where(ohlcv[:, CLOSE] > line, 1, -1), 0).astype(np.int8)
+
+
+def price_action_signals(ohlcv: np.ndarray, strong_ratio: float = 0.6,
+                         moderate_ratio: float = 0.4) -> np.ndarray:
+    """btc_price_action：Body_Ratio 强弱分界"""
+    from btc_price_action import calculate_price_action, detect_patterns, generate_signals
+    data = calculate_price_action(to_frame(ohlcv), strong_ratio, moderate_ratio)
+    data = generate_signals(data, detect_patterns(data))
+    return signals_from_labels(data["Signal"].to_numpy())
+
+
+class Strategy(NamedTuple):
+    signals: Callable[..., np.ndarray]
+    space: Dict[str, Sequence]      # 默认搜索空间：列表为候选值，(低, 高) 元组为随机采样区间
+
+
+STRATEGIES: Dict[str, Strategy] = {
+    "continuous": Strategy(continuous_signals, {
+        "max_shadow_ratio": [0.1, 0.15, 0.2, 0.25, 0.3], "min_candles": [3, 4, 5]}),
+    "engulfing": Strategy(engulfing_signals, {
+        "engulf_ratio": [1.0, 1.1, 1.25, 1.5, 2.0]}),
+    "rsi_pinbar": Strategy(rsi_pinbar_signals, {
+        "rsi_upper": [65, 70, 75, 80], "rsi_lower": [20, 25, 30, 35], "pinbar_ratio": [0.2, 0.25, 0.3, 0.35]}),
+    "ema_touch": Strategy(ema_touch_signals, {
+        "streak": [10, 15, 20, 25, 30, 40]}),
+    "price_action": Strategy(price_action_signals, {
+        "strong_ratio": [0.5, 0.6, 0.7], "moderate_ratio": [0.3, 0.4, 0.5]}),
+}
+
+
+# ── 参数组合 ──────────────────────────────────────────────
+def grid(space: Dict[str, Sequence]) -> List[Dict]:
+    """全部组合（元组区间不参与网格，取其端点）"""
+    keys = list(space)
+    values = [list(v) for v in space.values()]
+    return [dict(zip(keys, combo)) for combo in itertools.product(*values)]
+
+
+def random_samples(space: Dict[str, Sequence], n: int, seed: int = 0) -> List[Dict]:
+    """随机采样 n 组：列表随机选值，(低, 高) 元组均匀采样（整数端点则取整数）"""
+    rng = random.Random(seed)
+
+    def draw(v):
+        if isinstance(v, tuple):
+            lo, hi = v
+            return rng.randint(lo, hi) if isinstance(lo, int) and isinstance(hi, int) else rng.uniform(lo, hi)
+        return rng.choice(list(v))
+
+    return [{k: draw(v) for k, v in space.items()} for _ in range(n)]
+
+
+# ── 共享行情 ──────────────────────────────────────────────
+class MarketLayout(NamedTuple):
+    """共享内存中的行情布局：全部交易对首尾相接为一个 (N, 6) 数组"""
+    shm_name: str
+    rows: int
+    symbols: List[str]
+    offsets: List[int]      # 第 i 个交易对为 [offsets[i], offsets[i+1])
+
+
+def share_market(series: Dict[str, np.ndarray]):
+    """把 {交易对: (n, 6) 数组} 写入一块共享内存，返回 (SharedMemory, MarketLayout)"""
+    symbols = list(series)
+    offsets = np.r_[0, np.cumsum([len(series[s]) for s in symbols])].tolist()
+    rows = offsets[-1]
+    shm = shared_memory.SharedMemory(create=True, size=max(rows * 6 * 8, 1))
+    block = np.ndarray((rows, 6), dtype=np.float64, buffer=shm.buf)
+    for s, start in zip(symbols, offsets):
+        block[start:start + len(series[s])] = series[s]
+    return shm, MarketLayout(shm.name, rows, symbols, offsets)
+
+
+# 子进程内的行情视图与前瞻K线数（由 _attach 设置）
+_MARKET: Dict[str, np.ndarray] = {}
+_SHM: Optional[shared_memory.SharedMemory] = None
+_HORIZON = HORIZON
+
+
+def _attach(layout: MarketLayout, horizon: int) -> None:
+    """子进程初始化：映射共享内存，按交易对切出只读视图"""
+    global _SHM, _HORIZON
+    try:
+        _SHM = shared_memory.SharedMemory(name=layout.shm_name, track=False)
+    except TypeError:   # Python < 3.13 无 track 参数
+        _SHM = shared_memory.SharedMemory(name=layout.shm_name)
+    block = np.ndarray((layout.rows, 6), dtype=np.float64, buffer=_SHM.buf)
+    block.flags.writeable = False
+    _HORIZON = horizon
+    _MARKET.clear()
+    for i, s in enumerate(layout.symbols):
+        _MARKET[s] = block[layout.offsets[i]:layout.offsets[i + 1]]
+
+
+def forward_returns(close: np.ndarray, horizon: int) -> np.ndarray:
+    """第 i 根收盘后 horizon 根的收益率，末尾不足处为 NaN"""
+    out = np.full(len(close), np.nan)
+    if len(close) > horizon:
+        out[:-horizon] = close[horizon:] / close[:-horizon] - 1
+    return out
+
+
+def evaluate(strategy: str, params: Dict) -> Dict:
+    """在全部交易对上评估一组参数：信号数、命中率、平均 / 中位前瞻收益（按信号方向）"""
+    fn = STRATEGIES[strategy].signals
+    returns = []
+    for ohlcv in _MARKET.values():
+        if len(ohlcv) <= _HORIZON:
+            continue
+        signals = fn(ohlcv, **params)
+        fwd = forward_returns(ohlcv[:, CLOSE], _HORIZON)
+        idx = np.flatnonzero(signals)
+        idx = idx[~np.isnan(fwd[idx])]
+        returns.append(signals[idx] * fwd[idx])
+    r = np.concatenate(returns) if returns else np.empty(0)
+    return {
+        **params,
+        "signals": len(r),
+        "hit_rate": float((r > 0).mean()) if len(r) else np.nan,
+        "avg_fwd": float(r.mean()) if len(r) else np.nan,
+        "median_fwd": float(np.median(r)) if len(r) else np.nan,
+    }
+
+
+def rank(rows: List[Dict]) -> pd.DataFrame:
+    """按平均前瞻收益、命中率降序；信号数不足 MIN_SIGNALS 的排在最后"""
+    table = pd.DataFrame(rows)
+    if table.empty:
+        return table
+    table["enough"] = table["signals"] >= MIN_SIGNALS
+    table = table.sort_values(["enough", "avg_fwd", "hit_rate"], ascending=False, na_position="last")
+    return table.drop(columns="enough").reset_index(drop=True)
+
+
+def sweep(series: Dict[str, np.ndarray], strategy: str, settings: Optional[List[Dict]] = None,
+          horizon: int = HORIZON, workers: int = MAX_WORKERS) -> pd.DataFrame:
+    """多进程评估全部参数组，返回排名表
+
+    Args:
+        series: {交易对: (n, 6) 已收盘K线}
+        strategy: STRATEGIES 中的名称
+        settings: 参数组列表，默认为该策略搜索空间的全部网格
+        horizon: 前瞻收益的K线数
+        workers: 进程数
+    """
+    settings = settings if settings is not None else grid(STRATEGIES[strategy].space)
+    shm, layout = share_market(series)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                                 initargs=(layout, horizon)) as pool:
+            rows = list(pool.map(evaluate, itertools.repeat(strategy), settings,
+                                 chunksize=max(1, len(settings) // (workers * 4))))
+    finally:
+        shm.close()
+        shm.unlink()
+    return rank(rows)
+
+
+if __name__ == "__main__":
+    # python param_sweep.py <策略> <周期> BTC/USDT ETH/USDT ... [--random N]
+    #   策略：continuous / engulfing / rsi_pinbar / ema_touch / price_action（数据来自本地K线仓库）
+    args = sys.argv[1:]
+    n_random = None
+    if "--random" in args:
+        i = args.index("--random")
+        n_random = int(args[i + 1])
+        del args[i:i + 2]
+    name = args[0] if args else "engulfing"
+    tf = args[1] if len(args) > 1 else "1h"
+    pairs = args[2:] or ["BTC/USDT", "ETH/USDT"]
+
+    data = {s: load_ohlcv(s, tf) for s in pairs}
+    data = {s: a for s, a in data.items() if len(a)}
+    if not data:
+        sys.exit("本地K线仓库中没有数据，请先回填历史")
+    space = STRATEGIES[name].space
+    combos = random_samples(space, n_random) if n_random else grid(space)
+    t0 = time.perf_counter()
+    table = sweep(data, name, combos)
+    print(f"{name} {tf}: {len(data)} 个交易对 × {len(combos)} 组参数，用时 {time.perf_counter() - t0:.1f}s")
+    print(table.head(20).to_string())
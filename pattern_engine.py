@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+向量化K线形态引擎 · 多交易对一次计算
+输入为 (交易对 × K线 × OHLCV) 的三维数组，Pin Bar / 吞没 / 内包 / 外包 / 三推 / 连续K线全部用数组运算完成
+"""
+
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+# ── 常量 ──────────────────────────────────────────────────
+O, H, L, C, V = 0, 1, 2, 3, 4       # 最后一维的列位置
+PINBAR_RATIO       = 0.3            # Pin Bar 实体/短影线上限（占全长）
+ENGULF_RATIO       = 1.1            # 吞没实体比例
+MAX_SHADOW_RATIO   = 0.2            # 连续K线第3根起影线占比上限
+
+
+def stack_ohlcv(series: List[List[List]], bars: Optional[int] = None) -> np.ndarray:
+    """把多个 ccxt 格式K线列表右对齐堆叠为 (S, B, 5) 数组
+
+    Args:
+        series: 每个元素为 [[ts, o, h, l, c, v], ...]，按时间正序
+        bars: 窗口长度，默认取最长序列；不足的左侧以 NaN 填充
+
+    Returns:
+        float64 数组，最后一维为 [open, high, low, close, volume]
+    """
+    bars = bars or max((len(s) for s in series), default=0)
+    out = np.full((len(series), bars, 5), np.nan)
+    for i, s in enumerate(series):
+        if not len(s):
+            continue
+        rows = np.asarray(s, dtype=np.float64)[-bars:, 1:6]
+        out[i, bars - len(rows):] = rows
+    return out
+
+
+def _parts(arr: np.ndarray) -> Tuple[np.ndarray, ...]:
+    o, h, l, c = arr[..., O], arr[..., H], arr[..., L], arr[..., C]
+    body = np.abs(c - o)
+    rng = h - l
+    upper = h - np.maximum(o, c)
+    lower = np.minimum(o, c) - l
+    return o, h, l, c, body, rng, upper, lower
+
+
+def _shift(x: np.ndarray, n: int = 1) -> np.ndarray:
+    """沿K线轴右移 n 根（第 b 根得到第 b-n 根的值），左侧补 NaN"""
+    if n == 0:
+        return x
+    out = np.full(x.shape, np.nan)
+    out[..., n:] = x[..., :-n]
+    return out
+
+
+# ── 单根K线形态 ───────────────────────────────────────────
+def pinbars(arr: np.ndarray, ratio: float = PINBAR_RATIO) -> Tuple[np.ndarray, np.ndarray]:
+    """Pin Bar（与 OKXScanner.is_pinbar_* 相同判定）
+
+    Returns:
+        (bullish, bearish)，形状 (S, B) 的布尔数组
+    """
+    _, _, _, _, body, rng, upper, lower = _parts(arr)
+    valid = rng > 0
+    small_body = body < rng * ratio
+    bullish = valid & small_body & (lower > rng * (1 - ratio)) & (upper < rng * ratio)
+    bearish = valid & small_body & (upper > rng * (1 - ratio)) & (lower < rng * ratio)
+    return bullish, bearish
+
+
+# ── 两根K线形态 ───────────────────────────────────────────
+def engulfing(arr: np.ndarray, ratio: float = ENGULF_RATIO,
+              inclusive: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """吞没形态
+
+    inclusive=True 与 engulfing_pattern.engulf 一致（实体比例 + 开收盘可相等）；
+    inclusive=False, ratio=0 与 OKXScanner.is_*_engulfing 一致（严格包含）。
+
+    Returns:
+        (bullish, bearish)，形状 (S, B)，第 0 根恒为 False
+    """
+    o, c = arr[..., O], arr[..., C]
+    po, pc = _shift(o), _shift(c)
+    body, pbody = np.abs(c - o), np.abs(pc - po)
+    ge = np.greater_equal if inclusive else np.greater
+    le = np.less_equal if inclusive else np.less
+
+    big = (pbody > 0) & (body >= pbody * ratio) if ratio > 0 else np.ones(o.shape, bool)
+    bullish = big & (pc < po) & (c > o) & ge(c, po) & le(o, pc)
+    bearish = big & (pc > po) & (c < o) & ge(o, pc) & le(c, po)
+    return bullish, bearish
+
+
+def inside_bars(arr: np.ndarray) -> np.ndarray:
+    """内包线：高点更低且低点更高"""
+    h, l = arr[..., H], arr[..., L]
+    return (h < _shift(h)) & (l > _shift(l))
+
+
+def outside_bars(arr: np.ndarray) -> np.ndarray:
+    """外包线：高点更高且低点更低"""
+    h, l = arr[..., H], arr[..., L]
+    return (h > _shift(h)) & (l < _shift(l))
+
+
+# ── 多根K线形态 ───────────────────────────────────────────
+def three_pushes(arr: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """三推（与 btc_price_action.detect_patterns 相同判定）
+
+    连续 4 根高点递增且当前为阴线 → 向下三推；连续 4 根低点递减且当前为阳线 → 向上三推。
+
+    Returns:
+        (pushes_up, pushes_down)，形状 (S, B)
+    """
+    o, h, l, c = arr[..., O], arr[..., H], arr[..., L], arr[..., C]
+    higher = np.ones(h.shape, bool)
+    lower = np.ones(l.shape, bool)
+    for j in range(3):
+        higher &= _shift(h, j) > _shift(h, j + 1)
+        lower &= _shift(l, j) < _shift(l, j + 1)
+    bear, bull = ~(c > o), c > o
+    return lower & bull, higher & bear
+
+
+def run_lengths(flags: np.ndarray) -> np.ndarray:
+    """每根K线结尾处连续为 True 的长度，形状同输入 (S, B)"""
+    idx = np.arange(flags.shape[-1])
+    last_false = np.where(flags, -1, idx)
+    np.maximum.accumulate(last_false, axis=-1, out=last_false)
+    return idx - last_false
+
+
+def direction_runs(arr: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """每根K线结尾处的连续阳线/阴线根数
+
+    Returns:
+        (bull_runs, bear_runs)，形状 (S, B) 的整数数组
+    """
+    o, c = arr[..., O], arr[..., C]
+    return run_lengths(c > o), run_lengths(c < o)
+
+
+def continuous_run(arr: np.ndarray, max_shadow_ratio: float = MAX_SHADOW_RATIO) -> Tuple[np.ndarray, np.ndarray]:
+    """以最后一根K线结尾的连续形态（与 continuous_pattern.detect_continuous_pattern 相同判定）
+
+    最新两根不检查影线，更早的K线影线占比需 ≤ max_shadow_ratio；遇到全长为 0 的K线即中断。
+
+    Returns:
+        (direction, count)，形状 (S,)；direction 为 1(阳)/-1(阴)/0，count 为连续根数
+    """
+    o, _, _, c, body, rng, _, _ = _parts(arr)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        shadow_ratio = 1 - body / rng
+    sign = np.sign(c - o)
+    sign[~np.isfinite(sign)] = 0
+    direction = sign[:, -1].astype(np.int64)
+
+    rev_sign, rev_rng, rev_ratio = sign[:, ::-1], rng[:, ::-1], shadow_ratio[:, ::-1]
+    ok = (rev_sign == direction[:, None]) & (rev_rng > 0)
+    ok[:, 2:] &= rev_ratio[:, 2:] <= max_shadow_ratio
+    ok &= direction[:, None] != 0
+
+    count = np.cumprod(ok, axis=1).sum(axis=1)
+    return direction, count
+
+
+def continuous_runs(arr: np.ndarray, max_shadow_ratio: float = MAX_SHADOW_RATIO) -> Tuple[np.ndarray, np.ndarray]:
+    """continuous_run 的逐根版本：以每根K线结尾的连续形态，用于历史回测
+
+    Returns:
+        (direction, count)，形状 (S, B)；第 b 根的结果等于 continuous_run(arr[:, :b+1])
+    """
+    o, _, _, c, body, rng, _, _ = _parts(arr)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        tight = (1 - body / rng) <= max_shadow_ratio
+    sign = np.sign(c - o)
+    sign[~np.isfinite(sign)] = 0
+    direction = sign.astype(np.int64)
+    count = np.zeros(direction.shape, np.int64)
+    for d in (1, -1):
+        same = (direction == d) & (rng > 0)
+        plain = run_lengths(same)                      # 最新两根不检查影线
+        strict = _shift(run_lengths(same & tight), 2)  # 更早的K线需影线达标
+        strict[..., :2] = 0
+        runs = np.where(plain <= 2, plain, 2 + np.minimum(plain - 2, strict.astype(np.int64)))
+        count = np.where(direction == d, runs, count)
+    return direction, count
+
+
+# ── 汇总 ──────────────────────────────────────────────────
+def detect_all(arr: np.ndarray) -> Dict[str, np.ndarray]:
+    """一次计算全部形态，返回 {名称: (S, B) 数组}"""
+    pin_bull, pin_bear = pinbars(arr)
+    eng_bull, eng_bear = engulfing(arr)
+    push_up, push_down = three_pushes(arr)
+    bull_runs, bear_runs = direction_runs(arr)
+    return {
+        "pinbar_bullish": pin_bull,
+        "pinbar_bearish": pin_bear,
+        "engulfing_bullish": eng_bull,
+        "engulfing_bearish": eng_bear,
+        "inside_bar": inside_bars(arr),
+        "outside_bar": outside_bars(arr),
+        "three_pushes_up": push_up,
+        "three_pushes_down": push_down,
+        "bull_run": bull_runs,
+        "bear_run": bear_runs,
+    }
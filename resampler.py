@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+K线重采样 · 由 1m 基础序列合成各周期
+分桶与 OKX 完全一致（统一按 UTC+8 对齐，6H / 12H 与日线及以上因此不落在 UTC 零点），未收盘的高周期K线随每次 1m 推送增量更新
+"""
+
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from bar_clock import bar_open
+from candle_store import timeframe_ms
+
+# ── 常量 ──────────────────────────────────────────────────
+BASE_TIMEFRAME = "1m"
+BASE_MS        = timeframe_ms(BASE_TIMEFRAME)
+
+
+def resample(ohlcv: np.ndarray, timeframe: str, closed_only: bool = True) -> np.ndarray:
+    """批量重采样：(n, 6) 的 1m K线 [ts, o, h, l, c, v] → 目标周期 (m, 6)
+
+    Args:
+        ohlcv: 按时间正序的 1m K线
+        timeframe: 目标周期，如 5m / 1h / 4h / 1d / 1w
+        closed_only: 去掉末尾尚未走完的一根（其最后一分钟还没出现）
+    """
+    if len(ohlcv) == 0:
+        return np.empty((0, 6))
+    opens = bar_open(timeframe, ohlcv[:, 0].astype(np.int64))
+    starts = np.flatnonzero(np.r_[True, opens[1:] != opens[:-1]])
+    out = np.column_stack([
+        opens[starts],
+        ohlcv[starts, 1],
+        np.maximum.reduceat(ohlcv[:, 2], starts),
+        np.minimum.reduceat(ohlcv[:, 3], starts),
+        ohlcv[np.r_[starts[1:] - 1, len(ohlcv) - 1], 4],
+        np.add.reduceat(ohlcv[:, 5], starts),
+    ]).astype(np.float64)
+    if closed_only and ohlcv[-1, 0] + BASE_MS < out[-1, 0] + timeframe_ms(timeframe):
+        out = out[:-1]
+    return out
+
+
+def _merge(bar: List, row: List) -> List:
+    """把一根 1m K线并入高周期K线"""
+    return [bar[0], bar[1], max(bar[2], row[2]), min(bar[3], row[3]), row[4], bar[5] + row[5]]
+
+
+class Resampler:
+    """单个交易对的增量重采样
+
+    每个周期保存"已收盘的 1m 累计"与"正在走的 1m"两部分，未收盘的 1m 多次推送只替换后者，
+    不会重复计量；最后一分钟收盘时该周期K线随之收盘，桶内 1m 根数不足时标记为不完整。
+
+    用法:
+        rs = Resampler(["5m", "1h", "1d"])
+        rs.seed(history_1m)                       # 可选：用已收盘的 1m 历史预热
+        for tf, bar, complete in rs.update(row, confirmed):
+            ...                                   # 刚收盘的高周期K线
+        rs.current("1h")                          # 当前未收盘的 1h K线
+    """
+
+    def __init__(self, timeframes: List[str]):
+        self.timeframes = [tf for tf in timeframes if timeframe_ms(tf) > BASE_MS]
+        self.base: Dict[str, Optional[List]] = {tf: None for tf in self.timeframes}   # 已收盘 1m 的累计
+        self.count: Dict[str, int] = {tf: 0 for tf in self.timeframes}                # 本桶已并入的 1m 根数
+        self.live: Optional[List] = None      # 尚未收盘的 1m
+        self.last_ts: Optional[int] = None    # 最后一根已收盘 1m 的开盘时间
+
+    def seed(self, rows: List[List]) -> None:
+        """用已收盘的 1m 历史预热（丢弃期间收盘的高周期K线）"""
+        for row in rows:
+            self.update(row, confirmed=True)
+
+    def current(self, timeframe: str) -> Optional[List]:
+        """当前未收盘的高周期K线（含正在走的 1m）"""
+        bar = self.base[timeframe]
+        if self.live is None:
+            return list(bar) if bar else None
+        if bar is None:
+            return [self._bucket(timeframe, self.live[0])] + list(self.live[1:6])
+        return _merge(bar, self.live)
+
+    @staticmethod
+    def _bucket(timeframe: str, ts: int) -> int:
+        return int(bar_open(timeframe, ts))
+
+    def update(self, row: List, confirmed: bool = True) -> List[Tuple[str, List, bool]]:
+        """处理一条 1m 推送，返回本次收盘的 [(周期, K线, 是否完整), ...]
+
+        complete 为 False 表示该桶有 1m 缺失（开头、中间或结尾，如启动 / 断线期间），调用方应改用 REST 数据。
+        """
+        ts = int(row[0])
+        if self.last_ts is not None and ts <= self.last_ts:
+            return []                      # 重连后的重复推送
+        closed = []
+        # 新的 1m 落入下一个桶：上一个桶没等到最后一分钟（中间有缺失），按不完整收盘
+        for tf in self.timeframes:
+            bar = self.base[tf]
+            if bar is not None and self._bucket(tf, ts) != bar[0]:
+                closed.append((tf, bar, False))
+                self.base[tf], self.count[tf] = None, 0
+
+        if not confirmed:
+            self.live = list(row[:6])
+            return closed
+
+        self.live = None
+        self.last_ts = ts
+        for tf in self.timeframes:
+            start = self._bucket(tf, ts)
+            if self.base[tf] is None:
+                self.base[tf] = [start] + list(row[1:6])
+            else:
+                self.base[tf] = _merge(self.base[tf], row)
+            self.count[tf] += 1
+            if ts + BASE_MS == start + timeframe_ms(tf):
+                closed.append((tf, self.base[tf], self.count[tf] == timeframe_ms(tf) // BASE_MS))
+                self.base[tf], self.count[tf] = None, 0
+        return closed
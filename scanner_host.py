@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+扫描宿主 · 一份K线数据供所有检测器共用
+EMA20 / 吞没 / 连续K线 / RSI+Pin Bar / Al Brooks 反转以插件形式注册，每个 (交易对, 周期) 每次收盘只拉取一次
+"""
+
+import asyncio, sys, traceback
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from bar_clock import BarClock, closed_bars
+from candle_store import CANDLES
+from okx_async_client import OKXAsyncClient
+from okx_stream import ResampledStream
+from universe import UNIVERSE
+
+# ── 常量 ──────────────────────────────────────────────────
+MIN_VOLUME_USDT   = 100000      # 交易对池最小24h成交额
+STREAM_FLUSH_SEC  = 3           # 实时模式下同批收盘的聚合等待秒数
+
+Windows = Dict[str, List[List]]   # 交易对 → 已收盘K线（正序，ccxt 格式）
+
+
+class Detector:
+    """检测器插件基类
+
+    子类声明需要的周期、窗口长度与交易对数量，实现 scan / report 即可：
+        scan(tf, windows, volumes)  对该周期所有交易对的已收盘K线做检测，返回结果列表
+        report(results)             汇总本轮全部周期的结果并推送
+    """
+
+    name = "detector"
+    timeframes: List[str] = []
+    window = 100                  # 需要的已收盘K线数
+    top_n: Optional[int] = None   # 只使用交易对池前 N 个，None 为全部
+
+    def scan(self, tf: str, windows: Windows, volumes: Dict[str, float]) -> List:
+        raise NotImplementedError
+
+    async def report(self, results: List) -> None:
+        raise NotImplementedError
+
+
+class ScannerHost:
+    """检测器宿主
+
+    用法:
+        host = ScannerHost()
+        host.register(ContinuousDetector())
+        await host.run()             # 轮询：每根K线收盘后拉取一次
+        await host.run_stream()      # WebSocket：收盘推送即检测
+    """
+
+    def __init__(self, min_volume: float = MIN_VOLUME_USDT):
+        self.min_volume = min_volume
+        self.detectors: List[Detector] = []
+        self.client = OKXAsyncClient()
+
+    def register(self, detector: Detector) -> None:
+        self.detectors.append(detector)
+
+    @property
+    def timeframes(self) -> List[str]:
+        seen = []
+        for d in self.detectors:
+            seen += [tf for tf in d.timeframes if tf not in seen]
+        return seen
+
+    def _window(self, tf: str) -> int:
+        return max(d.window for d in self.detectors if tf in d.timeframes)
+
+    # ── 交易对池 ──────────────────────────────────────────
+    async def universe(self) -> Tuple[Dict[str, List[str]], Dict[str, float]]:
+        """按最大的 top_n 排名一次，各检测器取前缀
+
+        Returns:
+            ({检测器名: 交易对列表}, {交易对: 24h成交额})
+        """
+        n = max(d.top_n or 0 for d in self.detectors) or 10 ** 6
+        ranking = await UNIVERSE.select_async(self.client, n, "USDT", self.min_volume)
+        per_detector = {d.name: ranking.symbols[:d.top_n] if d.top_n else ranking.symbols
+                        for d in self.detectors}
+        return per_detector, ranking.volume_map()
+
+    # ── 检测 ──────────────────────────────────────────────
+    def _evaluate(self, tf: str, windows: Windows, members: Dict[str, List[str]],
+                  volumes: Dict[str, float], results: Dict[str, List]) -> None:
+        """同一份窗口依次交给订阅该周期的检测器"""
+        for d in self.detectors:
+            if tf not in d.timeframes:
+                continue
+            own = {s: windows[s][-d.window:] for s in members[d.name] if s in windows}
+            if not own:
+                continue
+            try:
+                results[d.name] += d.scan(tf, own, volumes)
+            except Exception:
+                traceback.print_exc()
+
+    async def _report(self, results: Dict[str, List]) -> None:
+        for d in self.detectors:
+            try:
+                await d.report(results[d.name])
+            except Exception:
+                traceback.print_exc()
+
+    # ── 轮询模式 ──────────────────────────────────────────
+    async def scan_once(self, timeframes: List[str]) -> None:
+        members, volumes = await self.universe()
+        windows: Dict[str, Windows] = {tf: {} for tf in timeframes}
+
+        async def fetch(sym: str, tf: str) -> None:
+            try:
+                rows = await CANDLES.fetch_ohlcv_async(self.client, sym, tf, self._window(tf) + 1)
+            except Exception as e:
+                print(f"{sym} {tf}: {type(e).__name__}: {e}", file=sys.stderr)
+                return
+            closed = closed_bars(rows, tf)
+            if closed:
+                windows[tf][sym] = closed
+
+        jobs = []
+        for tf in timeframes:
+            symbols = set()
+            for d in self.detectors:
+                if tf in d.timeframes:
+                    symbols.update(members[d.name])
+            jobs += [fetch(s, tf) for s in symbols]
+        await asyncio.gather(*jobs)
+        print(f"{datetime.now().strftime('%F %T')} 拉取 {len(jobs)} 个序列 ({', '.join(timeframes)})")
+
+        results = {d.name: [] for d in self.detectors}
+        for tf in timeframes:
+            self._evaluate(tf, windows[tf], members, volumes, results)
+        await self._report(results)
+
+    async def run(self) -> None:
+        """按K线收盘调度，只处理刚收盘的周期"""
+        print(f"🚀 扫描宿主启动：{', '.join(d.name for d in self.detectors)}")
+        print(f"周期：{', '.join(self.timeframes)}")
+        clock = BarClock(self.timeframes)
+        try:
+            while True:
+                due = await clock.wait()
+                try:
+                    await self.scan_once(due)
+                except Exception:
+                    traceback.print_exc()
+        finally:
+            await self.client.close()
+
+    # ── 实时模式 ──────────────────────────────────────────
+    async def run_stream(self) -> None:
+        """订阅全部交易对与周期的K线频道，同批收盘聚合后统一检测"""
+        members, volumes = await self.universe()
+        symbols = sorted({s for syms in members.values() for s in syms})
+        window = max(d.window for d in self.detectors)
+        stream = ResampledStream(symbols, self.timeframes, window=window)
+
+        pending: Dict[str, Windows] = {}
+        flush_task: Optional[asyncio.Task] = None
+
+        async def flush() -> None:
+            await asyncio.sleep(STREAM_FLUSH_SEC)
+            batch = dict(pending)
+            pending.clear()
+            results = {d.name: [] for d in self.detectors}
+            for tf, windows in batch.items():
+                self._evaluate(tf, windows, members, volumes, results)
+            await self._report(results)
+
+        async def on_close(sym: str, tf: str, candles: List[List]) -> None:
+            nonlocal flush_task
+            pending.setdefault(tf, {})[sym] = candles
+            if flush_task is None or flush_task.done():
+                flush_task = asyncio.create_task(flush())
+
+        stream.on_close(on_close)
+        print(f"🚀 扫描宿主启动（WebSocket 实时模式）：{', '.join(d.name for d in self.detectors)}")
+        try:
+            await stream.run()
+        finally:
+            await self.client.close()
+
+
+def default_detectors() -> List[Detector]:
+    """各扫描脚本的检测器插件"""
+    from brooks_reversal import BrooksDetector
+    from continuous_pattern import ContinuousDetector
+    from engulfing_pattern import EngulfingDetector
+    from ema_monitor import EMATouchDetector
+    from RSIandPinbar import RSIPinbarDetector
+    return [EMATouchDetector(), EngulfingDetector(), ContinuousDetector(), RSIPinbarDetector(),
+            BrooksDetector()]
+
+
+if __name__ == "__main__":
+    host = ScannerHost()
+    for detector in default_detectors():
+        host.register(detector)
+    try:
+        # python scanner_host.py --stream 使用 WebSocket 实时模式，否则按K线收盘轮询
+        asyncio.run(host.run_stream() if "--stream" in sys.argv else host.run())
+    except KeyboardInterrupt:
+        print("\nBye ✌️")
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+回填合并的多进程回归测试
+backfill.py 作为独立进程运行，与扫描进程同时读写同一仓库：回填的整体换入不能丢掉扫描进程
+同时追加的新K线，扫描进程也不能读到换入一半的目录
+
+    python -m pytest -q test_backfill.py
+"""
+
+import multiprocessing, tempfile
+import numpy as np
+
+from backfill import BackfillJob
+from candle_store import CandleStore
+
+TF_MS    = 300_000      # 5m
+SYMBOL   = "BTC/USDT"
+HISTORY  = 2000         # 回填的更早历史 [0, HISTORY)
+STORED   = 100          # 仓库已有 [HISTORY, HISTORY + STORED)
+LIVE     = 300          # 扫描进程逐根追加的新K线
+BLOCK    = 100          # 回填每次合并的K线数
+SCANNERS = 3
+
+
+def _rows(lo: int, hi: int):
+    return [[t * TF_MS, t, t + 1, t - 1, t, 10.0] for t in range(lo, hi)]
+
+
+def _backfill(root: str, errors) -> None:
+    """从新到旧分块暂存并合并，模拟多次回填运行"""
+    try:
+        store = CandleStore(root)
+        for hi in range(HISTORY, 0, -BLOCK):
+            job = BackfillJob(store, SYMBOL, "5m", since=0)
+            job.dir = tempfile.mkdtemp(prefix="staging_", dir=root)
+            job._stage(_rows(hi - BLOCK, hi))      # 暂存按时间倒序，_stage 内部翻转
+            job.state["rows"] = BLOCK
+            job.merge()
+    except Exception as e:
+        errors.put(f"backfill {type(e).__name__}: {e}")
+
+
+def _scanner(root: str, errors) -> None:
+    try:
+        store = CandleStore(root)
+        start = HISTORY + STORED
+        for t in range(start, start + LIVE):
+            store.merge(SYMBOL, "5m", _rows(t, t + 1))
+            ts = store.tail(SYMBOL, "5m", 50)[:, 0]
+            assert np.all(np.diff(ts) > 0), f"读到乱序数据: {ts}"
+    except Exception as e:
+        errors.put(f"scanner {type(e).__name__}: {e}")
+
+
+def test_backfill_merge_keeps_concurrent_appends():
+    root = tempfile.mkdtemp(prefix="backfill_test_")
+    CandleStore(root).merge(SYMBOL, "5m", _rows(HISTORY, HISTORY + STORED))
+
+    ctx = multiprocessing.get_context("spawn")
+    errors = ctx.Queue()
+    procs = [ctx.Process(target=_backfill, args=(root, errors))]
+    procs += [ctx.Process(target=_scanner, args=(root, errors)) for _ in range(SCANNERS)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(120)
+
+    failures = []
+    while not errors.empty():
+        failures.append(errors.get())
+    assert not failures, failures
+    assert all(p.exitcode == 0 for p in procs)
+
+    data = CandleStore(root).history(SYMBOL, "5m")
+    assert data[:, 0].tolist() == [t * TF_MS for t in range(HISTORY + STORED + LIVE)]
+    assert np.array_equal(data[:, 4], data[:, 0] / TF_MS)
+
+
+if __name__ == "__main__":
+    test_backfill_merge_keeps_concurrent_appends()
+    print("✅ 通过")
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地K线仓库的多进程回归测试
+多个扫描进程与 backfill 共用同一仓库：并发 merge（追加与整体换入两种路径）与读取不能产生
+重复 / 乱序的时间戳，也不能读到换入一半的目录
+
+    python -m pytest -q test_candle_store.py
+"""
+
+import multiprocessing, random, tempfile
+import numpy as np
+
+from candle_store import CandleStore
+
+TF_MS    = 300_000      # 5m
+BARS     = 400          # 时间轴总长度
+CHUNK    = 20           # 每次 merge 的K线数
+ROUNDS   = 60           # 每个进程的 merge 次数
+WORKERS  = 4
+SYMBOLS  = ("BTC/USDT", "BTC-USDT")   # 两种写法落在同一目录，必须共用同一把锁
+
+
+def _rows(lo: int, hi: int):
+    return [[t * TF_MS, t, t + 1, t - 1, t, 10.0] for t in range(lo, hi)]
+
+
+def _plan(seed: int):
+    """某个进程依次 merge 的 (交易对写法, 起点)；前半段乱序（走换入），后半段递增（多走追加）"""
+    rng = random.Random(seed)
+    starts = [rng.randrange(0, BARS - CHUNK) for _ in range(ROUNDS // 2)]
+    starts += sorted(rng.randrange(0, BARS - CHUNK) for _ in range(ROUNDS - len(starts)))
+    return [(rng.choice(SYMBOLS), lo) for lo in starts]
+
+
+def _worker(root: str, seed: int, errors) -> None:
+    try:
+        store = CandleStore(root)
+        for symbol, lo in _plan(seed):
+            store.merge(symbol, "5m", _rows(lo, lo + CHUNK))
+            ts = store.tail(SYMBOLS[0], "5m", 2 * CHUNK)[:, 0]
+            assert np.all(np.diff(ts) > 0), f"读到乱序数据: {ts}"
+    except Exception as e:
+        errors.put(f"{type(e).__name__}: {e}")
+
+
+def test_concurrent_merge_across_processes():
+    root = tempfile.mkdtemp(prefix="candle_store_test_")
+    ctx = multiprocessing.get_context("spawn")
+    errors = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(root, seed, errors)) for seed in range(WORKERS)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(120)
+
+    failures = []
+    while not errors.empty():
+        failures.append(errors.get())
+    assert not failures, failures
+    assert all(p.exitcode == 0 for p in procs)
+
+    expected = sorted({t for seed in range(WORKERS) for _, lo in _plan(seed) for t in range(lo, lo + CHUNK)})
+    data = CandleStore(root).history(SYMBOLS[1], "5m")
+    assert data[:, 0].tolist() == [t * TF_MS for t in expected]        # 无缺失、无重复、严格递增
+    assert np.array_equal(data[:, 4], data[:, 0] / TF_MS)              # 各列来自同一行
+
+
+def test_symbol_spellings_share_series():
+    store = CandleStore(tempfile.mkdtemp(prefix="candle_store_test_"))
+    store.merge("BTC/USDT", "5M", _rows(10, 20))
+    store.merge("BTC-USDT", "5m", _rows(0, 15))
+    assert store.history("BTC/USDT", "5m")[:, 0].tolist() == [t * TF_MS for t in range(20)]
+
+
+if __name__ == "__main__":
+    test_concurrent_merge_across_processes()
+    test_symbol_spellings_share_series()
+    print("✅ 通过")
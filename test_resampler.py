@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量重采样的完整性测试
+桶内任意位置缺失 1m（如断线重连期间）都必须标记为不完整，不能当作权威K线落盘
+
+    python -m pytest -q test_resampler.py
+"""
+
+from resampler import BASE_MS, Resampler
+
+START = 1_700_000_100_000 - 1_700_000_100_000 % (5 * BASE_MS)   # 5m 桶起点
+
+
+def _row(i: int):
+    return [START + i * BASE_MS, 1.0 + i, 2.0 + i, 0.5, 1.0 + i, 10.0]
+
+
+def _closed_5m(minutes):
+    rs = Resampler(["5m"])
+    closed = []
+    for i in minutes:
+        closed += rs.update(_row(i), confirmed=True)
+    return [c for c in closed if c[0] == "5m"]
+
+
+def test_full_bucket_is_complete():
+    (tf, bar, complete), = _closed_5m(range(5))
+    assert complete
+    assert bar == [START, 1.0, 6.0, 0.5, 5.0, 50.0]
+
+
+def test_missing_middle_minutes_is_incomplete():
+    (tf, bar, complete), = _closed_5m([0, 1, 4])
+    assert not complete
+    assert bar[5] == 30.0
+
+
+def test_missing_first_minute_is_incomplete():
+    (tf, bar, complete), = _closed_5m([1, 2, 3, 4])
+    assert not complete
+
+
+def test_missing_last_minute_closes_incomplete_on_next_bucket():
+    closed = _closed_5m([0, 1, 2, 3, 5])
+    assert [c[2] for c in closed] == [False]
+
+
+if __name__ == "__main__":
+    test_full_bucket_is_complete()
+    test_missing_middle_minutes_is_incomplete()
+    test_missing_first_minute_is_incomplete()
+    test_missing_last_minute_closes_incomplete_on_next_bucket()
+    print("✅ 通过")
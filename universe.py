@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+交易对池筛选 · 成交额排名 TOP N
+交易对元数据按 TTL 缓存，行情一次请求解析为 NumPy 数组，argpartition 取前 N，各扫描脚本共用同一份排名
+"""
+
+import time, requests
+import numpy as np
+from typing import Dict, List, NamedTuple, Optional, Set
+
+from metrics import METRICS
+from okx_async_client import BASE_URL, to_symbol
+
+# ── 常量 ──────────────────────────────────────────────────
+MARKETS_TTL  = 6 * 3600      # 交易对元数据（上下架状态）缓存秒数
+TICKERS_TTL  = 20            # 同一轮扫描内多个脚本复用同一份行情
+VOLUME_FIELDS = ("volCcy24h", "vol24h")   # 现货 volCcy24h 为计价币成交额，vol24h 为基础币成交量
+
+
+class Ranking(NamedTuple):
+    """排名结果：symbols 为 BTC/USDT 格式，volumes 与之一一对应；eligible 为通过过滤的交易对数"""
+    symbols: List[str]
+    volumes: np.ndarray
+    eligible: int
+
+    def volume_map(self) -> Dict[str, float]:
+        return dict(zip(self.symbols, self.volumes.tolist()))
+
+
+class TickerArrays(NamedTuple):
+    inst_ids: np.ndarray     # object
+    quotes: np.ndarray       # object，计价币种
+    last: np.ndarray
+    volCcy24h: np.ndarray
+    vol24h: np.ndarray
+
+
+def _floats(raw: List[Dict], key: str) -> np.ndarray:
+    return np.fromiter((float(t.get(key) or "nan") for t in raw), dtype=np.float64, count=len(raw))
+
+
+def parse_tickers(raw: List[Dict]) -> TickerArrays:
+    """OKX /market/tickers 原始数据 → 列数组"""
+    inst_ids = np.array([t["instId"] for t in raw], dtype=object)
+    quotes = np.array([i.rsplit("-", 1)[-1] for i in inst_ids], dtype=object)
+    return TickerArrays(inst_ids, quotes, _floats(raw, "last"),
+                        _floats(raw, "volCcy24h"), _floats(raw, "vol24h"))
+
+
+def top_indices(values: np.ndarray, n: int) -> np.ndarray:
+    """按 values 降序取前 n 个下标（argpartition + 仅对前 n 个排序）"""
+    if n <= 0:
+        return np.empty(0, dtype=np.int64)
+    if n >= len(values):
+        return np.argsort(-values, kind="stable")
+    part = np.argpartition(-values, n - 1)[:n]
+    return part[np.argsort(-values[part], kind="stable")]
+
+
+def rank(tickers: TickerArrays, top_n: int, quote: Optional[str] = "USDT",
+         min_volume: float = 0.0, by: str = "volCcy24h",
+         live: Optional[Set[str]] = None) -> Ranking:
+    """在行情数组上过滤并排名
+
+    Args:
+        tickers: parse_tickers 的结果
+        top_n: 取前 N 个
+        quote: 计价币种，None 为不限
+        min_volume: 成交额（by 字段）下限
+        by: 排名字段，volCcy24h 或 vol24h
+        live: 正常交易的 instId 集合，None 为不过滤
+    """
+    if by not in VOLUME_FIELDS:
+        raise ValueError(f"不支持的排名字段: {by}")
+    volumes = getattr(tickers, by)
+    mask = np.isfinite(volumes) & (volumes >= min_volume)
+    if quote:
+        mask &= tickers.quotes == quote
+    if live is not None:
+        mask &= np.fromiter((i in live for i in tickers.inst_ids), dtype=bool, count=len(mask))
+
+    idx = np.flatnonzero(mask)
+    order = idx[top_indices(volumes[idx], top_n)]
+    return Ranking([to_symbol(i) for i in tickers.inst_ids[order]], volumes[order], int(mask.sum()))
+
+
+class UniverseSelector:
+    """共享的交易对池
+
+    用法:
+        ranking = UNIVERSE.select(100)                          # 同步脚本
+        ranking = await UNIVERSE.select_async(client, 100)      # 异步脚本（OKXAsyncClient）
+    """
+
+    def __init__(self, base_url: str = BASE_URL, inst_type: str = "SPOT"):
+        self.base_url = base_url
+        self.inst_type = inst_type
+        self.live: Optional[Set[str]] = None
+        self.live_at = 0.0
+        self.tickers: Optional[TickerArrays] = None
+        self.tickers_at = 0.0
+
+    def _get(self, path: str, params: Dict) -> List[Dict]:
+        with METRICS.timer("okx_request_seconds", endpoint=path):
+            response = requests.get(f"{self.base_url}{path}", params=params, timeout=15)
+        response.raise_for_status()
+        data = response.json()
+        if data["code"] != "0":
+            raise RuntimeError(data["msg"])
+        return data["data"]
+
+    def _set_markets(self, instruments: List[Dict]) -> None:
+        self.live = {i["instId"] for i in instruments if i.get("state") == "live"}
+        self.live_at = time.time()
+
+    def _set_tickers(self, raw: List[Dict]) -> None:
+        self.tickers = parse_tickers(raw)
+        self.tickers_at = time.time()
+
+    def _stale(self, at: float, ttl: float) -> bool:
+        return time.time() - at >= ttl
+
+    def _rank(self, top_n, quote, min_volume, by) -> Ranking:
+        return rank(self.tickers, top_n, quote, min_volume, by, self.live)
+
+    def select(self, top_n: int, quote: Optional[str] = "USDT",
+               min_volume: float = 0.0, by: str = "volCcy24h") -> Ranking:
+        """同步获取排名（元数据、行情按各自 TTL 复用）"""
+        params = {"instType": self.inst_type}
+        if self.live is None or self._stale(self.live_at, MARKETS_TTL):
+            self._set_markets(self._get("/api/v5/public/instruments", params))
+        if self.tickers is None or self._stale(self.tickers_at, TICKERS_TTL):
+            self._set_tickers(self._get("/api/v5/market/tickers", params))
+        return self._rank(top_n, quote, min_volume, by)
+
+    async def select_async(self, client, top_n: int, quote: Optional[str] = "USDT",
+                           min_volume: float = 0.0, by: str = "volCcy24h") -> Ranking:
+        """异步获取排名，client 为 OKXAsyncClient"""
+        params = {"instType": self.inst_type}
+        if self.live is None or self._stale(self.live_at, MARKETS_TTL):
+            self._set_markets(await client.get("/api/v5/public/instruments", params))
+        if self.tickers is None or self._stale(self.tickers_at, TICKERS_TTL):
+            self._set_tickers(await client.fetch_tickers(self.inst_type))
+        return self._rank(top_n, quote, min_volume, by)
+
+
+# ── 进程内共享实例 ────────────────────────────────────────
+UNIVERSE = UniverseSelector()